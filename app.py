@@ -1,6 +1,75 @@
-from loader import bot
-import commands
+import time
+
+started = time.perf_counter()
+
+import argparse
+import logging
+
+import loader
+from loader import bot_mode, metrics_port, shard_config, webhook_config
+from metrics import STARTUP_SECONDS, install_api_metrics, log_event, setup_logging, start_metrics_server
+
+
+def migrate() -> None:
+    """Function that creates and migrates database schema, only database engine is built for it."""
+    from database.dbworker import init_db
+
+    init_db(loader.get_engine())
+    print('Database schema is up to date')
+
+
+def run(mode: str) -> None:
+    """Function that builds objects that are used in selected mode and starts bot.
+
+    Args:
+        mode (str): "polling", "webhook" or "sharded"
+    """
+    from database.dbworker import ensure_schema
+
+    engine = loader.get_engine()
+    STARTUP_SECONDS.set(time.perf_counter() - started, stage='imports')
+    if ensure_schema(engine):
+        log_event('schema_migrated', logging.WARNING)
+    install_api_metrics()
+    if mode == 'sharded':
+        from sharding import run_sharded
+
+        # workers build handlers, broadcasts, schedules and authenticator themselves
+        run_sharded(loader.get_bot(), global_rate=loader.broadcast_config['global_rate'], metrics_port=metrics_port,
+                    dedup=loader.get_dedup(), **shard_config)
+        return
+
+    import commands
+    from database.idempotency import install_update_dedup
+    from flood import install_flood_control
+
+    bot = loader.get_bot()
+    loader.get_authenticator().load()
+    commands.register(bot)
+    install_update_dedup(bot, loader.get_dedup())
+    install_flood_control(bot, loader.get_flood())
+    if metrics_port:
+        start_metrics_server(port=metrics_port)
+    loader.get_broadcast_queue().start()
+    loader.get_scheduler().start()
+    STARTUP_SECONDS.set(time.perf_counter() - started, stage='ready')
+    log_event('startup', seconds=round(time.perf_counter() - started, 3))
+    if mode == 'webhook':
+        from webhook import run_webhook
+
+        run_webhook(bot, **webhook_config)
+    else:
+        bot.infinity_polling()
+
 
 if __name__ == '__main__':
-    print('Bot script has been successfully enabled')
-    bot.infinity_polling()
+    parser = argparse.ArgumentParser(description='Samus clan notifier bot')
+    parser.add_argument('command', nargs='?', choices=('run', 'migrate'), default='run',
+                        help='"migrate" creates and migrates database schema and exits')
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.command == 'migrate':
+        migrate()
+    else:
+        run(bot_mode)
@@ -0,0 +1,16 @@
+import asyncio
+
+from async_loader import authenticator, bot, engine
+from database.async_dbworker import init_async_db
+import async_commands
+
+
+async def main() -> None:
+    await init_async_db(engine)
+    await asyncio.to_thread(authenticator.load)
+    print('Async bot script has been successfully enabled')
+    await bot.infinity_polling()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,337 @@
+import asyncio
+import math
+from datetime import date
+
+from telebot.states import State, StatesGroup
+from telebot.types import Message
+
+from database.msg_templates import REPLIES, format_template_page
+from database.async_dbworker import get_user, gen_recipients, add_rr_name, create_template, get_templates, delete_template, deactivate_users
+from templating import build_mention_messages, split_category
+
+from async_loader import authenticator, bot, broadcaster, engine, dev_id
+
+DEVS = [int(dev_id)]
+
+
+class Dialogue(StatesGroup):
+    """States of multi-step dialogues, that replace next step handlers of synchronous bot"""
+    register = State()
+    authenticate = State()
+    choose_template = State()
+    send_without_storing = State()
+    add_template = State()
+    del_template = State()
+
+
+async def gen_templates() -> str:
+    """Function that generates one entire message with templates
+
+    Returns:
+        str: Generated message
+    """
+    templates = await get_templates(engine)
+    return format_template_page([(number, template.preview()) for number, template in templates.items()])
+
+
+async def stop_talking(message: Message) -> bool:
+    """Function that provides exit from dialogue.
+
+    Args:
+        message (Message): Object, that contains information of received message
+
+    Returns:
+        bool: Returns true if message match "stop-word" else false
+    """
+    if message.text.lower() == 'стоп':
+        await bot.delete_state(message.from_user.id, message.chat.id)
+        await bot.reply_to(message, REPLIES['stop'])
+        return True
+    return False
+
+def in_group(message: Message) -> bool:
+    """Function that tells you whether bot called in group or not
+
+    Args:
+        message (Message): Object, that contains information of received message
+
+    Returns:
+        bool: Returns true if bot command was triggered in group else false
+    """
+    if message.from_user.id == message.chat.id:
+        return False
+    return True
+
+@bot.message_handler(commands=['start'])
+async def start_command(message: Message) -> None:
+    """Handler that provides work of "/start" command.
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if in_group(message):
+        return
+
+    # locked users are answered before any database query
+    wait = authenticator.retry_after(message.from_user.id)
+    if wait:
+        await bot.reply_to(message, REPLIES['auth_locked'].format(minutes=math.ceil(wait / 60)))
+        return
+
+    await bot.reply_to(message, REPLIES['start'])
+    curr_user_rr_name = await get_user(message.from_user.id, message.from_user.username, engine)
+    if curr_user_rr_name == '_empty_name_':
+        await bot.reply_to(message, REPLIES['register'])
+        await bot.set_state(message.from_user.id, Dialogue.register, message.chat.id)
+    else:
+        await bot.reply_to(message, REPLIES['logged'].format(rr_name=curr_user_rr_name))
+        await bot.reply_to(message, REPLIES['commands'])
+
+    print("{username} with id {id} called '/start' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+
+
+@bot.message_handler(commands=['all'])
+async def handle_all(message: Message) -> None:
+    """Handler that allows leaders to contact all clan members
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if in_group(message):
+        return
+
+    if message.from_user.id in DEVS:
+        await bot.reply_to(message, REPLIES['choose_template'])
+        await bot.reply_to(message, await gen_templates())
+        await bot.set_state(message.from_user.id, Dialogue.choose_template, message.chat.id)
+    else:
+        print("Permission error")
+
+    print("{username} with id {id} called '/all' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+
+
+@bot.message_handler(commands=['new'])
+async def handle_new(message: Message) -> None:
+    """Handler that can help leader add his own templates
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    await bot.reply_to(message, REPLIES['add_template'])
+    await bot.set_state(message.from_user.id, Dialogue.add_template, message.chat.id)
+
+    print("{username} with id {id} called '/new' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+
+
+@bot.message_handler(commands=['del'])
+async def handle_del(message: Message) -> None:
+    """Handler that can help leader del added templates
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    await bot.reply_to(message, await gen_templates())
+    await bot.reply_to(message, REPLIES['del_template'])
+    await bot.set_state(message.from_user.id, Dialogue.del_template, message.chat.id)
+
+    print("{username} with id {id} called '/del' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+
+
+@bot.message_handler(commands=['everyone'])
+async def mention_all(message: Message) -> None:
+    """This command will mention all registered users in database
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if message.from_user.id != message.chat.id:
+        users = [
+            (user.id, user.username, user.rr_name if user.rr_name != '_empty_name_' else REPLIES['default_mention_name'])
+            for user in await gen_recipients(engine)
+        ]
+        for mention_message in build_mention_messages(users, REPLIES['after_everyone']):
+            await bot.send_message(message.chat.id, mention_message, parse_mode='HTML')
+    else:
+        await bot.reply_to(message, REPLIES['only_for_chat'])
+
+    print("{username} with id {id} called '/everyone' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+
+
+@bot.message_handler(commands=['help'])
+async def help_command(message: Message) -> None:
+    """Handler that will send to user list of command that he provides
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    await bot.reply_to(message, REPLIES['help'])
+    await bot.reply_to(message, REPLIES['commands'])
+
+
+@bot.message_handler(state=Dialogue.register)
+async def register_user(message: Message) -> None:
+    """Handler that will add users to database and also add their ingame nickname
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if await stop_talking(message):
+        return
+
+    await bot.reply_to(message, REPLIES['authenticate'])
+    await bot.set_state(message.from_user.id, Dialogue.authenticate, message.chat.id)
+    await bot.add_data(message.from_user.id, message.chat.id, username=message.text)
+
+
+@bot.message_handler(state=Dialogue.authenticate)
+async def auth_member(message: Message) -> None:
+    """Handler that will check if user is a member of clan
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if await stop_talking(message):
+        return
+
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        username = data.get('username')
+    await bot.delete_state(message.from_user.id, message.chat.id)
+
+    # authenticator queries database synchronously, so it is called outside of event loop
+    result, wait = await asyncio.to_thread(authenticator.authenticate, message.from_user.id, message.text)
+    if result == 'passed':
+        # failed writes are logged and raised, so user is not told about name that was not stored
+        await get_user(message.from_user.id, message.from_user.username, engine)
+        await add_rr_name(message.from_user.id, message.from_user.username, username, engine)
+        await bot.reply_to(message, REPLIES['auth_passed'])
+    elif result == 'locked':
+        await bot.reply_to(message, REPLIES['auth_locked'].format(minutes=math.ceil(wait / 60)))
+    else:
+        await bot.reply_to(message, REPLIES['auth_failed'])
+
+
+@bot.message_handler(state=Dialogue.choose_template)
+async def choose_template(message: Message) -> None:
+    """Handler that will send choosen template to all members of the clan
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if await stop_talking(message):
+        return
+
+    if message.text == '0':
+        await bot.send_message(message.from_user.id, REPLIES['send_without_storing'])
+        await bot.set_state(message.from_user.id, Dialogue.send_without_storing, message.chat.id)
+        return
+
+    templates = await get_templates(engine)
+    try:
+        number = int(message.text)
+    except ValueError as e:
+        number = None
+
+    if number not in templates:
+        await bot.reply_to(message, REPLIES['invalid_key'])
+        await handle_all(message)
+        return
+
+    await bot.delete_state(message.from_user.id, message.chat.id)
+    template = templates[number]
+    today = date.today().strftime('%d.%m.%Y')
+    await start_broadcast(message, [(user.id, template.render(rr_name=user.rr_name, username=user.username, date=today)) for user in await gen_recipients(engine)])
+
+
+@bot.message_handler(state=Dialogue.send_without_storing)
+async def send_without_storing(message: Message) -> None:
+    """This handler will allow leader to send message right now without saving it
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    await bot.delete_state(message.from_user.id, message.chat.id)
+    await start_broadcast(message, [(user.id, message.text) for user in await gen_recipients(engine)])
+
+
+async def start_broadcast(message: Message, messages: list) -> None:
+    """Function that sends messages concurrently and reports results to leader
+
+    Args:
+        message (Message): Object, that contains information of received message
+        messages (list): Pairs of chat id and text of message for this chat
+    """
+    await bot.send_message(message.from_user.id, REPLIES['broadcast_started'])
+    result = await broadcaster.broadcast(messages)
+    await deactivate_users(result.blocked, engine)
+    await bot.send_message(message.from_user.id, REPLIES['broadcast_report'].format(
+        delivered=result.delivered, failed=result.failed, blocked=len(result.blocked)))
+
+
+@bot.message_handler(state=Dialogue.add_template)
+async def add_template(message: Message) -> None:
+    """Function that add leader template
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if await stop_talking(message):
+        return
+
+    await bot.delete_state(message.from_user.id, message.chat.id)
+    category, template = split_category(message.text)
+    number = await create_template(template, engine, category)
+    if number is None:
+        await bot.reply_to(message, REPLIES['template_failed'])
+        return
+    await bot.reply_to(message, REPLIES['template_created'].format(number=number))
+
+
+@bot.message_handler(state=Dialogue.del_template)
+async def del_template(message: Message) -> None:
+    """Function that deletes leader template
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if await stop_talking(message):
+        return
+
+    try:
+        number = int(message.text)
+    except ValueError as e:
+        number = None
+
+    if number is None or not await delete_template(number, engine):
+        await bot.reply_to(message, REPLIES['invalid_key'])
+        await handle_del(message)
+        return
+
+    await bot.delete_state(message.from_user.id, message.chat.id)
+    await bot.reply_to(message, REPLIES['template_deleted'])
+
+
+@bot.message_handler(func=lambda _: True)
+async def incorrect_command(message: Message) -> None:
+    """Handler that provides work with synonims of the word "Hello"
+    to greet the user and notify him that he is doing something wrong.
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if message.chat.id == message.from_user.id:
+        await bot.reply_to(message, REPLIES['incorrect'])
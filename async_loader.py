@@ -0,0 +1,45 @@
+import os
+
+from dotenv import load_dotenv
+from telebot import asyncio_filters, asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+from auth import AttemptThrottle, Authenticator
+from broadcast.async_sender import AsyncBroadcaster
+from database.async_dbworker import create_async_db_engine
+from database.dbworker import create_db_engine
+
+load_dotenv("config.env")
+TOKEN = os.environ.get('BOT_TOKEN')
+dev_id = os.environ.get('DEV_ID')
+leader_id = os.environ.get('LEADER_ID')
+secret_word = os.environ.get('AUTH_WORD')
+# Allows to point bot at local Bot API server or at bench.fake_api
+if os.environ.get('TELEGRAM_API_URL'):
+    asyncio_helper.API_URL = os.environ.get('TELEGRAM_API_URL')
+engine = create_async_db_engine(os.environ.get('ASYNC_DATABASE_URL'))
+bot = AsyncTeleBot(TOKEN)
+bot.add_custom_filter(asyncio_filters.StateFilter(bot))
+broadcaster = AsyncBroadcaster(
+    bot,
+    workers=int(os.environ.get('BROADCAST_WORKERS', 8)),
+    global_rate=float(os.environ.get('BROADCAST_GLOBAL_RATE', 30)),
+    chat_rate=float(os.environ.get('BROADCAST_CHAT_RATE', 1)),
+    max_retries=int(os.environ.get('BROADCAST_RETRIES', 3)),
+    max_flood_waits=int(os.environ.get('BROADCAST_FLOOD_WAITS', 10)),
+)
+# Authenticator works with synchronous engine, so it opens the same database through default driver of its dialect
+auth_engine = create_db_engine(engine.url.set(drivername=engine.url.get_backend_name()).render_as_string(hide_password=False),
+                               pool_size=2)
+authenticator = Authenticator(
+    auth_engine,
+    secret_word,
+    AttemptThrottle(
+        user_limit=int(os.environ.get('AUTH_USER_LIMIT', 5)),
+        user_window=int(os.environ.get('AUTH_USER_WINDOW', 600)),
+        global_limit=int(os.environ.get('AUTH_GLOBAL_LIMIT', 50)),
+        global_window=int(os.environ.get('AUTH_GLOBAL_WINDOW', 60)),
+        lockout=int(os.environ.get('AUTH_LOCKOUT', 900)),
+    ),
+    invite_ttl=int(os.environ.get('INVITE_TTL', 86400)),
+)
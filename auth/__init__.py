@@ -0,0 +1,2 @@
+from .throttle import AttemptThrottle
+from .authenticator import Authenticator, hash_code, new_code, normalize_code
@@ -0,0 +1,164 @@
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+import time
+
+from sqlalchemy.engine import Engine
+
+from database.dbworker import (add_auth_failure, add_invite_codes, delete_auth_failures, get_auth_failures,
+                               revoke_invite_codes, use_invite_code)
+from metrics import AUTH_ATTEMPTS, log_event
+
+from .throttle import AttemptThrottle
+
+# Letters and digits that can not be confused with each other when code is retyped from screen
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+CODE_LENGTH = 10
+_CODE_RE = re.compile(f'[{CODE_ALPHABET}]{{{CODE_LENGTH}}}')
+
+
+def normalize_code(text: str) -> str:
+    """Function that brings invite code typed by user to stored form: without dashes and spaces, in upper case.
+
+    Args:
+        text (str): Typed code
+
+    Returns:
+        str: Normalized code
+    """
+    return re.sub(r'[\s-]', '', text).upper()
+
+
+def hash_code(code: str) -> str:
+    """Function that returns hash of invite code that is stored in database instead of code.
+
+    Args:
+        code (str): Normalized code
+
+    Returns:
+        str: Hex digest of code
+    """
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def new_code() -> str:
+    """Function that generates random invite code.
+
+    Returns:
+        str: Code split in two halves by dash, so it is easier to retype
+    """
+    code = ''.join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+    return f'{code[:CODE_LENGTH // 2]}-{code[CODE_LENGTH // 2:]}'
+
+
+class Authenticator:
+    """Checks secret word and one-time invite codes typed by users that register.
+
+    Throttle is checked before anything else, so locked users cost no database queries.
+    Secret word is compared in constant time. Failures are stored in database and replayed
+    by load after restart, so restart does not reset lockouts.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        secret_word (str): Secret word known to clan members, None allows only invite codes
+        throttle (AttemptThrottle): Windows of failed attempts
+        invite_ttl (int): Amount of seconds invite code can be used for
+    """
+
+    def __init__(self, engine: Engine, secret_word: str, throttle: AttemptThrottle, invite_ttl: int = 86400) -> None:
+        self.engine = engine
+        self.secret_word = secret_word
+        self.throttle = throttle
+        self.invite_ttl = invite_ttl
+
+    def load(self) -> None:
+        """Function that restores throttle from failures stored before restart and removes outdated ones."""
+        since = int(time.time()) - self.throttle.horizon
+        self.throttle.replay(get_auth_failures(since, self.engine))
+        delete_auth_failures(self.engine, before=since)
+
+    def retry_after(self, user_id: int) -> float:
+        """Function that tells when user can try to authenticate, it does not touch database.
+        User waits while locked and while failures of all users fill global window.
+
+        Args:
+            user_id (int): ID of user that is defined by Telegram
+
+        Returns:
+            float: Amount of seconds to wait, 0 if user can try now
+        """
+        return self.throttle.retry_after(user_id, time.time())
+
+    def _matches_secret(self, text: str) -> bool:
+        if not self.secret_word:
+            return False
+        return hmac.compare_digest(text.encode(), self.secret_word.encode())
+
+    def _use_code(self, text: str, user_id: int, now: int) -> bool:
+        code = normalize_code(text)
+        # text that can not be a code is rejected without database
+        if not _CODE_RE.fullmatch(code):
+            return False
+        return use_invite_code(hash_code(code), user_id, now, self.engine)
+
+    def authenticate(self, user_id: int, text: str) -> tuple:
+        """Function that checks text typed by user.
+
+        Args:
+            user_id (int): ID of user that is defined by Telegram
+            text (str): Secret word or invite code
+
+        Returns:
+            tuple: "passed", "failed" or "locked", and amount of seconds user has to wait if locked
+        """
+        now = time.time()
+        wait = self.throttle.retry_after(user_id, now)
+        if wait:
+            AUTH_ATTEMPTS.inc(result='throttled')
+            return 'locked', wait
+
+        text = text or ''
+        if self._matches_secret(text) or self._use_code(text, user_id, int(now)):
+            AUTH_ATTEMPTS.inc(result='passed')
+            self.throttle.succeed(user_id)
+            delete_auth_failures(self.engine, user_id=user_id)
+            return 'passed', 0
+
+        AUTH_ATTEMPTS.inc(result='failed')
+        locked = self.throttle.fail(user_id, now)
+        add_auth_failure(user_id, int(now), self.engine)
+        if locked:
+            log_event('auth_locked', logging.WARNING, user_id=user_id, seconds=locked)
+            return 'locked', locked
+        log_event('auth_failed', user_id=user_id)
+        return 'failed', 0
+
+    def issue_codes(self, leader_id: int, amount: int = 1) -> list:
+        """Function that creates one-time invite codes.
+
+        Args:
+            leader_id (int): ID of leader that creates codes
+            amount (int): Amount of codes
+
+        Returns:
+            list: Codes that can be given to new members, empty if they were not stored
+        """
+        now = int(time.time())
+        codes = [new_code() for _ in range(amount)]
+        if not add_invite_codes([hash_code(normalize_code(code)) for code in codes], leader_id, now, now + self.invite_ttl, self.engine):
+            return []
+        log_event('invites_issued', leader_id=leader_id, amount=amount)
+        return codes
+
+    def revoke_codes(self, leader_id: int) -> int:
+        """Function that makes all unused invite codes of leader invalid.
+
+        Args:
+            leader_id (int): ID of leader that created codes
+
+        Returns:
+            int: Amount of revoked codes
+        """
+        return revoke_invite_codes(leader_id, int(time.time()), self.engine)
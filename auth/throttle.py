@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict, deque
+
+
+class AttemptThrottle:
+    """Sliding windows of failed authentication attempts of every user and of all users together.
+
+    User that failed user_limit times within user_window is locked for lockout seconds.
+    When all users failed global_limit times within global_window, nobody can try until window moves.
+    Only failures are counted, so throttle is checked without database.
+
+    Args:
+        user_limit (int): Amount of failures of one user that causes lockout
+        user_window (int): Length of window of one user in seconds
+        global_limit (int): Amount of failures of all users that stops all attempts
+        global_window (int): Length of window of all users in seconds
+        lockout (int): Amount of seconds user is locked for
+        capacity (int): Maximum amount of users whose failures are kept in memory
+    """
+
+    def __init__(self, user_limit: int = 5, user_window: int = 600, global_limit: int = 50,
+                 global_window: int = 60, lockout: int = 900, capacity: int = 10000) -> None:
+        self.user_limit = user_limit
+        self.user_window = user_window
+        self.global_limit = global_limit
+        self.global_window = global_window
+        self.lockout = lockout
+        self.capacity = capacity
+        self._failures = OrderedDict()
+        self._locked = {}
+        self._global = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def horizon(self) -> int:
+        """Amount of seconds after which failure does not matter anymore."""
+        return max(self.user_window, self.global_window, self.lockout)
+
+    @staticmethod
+    def _trim(attempts: deque, since: float) -> None:
+        while attempts and attempts[0] <= since:
+            attempts.popleft()
+
+    def locked_for(self, user_id: int, now: float) -> float:
+        """Function that tells how long user stays locked.
+
+        Args:
+            user_id (int): ID of user that is defined by Telegram
+            now (float): Current unix time
+
+        Returns:
+            float: Amount of seconds until lockout ends, 0 if user is not locked
+        """
+        with self._lock:
+            until = self._locked.get(user_id, 0)
+            if until <= now:
+                self._locked.pop(user_id, None)
+                return 0
+            return until - now
+
+    def retry_after(self, user_id: int, now: float) -> float:
+        """Function that tells when user can try to authenticate.
+
+        Args:
+            user_id (int): ID of user that is defined by Telegram
+            now (float): Current unix time
+
+        Returns:
+            float: Amount of seconds to wait, 0 if user can try now
+        """
+        locked = self.locked_for(user_id, now)
+        if locked:
+            return locked
+        with self._lock:
+            self._trim(self._global, now - self.global_window)
+            if len(self._global) >= self.global_limit:
+                return self._global[0] + self.global_window - now
+        return 0
+
+    def fail(self, user_id: int, now: float) -> float:
+        """Function that counts failed attempt.
+
+        Args:
+            user_id (int): ID of user that is defined by Telegram
+            now (float): Unix time of attempt
+
+        Returns:
+            float: Amount of seconds user is locked for because of this attempt, 0 if user is not locked
+        """
+        with self._lock:
+            self._global.append(now)
+            self._trim(self._global, now - self.global_window)
+            attempts = self._failures.setdefault(user_id, deque())
+            self._failures.move_to_end(user_id)
+            self._trim(attempts, now - self.user_window)
+            attempts.append(now)
+            while len(self._failures) > self.capacity:
+                self._failures.popitem(last=False)
+            if len(self._locked) > self.capacity:
+                self._locked = {user: until for user, until in self._locked.items() if until > now}
+
+            if len(attempts) < self.user_limit:
+                return 0
+            del self._failures[user_id]
+            self._locked[user_id] = now + self.lockout
+            return self.lockout
+
+    def succeed(self, user_id: int) -> None:
+        """Function that forgets failures of user that authenticated.
+
+        Args:
+            user_id (int): ID of user that is defined by Telegram
+        """
+        with self._lock:
+            self._failures.pop(user_id, None)
+            self._locked.pop(user_id, None)
+
+    def replay(self, failures: list) -> None:
+        """Function that restores windows and lockouts from stored failures.
+
+        Args:
+            failures (list): Pairs of user ID and unix time of failure ordered by time
+        """
+        for user_id, failed_at in failures:
+            self.fail(user_id, failed_at)
@@ -0,0 +1,196 @@
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+class FakeBotAPI:
+    """Local stand-in of Telegram Bot API that serves queued updates and records sent messages.
+
+    Point TeleBot at it by setting TELEGRAM_API_URL to api_url in config.env.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on, 0 picks free port
+        latency (float): Amount of seconds every request is delayed
+        flood_rate (float): Share of sendMessage requests that are answered with 429
+        retry_after (int): Value of "retry_after" in 429 answers
+        handshake (float): Amount of seconds every new connection is delayed, like TLS handshake with Telegram
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 flood_rate: float = 0.0, retry_after: int = 1, handshake: float = 0.0) -> None:
+        self.latency = latency
+        self.handshake = handshake
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.sent = []
+        self.revised = []
+        self.calls = {}
+        self.connections = 0
+        self._failures = {}
+        self._updates = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._lock = threading.Lock()
+        self._has_updates = threading.Condition(self._lock)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.server.handle_error = self._handle_error
+        self._thread = None
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/bot{{0}}/{{1}}'
+
+    def start(self) -> 'FakeBotAPI':
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle_error(self, request, client_address) -> None:
+        # clients that are stopped while waiting for long polling answer are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            ThreadingHTTPServer.handle_error(self.server, request, client_address)
+
+    def push_update(self, update: dict) -> int:
+        """Function that queues update for getUpdates.
+
+        Args:
+            update (dict): Update without "update_id"
+
+        Returns:
+            int: Assigned update ID
+        """
+        with self._has_updates:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append(dict(update, update_id=update_id))
+            self._has_updates.notify_all()
+        return update_id
+
+    def fail_chat(self, chat_id: int, error_code: int, times: int = None) -> None:
+        """Function that makes sendMessage to chat answer with error.
+
+        Args:
+            chat_id (int): ID of chat
+            error_code (int): Code of error, 429 answers contain "retry_after"
+            times (int, optional): Amount of requests that fail, every request fails if not passed
+        """
+        with self._lock:
+            self._failures[chat_id] = [error_code, times]
+
+    def unacknowledged(self) -> list:
+        """Function that returns IDs of updates that were not acknowledged by offset of getUpdates yet."""
+        with self._lock:
+            return [update['update_id'] for update in self._updates]
+
+    def sent_count(self) -> int:
+        with self._lock:
+            return len(self.sent)
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset', 0))
+        timeout = float(params.get('timeout', 0))
+        with self._has_updates:
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            if not self._updates and timeout:
+                self._has_updates.wait(timeout)
+            return list(self._updates)
+
+    def _scripted_failure(self, chat_id: int) -> int:
+        with self._lock:
+            failure = self._failures.get(chat_id)
+            if failure is None:
+                return None
+            error_code, times = failure
+            if times is not None:
+                if times <= 1:
+                    del self._failures[chat_id]
+                failure[1] = times - 1
+            return error_code
+
+    def _send_message(self, params: dict) -> tuple:
+        error_code = self._scripted_failure(int(params['chat_id']))
+        if error_code is None and self.flood_rate and random.random() < self.flood_rate:
+            error_code = 429
+        if error_code == 429:
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after',
+                         'parameters': {'retry_after': self.retry_after}}
+        if error_code is not None:
+            return error_code, {'ok': False, 'error_code': error_code, 'description': f'Error {error_code}'}
+        with self._lock:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            self.sent.append((time.monotonic(), int(params['chat_id']), params.get('text', '')))
+        return 200, {'ok': True, 'result': {
+            'message_id': message_id, 'date': int(time.time()),
+            'chat': {'id': int(params['chat_id']), 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'bench'},
+            'text': params.get('text', ''),
+        }}
+
+    def _dispatch(self, method: str, params: dict) -> tuple:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}}
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(params)}
+        if method == 'sendMessage':
+            return self._send_message(params)
+        if method in ('editMessageText', 'deleteMessage'):
+            with self._lock:
+                self.revised.append((method, int(params['chat_id']), int(params['message_id'])))
+        return 200, {'ok': True, 'result': True}
+
+    def _handler(self) -> type:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, Nagle algorithm would delay body of kept-alive answers
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                super().setup()
+                with api._lock:
+                    api.connections += 1
+                if api.handshake:
+                    time.sleep(api.handshake)
+
+            def _handle(self) -> None:
+                url = urlparse(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length', 0))
+                if length:
+                    body = self.rfile.read(length)
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body.decode()))
+                if api.latency:
+                    time.sleep(api.latency)
+                status, answer = api._dispatch(url.path.rsplit('/', 1)[-1], params)
+                data = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,159 @@
+"""Benchmark of handlers in commands/start.py against local fake Bot API.
+
+Usage: python -m bench.run --users 500 --group 1000
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from .fake_api import FakeBotAPI
+
+LEADER_ID = 1
+GROUP_ID = -1000
+SECRET = 'bench-secret'
+
+
+class DBTimer:
+    """Accumulates time spent in SQL statements of current thread."""
+
+    def __init__(self, engine) -> None:
+        self.local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self.before)
+        event.listen(engine, 'after_cursor_execute', self.after)
+
+    def before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.local.started = time.perf_counter()
+
+    def after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.local.total = self.total() + time.perf_counter() - self.local.started
+
+    def total(self) -> float:
+        return getattr(self.local, 'total', 0.0)
+
+
+def message(update_id: int, user_id: int, text: str, chat_id: int = None) -> dict:
+    chat_id = chat_id or user_id
+    data = {
+        'message_id': update_id, 'date': int(time.time()), 'text': text,
+        'chat': {'id': chat_id, 'type': 'private' if chat_id == user_id else 'supergroup'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}',
+                 'username': f'user{user_id}' if user_id % 5 else None},
+    }
+    if text.startswith('/'):
+        data['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': data}
+
+
+def percentile(values: list, share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+class Bench:
+    def __init__(self, bot, engine, api: FakeBotAPI) -> None:
+        from telebot.types import Update
+        self.Update = Update
+        self.bot = bot
+        self.api = api
+        self.db = DBTimer(engine)
+        self.update_id = 0
+
+    def replay(self, name: str, stream: list) -> None:
+        latencies = []
+        db_times = []
+        errors = 0
+        sent_before = self.api.sent_count()
+        started = time.perf_counter()
+        for user_id, text, chat_id in stream:
+            self.update_id += 1
+            update = self.Update.de_json(message(self.update_id, user_id, text, chat_id))
+            db_before = self.db.total()
+            handler_started = time.perf_counter()
+            # handlers print every command, which would drown the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                try:
+                    self.bot.process_new_updates([update])
+                except Exception:
+                    errors += 1
+            latencies.append(time.perf_counter() - handler_started)
+            db_times.append(self.db.total() - db_before)
+        elapsed = time.perf_counter() - started
+        self.report(name, latencies, db_times, self.api.sent_count() - sent_before, elapsed, errors)
+
+    @staticmethod
+    def report(name: str, latencies: list, db_times: list, sent: int, elapsed: float, errors: int) -> None:
+        print(f"{name:<14} updates={len(latencies):<6} "
+              f"p50={percentile(latencies, 0.5) * 1000:7.2f}ms p99={percentile(latencies, 0.99) * 1000:7.2f}ms "
+              f"db/update={statistics.fmean(db_times) * 1000 if db_times else 0:6.2f}ms "
+              f"sends={sent:<6} sends/s={sent / elapsed if elapsed else 0:8.1f} errors={errors}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help='amount of users that register and receive broadcast')
+    parser.add_argument('--group', type=int, default=500, help='amount of group members mentioned by /everyone')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every fake API request in seconds')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='share of sendMessage answered with 429')
+    parser.add_argument('--rate', type=float, default=1000, help='global broadcast rate limit, messages per second')
+    args = parser.parse_args()
+
+    api = FakeBotAPI(latency=args.latency, flood_rate=args.flood_rate).start()
+    workdir = tempfile.mkdtemp(prefix='samus-bench-')
+    os.environ.update(
+        BOT_TOKEN='1:bench', DEV_ID=str(LEADER_ID), LEADER_ID=str(LEADER_ID), AUTH_WORD=SECRET,
+        TELEGRAM_API_URL=api.api_url, DATABASE_URL=f'sqlite+pysqlite:///{workdir}/bench.db',
+        BROADCAST_GLOBAL_RATE=str(args.rate), BROADCAST_CHAT_RATE=str(args.rate),
+    )
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from loader import get_bot, get_broadcast_queue, get_engine
+    import commands
+    from database.dbworker import bulk_import_templates, bulk_upsert_users, ensure_schema
+
+    engine = get_engine()
+    bot = get_bot()
+    broadcast_queue = get_broadcast_queue()
+    ensure_schema(engine)
+    commands.register(bot)
+    bot.threaded = False
+    bench = Bench(bot, engine, api)
+    users = list(range(LEADER_ID + 1, LEADER_ID + 1 + args.users))
+
+    bench.replay('registration', [
+        step for user_id in users
+        for step in ((user_id, '/start', None), (user_id, f'nick{user_id}', None), (user_id, SECRET, None))
+    ])
+
+    bulk_import_templates(['Привет, имя_игрока! Сбор на КВ дата_сегодня'], engine)
+    broadcast_queue.start()
+    sent_before = api.sent_count()
+    started = time.perf_counter()
+    bench.replay('/all', [(LEADER_ID, '/all', None), (LEADER_ID, '1', None)])
+    # leader gets "choose_template", template list and "broadcast_started" replies before broadcast itself
+    while api.sent_count() - sent_before < len(users) + 4 and time.perf_counter() - started < 300:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    sent = api.sent_count() - sent_before
+    print(f"{'broadcast':<14} recipients={len(users):<6} sends={sent:<6} elapsed={elapsed:6.2f}s sends/s={sent / elapsed:8.1f}")
+
+    members = list(range(10_000, 10_000 + args.group))
+    bulk_upsert_users([{'id': user_id, 'username': f'member{user_id}' if user_id % 4 else None} for user_id in members], engine)
+    bench.replay('group chatter', [(user_id, 'привет', GROUP_ID) for user_id in members])
+    bench.replay('/everyone', [(members[0], '/everyone', GROUP_ID)] * 5)
+
+    print(f"API calls: {api.calls}")
+    api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark of bot restart: time from start of app.py until it answers update that was waiting for it.
+
+Cold run starts with empty database, so schema is created. Warm runs reuse database, like restart after deploy.
+
+Usage: python -m bench.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .fake_api import FakeBotAPI
+from .run import message
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID = 100
+
+
+def start_bot(api: FakeBotAPI, database_url: str, timeout: float) -> tuple:
+    """Function that starts app.py and waits for its first answer.
+
+    Args:
+        api (FakeBotAPI): Fake Bot API with queued update
+        database_url (str): Database of bot
+        timeout (float): Maximum amount of seconds to wait
+
+    Returns:
+        tuple: Seconds until first answer and seconds reported by bot in "startup" log event
+    """
+    api.push_update(message(0, USER_ID, '/help'))
+    sent_before = api.sent_count()
+    env = dict(os.environ, BOT_TOKEN='1:bench', DEV_ID='1', LEADER_ID='1', AUTH_WORD='bench-secret',
+               TELEGRAM_API_URL=api.api_url, DATABASE_URL=database_url)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        while api.sent_count() == sent_before:
+            if time.perf_counter() - started > timeout or process.poll() is not None:
+                raise RuntimeError('bot did not answer')
+            time.sleep(0.002)
+        answered = time.perf_counter() - started
+    finally:
+        process.terminate()
+        _, stderr = process.communicate()
+
+    ready = None
+    for line in stderr.splitlines():
+        if line.startswith('{') and '"startup"' in line:
+            ready = json.loads(line)['seconds']
+    return answered, ready
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='amount of warm restarts')
+    parser.add_argument('--timeout', type=float, default=30, help='maximum seconds to wait for answer')
+    args = parser.parse_args()
+
+    api = FakeBotAPI().start()
+    workdir = tempfile.mkdtemp(prefix='samus-startup-')
+    database_url = f'sqlite+pysqlite:///{workdir}/bench.db'
+
+    answered, ready = start_bot(api, database_url, args.timeout)
+    print(f"{'cold':<6} first answer={answered * 1000:8.1f}ms ready={ready * 1000 if ready else 0:8.1f}ms")
+
+    results = [start_bot(api, database_url, args.timeout) for _ in range(args.runs)]
+    answers = [answered for answered, _ in results]
+    readies = [ready for _, ready in results if ready is not None]
+    print(f"{'warm':<6} first answer={statistics.median(answers) * 1000:8.1f}ms "
+          f"ready={statistics.median(readies) * 1000 if readies else 0:8.1f}ms "
+          f"min={min(answers) * 1000:.1f}ms max={max(answers) * 1000:.1f}ms runs={args.runs}")
+    api.stop()
+
+
+if __name__ == '__main__':
+    main()
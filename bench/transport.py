@@ -0,0 +1,72 @@
+"""Benchmark of HTTP transport: sends messages from many threads through default telebot sessions
+and through pooled Transport, and reports throughput, latency and connections opened on fake Bot API side.
+
+Usage: python -m bench.transport --messages 2000 --workers 8 --latency 0.005 --handshake 0.1
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .fake_api import FakeBotAPI
+from .run import percentile
+
+
+def run(bot, api: FakeBotAPI, messages: int, workers: int) -> tuple:
+    """Function that sends messages in parallel and measures them.
+
+    Args:
+        bot (TeleBot): Bot that sends messages
+        api (FakeBotAPI): Fake Bot API that receives messages
+        messages (int): Amount of messages
+        workers (int): Amount of sending threads
+
+    Returns:
+        tuple: Seconds spent, latencies of requests and amount of opened connections
+    """
+    def send(chat_id: int) -> float:
+        started = time.perf_counter()
+        bot.send_message(chat_id, 'bench')
+        return time.perf_counter() - started
+
+    connections_before = api.connections
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(send, range(messages)))
+    return time.perf_counter() - started, latencies, api.connections - connections_before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000, help='amount of messages sent by each transport')
+    parser.add_argument('--workers', type=int, default=8, help='amount of sending threads')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every fake API request in seconds')
+    parser.add_argument('--handshake', type=float, default=0.1, help='delay of every new connection in seconds')
+    parser.add_argument('--rounds', type=int, default=3, help='amount of rounds, threads are recreated every round')
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from telebot import TeleBot, apihelper
+    from transport import Transport
+
+    api = FakeBotAPI(latency=args.latency, handshake=args.handshake).start()
+    apihelper.API_URL = api.api_url
+    bot = TeleBot('1:bench', threaded=False)
+    transports = {'default': None, 'pooled': Transport(pool_size=args.workers).send}
+    for name, sender in transports.items():
+        apihelper.CUSTOM_REQUEST_SENDER = sender
+        elapsed, latencies, connections = 0, [], 0
+        for _ in range(args.rounds):
+            round_elapsed, round_latencies, round_connections = run(bot, api, args.messages, args.workers)
+            elapsed += round_elapsed
+            latencies += round_latencies
+            connections += round_connections
+        print(f"{name:<8} sends={len(latencies):<6} sends/s={len(latencies) / elapsed:8.1f} "
+              f"p50={percentile(latencies, 0.5) * 1000:6.2f}ms p99={percentile(latencies, 0.99) * 1000:6.2f}ms "
+              f"connections={connections}")
+    api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+from .limiter import TokenBucket, SharedTokenBucket, ChatRateLimiter
+from .sender import Broadcaster, Receipt
+from .queue import BroadcastQueue
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+
+from metrics import log_event
+
+from .limiter import ChatRateLimiter, TokenBucket
+from .sender import BAD_REQUEST_CODE, BLOCKED_CODE
+
+
+@dataclass
+class BroadcastReport:
+    """Result of one broadcast.
+
+    Args:
+        delivered (int): Amount of messages that were sent
+        failed (int): Amount of messages that were not sent after all retries
+        blocked (list): IDs of users that blocked the bot or can not be reached
+    """
+    delivered: int = 0
+    failed: int = 0
+    blocked: list = field(default_factory=list)
+
+    def add(self, chat_id: int, status: str) -> None:
+        if status == 'delivered':
+            self.delivered += 1
+        elif status == 'blocked':
+            self.blocked.append(chat_id)
+        else:
+            self.failed += 1
+
+
+async def acquire(bucket: TokenBucket) -> None:
+    """Function that waits for token of the bucket without blocking event loop.
+
+    Args:
+        bucket (TokenBucket): Bucket to take token from
+    """
+    while True:
+        wait = bucket.try_acquire()
+        if not wait:
+            return
+        await asyncio.sleep(wait)
+
+
+class AsyncBroadcaster:
+    """Asyncio version of Broadcaster that multiplexes sends on one event loop.
+
+    Args:
+        bot (AsyncTeleBot): Bot that is used to send messages
+        workers (int): Maximum amount of messages that are sent at the same time
+        global_rate (float): Amount of messages per second that bot can send overall
+        chat_rate (float): Amount of messages per second that bot can send to one chat
+        max_retries (int): Amount of retries for transient failures
+        max_flood_waits (int): Amount of times message waits for "retry_after" of 429, they are not counted as retries
+    """
+
+    def __init__(self, bot: AsyncTeleBot, workers: int = 8, global_rate: float = 30,
+                 chat_rate: float = 1, max_retries: int = 3, max_flood_waits: int = 10) -> None:
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_flood_waits = max_flood_waits
+        self.limiter = ChatRateLimiter(global_rate, chat_rate)
+
+    async def send(self, chat_id: int, text: str) -> str:
+        """Function that sends one message honouring rate limits and retrying transient failures.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+            text (str): Text of message
+
+        Returns:
+            str: "delivered", "blocked" or "failed"
+        """
+        attempt = 0
+        flood_waits = 0
+        while True:
+            await acquire(self.limiter.chat_bucket(chat_id))
+            await acquire(self.limiter.global_bucket)
+            try:
+                await self.bot.send_message(chat_id, text)
+                return 'delivered'
+            except ApiTelegramException as e:
+                # Telegram tells how long to wait, so waiting is not a failed attempt and has its own cap
+                if e.error_code == 429 and flood_waits < self.max_flood_waits:
+                    flood_waits += 1
+                    self.limiter.pause(e.result_json.get('parameters', {}).get('retry_after', 1))
+                    continue
+                if e.error_code == BLOCKED_CODE:
+                    log_event('recipient_blocked', chat_id=chat_id, description=e.description)
+                    return 'blocked'
+                log_event('send_error', logging.WARNING, chat_id=chat_id, code=e.error_code, description=e.description)
+                if e.error_code in (429, BAD_REQUEST_CODE):
+                    return 'failed'
+            except Exception as e:
+                log_event('send_error', logging.WARNING, chat_id=chat_id, error=str(e))
+            if attempt >= self.max_retries:
+                return 'failed'
+            await asyncio.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1))
+            attempt += 1
+
+    async def broadcast(self, messages: Iterable[tuple]) -> BroadcastReport:
+        """Function that sends all messages concurrently.
+
+        Args:
+            messages (Iterable[tuple]): Pairs of chat id and text of message for this chat
+
+        Returns:
+            BroadcastReport: Amount of delivered and failed messages
+        """
+        report = BroadcastReport()
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def deliver(chat_id: int, text: str) -> None:
+            async with semaphore:
+                report.add(chat_id, await self.send(chat_id, text))
+
+        await asyncio.gather(*(deliver(chat_id, text) for chat_id, text in messages))
+        return report
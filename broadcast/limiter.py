@@ -0,0 +1,143 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket that limits how often an action can happen.
+
+    Args:
+        rate (float): Amount of tokens that are added to the bucket every second
+        capacity (int): Maximum amount of tokens that bucket can hold
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Function that tries to take one token from the bucket.
+
+        Returns:
+            float: 0 if token was taken, otherwise amount of seconds to wait for the next token
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Function that blocks until one token is taken from the bucket."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Function that empties the bucket so nothing is taken for given amount of seconds.
+
+        Args:
+            seconds (float): Amount of seconds during which bucket stays empty
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket which state is kept in shared memory, so processes started with it share one limit.
+
+    Args:
+        rate (float): Amount of tokens that are added to the bucket every second
+        capacity (int): Maximum amount of tokens that bucket can hold
+        context (optional): Multiprocessing context that starts processes, default one if not passed
+    """
+
+    def __init__(self, rate: float, capacity: int, context=None) -> None:
+        if context is None:
+            import multiprocessing
+            context = multiprocessing.get_context()
+        self.rate = rate
+        self.capacity = capacity
+        self._shared_tokens = context.Value('d', float(capacity), lock=False)
+        self._shared_updated = context.Value('d', time.monotonic(), lock=False)
+        self._lock = context.Lock()
+
+    @property
+    def _tokens(self) -> float:
+        return self._shared_tokens.value
+
+    @_tokens.setter
+    def _tokens(self, value: float) -> None:
+        self._shared_tokens.value = value
+
+    @property
+    def _updated(self) -> float:
+        return self._shared_updated.value
+
+    @_updated.setter
+    def _updated(self, value: float) -> None:
+        self._shared_updated.value = value
+
+
+
+class ChatRateLimiter:
+    """Limiter that combines global Telegram limit with limit for every single chat.
+
+    Args:
+        global_rate (float): Amount of messages per second that bot can send overall
+        chat_rate (float): Amount of messages per second that bot can send to one chat
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1) -> None:
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(global_rate, max(1, int(global_rate)))
+        self._chat_buckets = {}
+        self._lock = threading.Lock()
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Function that returns bucket of chat, creating it when needed.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+
+        Returns:
+            TokenBucket: Bucket that limits sends to this chat
+        """
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(self.chat_rate, 1)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def acquire(self, chat_id: int) -> None:
+        """Function that blocks until message can be sent to the chat.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+        """
+        self.chat_bucket(chat_id).acquire()
+        self.global_bucket.acquire()
+
+    def pause(self, seconds: float, chat_id: int = None) -> None:
+        """Function that stops sends after Telegram answered with "retry_after".
+
+        Args:
+            seconds (float): Amount of seconds given by Telegram
+            chat_id (int, optional): ID of chat that was limited. If not passed, all sends are paused
+        """
+        if chat_id is None:
+            self.global_bucket.pause(seconds)
+        else:
+            self.chat_bucket(chat_id).pause(seconds)
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from concurrent.futures import wait
+from typing import Callable
+
+from sqlalchemy.engine import Engine
+
+from database.idempotency import IdempotencyStore
+from database.dbworker import (add_receipts, claim_deliveries, count_pending_deliveries, create_broadcast_job,
+                               deactivate_users, finish_broadcast_job, get_sent_messages, get_unfinished_jobs,
+                               recover_deliveries, set_delivery_status, start_broadcast_job)
+from metrics import BROADCAST_DELIVERIES, BROADCAST_JOBS, BROADCAST_PENDING, DUPLICATES, log_event
+
+from .sender import Broadcaster, Receipt
+
+
+class BroadcastQueue:
+    """Persistent queue of broadcasts that is drained by background thread.
+
+    Every broadcast is stored in database as a job with one row per recipient, so after restart
+    unfinished jobs are resumed. Rows that were being sent when process stopped are not sent again.
+    Several processes can drain the same jobs, every row is taken by only one of them.
+    Amount of pending messages is counted in database on start and after every job, between them
+    it is changed by enqueued and sent messages, so metrics scrapes do not query database.
+
+    Args:
+        broadcaster (Broadcaster): Engine that sends messages within Telegram limits
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        batch_size (int): Amount of deliveries that are taken from database at once
+        dedup (IdempotencyStore): Store of send keys, message to the same recipient of the same job is not sent twice
+        owner (str): Name of process, that is stored in rows it takes
+        poll_interval (float, optional): Amount of seconds between checks for jobs enqueued by other processes
+    """
+
+    def __init__(self, broadcaster: Broadcaster, engine: Engine, batch_size: int = 100,
+                 dedup: IdempotencyStore = None, owner: str = 'main', poll_interval: float = None) -> None:
+        self.broadcaster = broadcaster
+        self.engine = engine
+        self.batch_size = batch_size
+        self.dedup = dedup
+        self.owner = owner
+        self.poll_interval = poll_interval
+        self.on_done: Callable = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Function that starts background worker and resumes unfinished jobs."""
+        if self._thread is not None:
+            return
+        recover_deliveries(self.owner, self.engine)
+        BROADCAST_PENDING.set(count_pending_deliveries(self.engine))
+        self._thread = threading.Thread(target=self._loop, name='broadcast-queue', daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def enqueue(self, leader_id: int, messages) -> int:
+        """Function that stores new broadcast and wakes up worker.
+
+        Args:
+            leader_id (int): ID of leader that requested broadcast
+            messages (Iterable[tuple]): Pairs of user id and text of message for this user
+
+        Returns:
+            int: ID of created job or None if it was not stored
+        """
+        messages = list(messages)
+        job_id = create_broadcast_job(leader_id, messages, self.engine)
+        if job_id is not None:
+            BROADCAST_JOBS.inc(state='created')
+            BROADCAST_PENDING.inc(len(messages))
+        self._wake.set()
+        return job_id
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            for job_id in get_unfinished_jobs(self.engine):
+                try:
+                    self._drain(job_id)
+                except Exception as e:
+                    log_event('broadcast_error', job_id=job_id, error=str(e))
+
+    def edit_job(self, job_id: int, render: Callable[[int], str], on_done: Callable[[dict], None] = None) -> None:
+        """Function that replaces text of all delivered messages of broadcast in background.
+
+        Args:
+            job_id (int): ID of broadcast job
+            render (Callable[[int], str]): Function that returns new text for user id
+            on_done (Callable[[dict], None], optional): Function that receives amount of requests for every status
+        """
+        self._revise(job_id, 'edit', lambda user_id, message_id: self.broadcaster.edit(user_id, message_id, render(user_id)),
+                     on_done)
+
+    def delete_job(self, job_id: int, on_done: Callable[[dict], None] = None) -> None:
+        """Function that deletes all delivered messages of broadcast in background.
+
+        Args:
+            job_id (int): ID of broadcast job
+            on_done (Callable[[dict], None], optional): Function that receives amount of requests for every status
+        """
+        self._revise(job_id, 'delete', self.broadcaster.delete, on_done)
+
+    def _revise(self, job_id: int, action: str, request: Callable[[int, int], Receipt], on_done: Callable) -> None:
+        def run() -> None:
+            counts = {}
+            for batch in range(0, len(messages), self.batch_size):
+                futures = [self.broadcaster.executor.submit(request, user_id, message_id)
+                           for user_id, message_id in messages[batch:batch + self.batch_size]]
+                wait(futures)
+                receipts = [self._receipt(job_id, user_id, action, future.result())
+                            for (user_id, _), future in zip(messages[batch:batch + self.batch_size], futures)]
+                add_receipts(receipts, self.engine)
+                for receipt in receipts:
+                    counts[receipt['status']] = counts.get(receipt['status'], 0) + 1
+            log_event('broadcast_revised', job_id=job_id, action=action, **counts)
+            if on_done is not None:
+                try:
+                    on_done(counts)
+                except Exception as e:
+                    log_event('broadcast_report_error', logging.ERROR, error=str(e))
+
+        messages = get_sent_messages(job_id, self.engine)
+        threading.Thread(target=run, name=f'broadcast-{action}', daemon=True).start()
+
+    @staticmethod
+    def _receipt(job_id: int, user_id: int, action: str, receipt: Receipt) -> dict:
+        return {
+            'job_id': job_id, 'user_id': user_id, 'action': action, 'status': receipt.status,
+            'message_id': receipt.message_id, 'latency_ms': int(receipt.latency * 1000),
+            'error_code': receipt.error_code, 'created_at': int(time.time()),
+        }
+
+    def _deliver(self, job_id: int, delivery_id: int, user_id: int, text: str) -> dict:
+        receipt = self.broadcaster.deliver(user_id, text)
+        set_delivery_status(delivery_id, receipt.status, self.engine)
+        BROADCAST_DELIVERIES.inc(status=receipt.status)
+        if receipt.status == 'blocked':
+            deactivate_users([user_id], self.engine)
+        return self._receipt(job_id, user_id, 'send', receipt)
+
+    def _unique(self, job_id: int, deliveries: list) -> list:
+        if self.dedup is None:
+            return deliveries
+        claimed = self.dedup.claim_many([f'send:{job_id}:{user_id}' for _, user_id, _ in deliveries])
+        unique = []
+        for delivery_id, user_id, text in deliveries:
+            key = f'send:{job_id}:{user_id}'
+            if key in claimed:
+                claimed.discard(key)
+                unique.append((delivery_id, user_id, text))
+            else:
+                set_delivery_status(delivery_id, 'duplicate', self.engine)
+                DUPLICATES.inc(kind='send')
+        return unique
+
+    def _drain(self, job_id: int) -> None:
+        if start_broadcast_job(job_id, self.engine):
+            BROADCAST_JOBS.inc(state='started')
+        started = time.monotonic()
+        sent = 0
+        while True:
+            deliveries = claim_deliveries(job_id, self.batch_size, self.engine, self.owner)
+            if not deliveries:
+                break
+            claimed = len(deliveries)
+            deliveries = self._unique(job_id, deliveries)
+            futures = [self.broadcaster.executor.submit(self._deliver, job_id, *delivery) for delivery in deliveries]
+            wait(futures)
+            add_receipts([future.result() for future in futures], self.engine)
+            BROADCAST_PENDING.dec(claimed)
+            sent += len(deliveries)
+
+        job, counts = finish_broadcast_job(job_id, self.engine)
+        # other processes enqueue and send messages too, so amount is counted again when job is finished
+        BROADCAST_PENDING.set(count_pending_deliveries(self.engine))
+        elapsed = time.monotonic() - started
+        if job is None:
+            return
+        BROADCAST_JOBS.inc(state='finished')
+        log_event('broadcast_finished', job_id=job_id, messages=sent, seconds=round(elapsed, 3),
+                  rate=round(sent / elapsed, 1) if elapsed else 0, **counts)
+        if self.on_done is not None:
+            self.on_done(job, counts)
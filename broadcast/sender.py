@@ -0,0 +1,137 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from metrics import log_event
+
+from .limiter import ChatRateLimiter
+
+# Telegram answers with 403 when user blocked the bot or deleted account
+BLOCKED_CODE = 403
+# Requests that failed with this code will fail again, so they are not retried
+BAD_REQUEST_CODE = 400
+
+
+@dataclass
+class Receipt:
+    """Result of one request to Telegram made by Broadcaster.
+
+    Args:
+        status (str): "delivered", "edited" or "deleted" if request succeeded, otherwise "blocked" or "failed"
+        message_id (int): ID of sent or changed message
+        error_code (int): Code of the last error returned by Telegram
+        latency (float): Amount of seconds from first attempt to result, waiting for limits included
+    """
+    status: str
+    message_id: int = None
+    error_code: int = None
+    latency: float = 0.0
+
+
+class Broadcaster:
+    """Engine that sends messages to many chats in parallel within Telegram limits.
+
+    Args:
+        bot (TeleBot): Bot that is used to send messages
+        workers (int): Amount of threads that send messages
+        global_rate (float): Amount of messages per second that bot can send overall
+        chat_rate (float): Amount of messages per second that bot can send to one chat
+        max_retries (int): Amount of retries for transient failures
+        max_flood_waits (int): Amount of times request waits for "retry_after" of 429, they are not counted as retries
+    """
+
+    def __init__(self, bot: TeleBot, workers: int = 8, global_rate: float = 30,
+                 chat_rate: float = 1, max_retries: int = 3, max_flood_waits: int = 10) -> None:
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_flood_waits = max_flood_waits
+        self.limiter = ChatRateLimiter(global_rate, chat_rate)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='broadcast')
+
+    def request(self, chat_id: int, call: Callable[[], Any], success: str = 'delivered') -> Receipt:
+        """Function that makes one request to chat honouring rate limits and retrying transient failures.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+            call (Callable[[], Any]): Function that makes request
+            success (str): Status of successful request
+
+        Returns:
+            Receipt: Result of request
+        """
+        started = time.monotonic()
+        error_code = None
+        attempt = 0
+        flood_waits = 0
+        while True:
+            self.limiter.acquire(chat_id)
+            try:
+                result = call()
+                return Receipt(success, getattr(result, 'message_id', None), error_code, time.monotonic() - started)
+            except ApiTelegramException as e:
+                error_code = e.error_code
+                # Telegram tells how long to wait, so waiting is not a failed attempt and has its own cap
+                if e.error_code == 429 and flood_waits < self.max_flood_waits:
+                    flood_waits += 1
+                    self.limiter.pause(e.result_json.get('parameters', {}).get('retry_after', 1))
+                    continue
+                if e.error_code == BLOCKED_CODE:
+                    log_event('recipient_blocked', chat_id=chat_id, description=e.description)
+                    return Receipt('blocked', None, error_code, time.monotonic() - started)
+                log_event('send_error', logging.WARNING, chat_id=chat_id, code=e.error_code, description=e.description)
+                if e.error_code in (429, BAD_REQUEST_CODE):
+                    return Receipt('failed', None, error_code, time.monotonic() - started)
+            except Exception as e:
+                log_event('send_error', logging.WARNING, chat_id=chat_id, error=str(e))
+            if attempt >= self.max_retries:
+                return Receipt('failed', None, error_code, time.monotonic() - started)
+            time.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1))
+            attempt += 1
+
+    def deliver(self, chat_id: int, text: str) -> Receipt:
+        """Function that sends one message.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+            text (str): Text of message
+
+        Returns:
+            Receipt: Result of sending with ID of sent message
+        """
+        return self.request(chat_id, lambda: self.bot.send_message(chat_id, text))
+
+    def edit(self, chat_id: int, message_id: int, text: str) -> Receipt:
+        """Function that replaces text of sent message.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+            message_id (int): ID of message
+            text (str): New text of message
+
+        Returns:
+            Receipt: Result of editing
+        """
+        receipt = self.request(chat_id, lambda: self.bot.edit_message_text(text, chat_id, message_id), 'edited')
+        receipt.message_id = message_id
+        return receipt
+
+    def delete(self, chat_id: int, message_id: int) -> Receipt:
+        """Function that deletes sent message.
+
+        Args:
+            chat_id (int): ID of chat that defined by Telegram
+            message_id (int): ID of message
+
+        Returns:
+            Receipt: Result of deleting
+        """
+        receipt = self.request(chat_id, lambda: self.bot.delete_message(chat_id, message_id), 'deleted')
+        receipt.message_id = message_id
+        return receipt
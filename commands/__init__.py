@@ -1 +1,17 @@
-from . import start
+from telebot import TeleBot
+
+from metrics import import_timed, instrument_handlers
+
+# Modules with handlers, they are imported by register, not when package is imported
+HANDLER_MODULES = ('start',)
+
+
+def register(bot: TeleBot) -> None:
+    """Function that imports handler modules, so their handlers are registered in bot, and wraps them with timing.
+
+    Args:
+        bot (TeleBot): Bot that handler modules register their handlers in
+    """
+    for name in HANDLER_MODULES:
+        import_timed(f'{__name__}.{name}')
+    instrument_handlers(bot)
@@ -1,36 +1,88 @@
+import functools
+import logging
+import math
+import time
+from datetime import date, datetime
+
 from telebot.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 
-from database.msg_templates import REPLIES
-from database.dbworker import get_user, gen_users, add_rr_name, update_templates, get_templates, delete_template, get_usernames
+from database.msg_templates import REPLIES, format_categories, format_schedules, format_template_page, shorten
+from database.dbworker import get_user, gen_recipients, add_rr_name, create_template, find_template, get_templates, delete_template, add_chat_member, remove_chat_member, iter_chat_mentions
+from database.dbworker import create_schedule, delete_schedule, get_schedules
+from database.dbworker import gen_users, get_delivery_rate, get_job_stats, get_last_job, get_template_page
+from database.dbworker import get_template_categories, search_templates
+from scheduler import next_run, parse_recurrence
+from templating import CompiledTemplate, build_mention_messages, compile_template, split_category
+
+from database.models import BroadcastJob, BroadcastSchedule
+from metrics import log_event
+from loader import dev_id, get_authenticator, get_bot, get_broadcast_queue, get_engine, get_scheduler
 
-from loader import bot, engine, dev_id, leader_id, secret_word
+bot = get_bot()
+engine = get_engine()
+authenticator = get_authenticator()
+broadcast_queue = get_broadcast_queue()
+scheduler = get_scheduler()
 
-# DEVS = [int(dev_id), int(leader_id)]
 DEVS = [int(dev_id)]
-ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
 
-def gen_templates() -> str:
-    """Function that generates one entire message with templates
+MAX_INVITES = 20
+TEMPLATES_PER_PAGE = 8
+BUTTON_PREVIEW_LIMIT = 40
+
+
+@functools.lru_cache(maxsize=256)
+def render_template_page(action: str, items: tuple, has_prev: bool, has_next: bool) -> tuple:
+    """Function that renders page of template picker. Result depends only on arguments, so it is cached.
+
+    Args:
+        action (str): What happens with choosen template: "all", "del" or "sch"
+        items (tuple): Pairs of template number and preview
+        has_prev (bool): Whether there are templates before page
+        has_next (bool): Whether there are templates after page
+
+    Returns:
+        tuple: Text of message and keyboard serialized to JSON
+    """
+    markup = InlineKeyboardMarkup()
+    for number, preview in items:
+        markup.row(InlineKeyboardButton(f"{number}) {shorten(preview, BUTTON_PREVIEW_LIMIT)}", callback_data=f'tpl:{action}:s:{number}'))
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(REPLIES['prev_page'], callback_data=f'tpl:{action}:p:{items[0][0]}'))
+    if has_next:
+        navigation.append(InlineKeyboardButton(REPLIES['next_page'], callback_data=f'tpl:{action}:n:{items[-1][0]}'))
+    if navigation:
+        markup.row(*navigation)
+    if action == 'all':
+        markup.row(InlineKeyboardButton(REPLIES['send_free_button'], callback_data='tpl:all:free:0'))
+    return format_template_page(items), markup.to_json()
+
+
+def template_picker(action: str, cursor: int = 0, forward: bool = True) -> tuple:
+    """Function that returns page of template picker
+
+    Args:
+        action (str): What happens with choosen template: "all", "del" or "sch"
+        cursor (int): Page starts after template with this number if forward, otherwise ends before it
+        forward (bool): Direction of pagination
 
     Returns:
-        str: Generated message
-    """
-    message = 'Ваши шаблоны:\n\n'
-    current_templates = get_templates(engine)
-    for keys in current_templates:
-        formatted_template = ''
-        for word in str.split(current_templates[keys]):
-            if word == '{rr_name}':
-                formatted_template += 'имя_соклановца'
-            elif word[:-1] == '{rr_name}':
-                formatted_template += 'имя_соклановца' + word[-1]
-            else:
-                formatted_template += word
-            formatted_template += ' '
-        formatted_template = str.rstrip(formatted_template)
-        message += f"{keys+1}) {formatted_template}\n\n"
-
-    return message
+        tuple: Text of message and keyboard serialized to JSON
+    """
+    page = get_template_page(cursor, forward, TEMPLATES_PER_PAGE, engine)
+    return render_template_page(action, tuple(page['items']), page['has_prev'], page['has_next'])
+
+
+def send_template_picker(message: Message, action: str) -> None:
+    """Function that sends the first page of template picker
+
+    Args:
+        message (Message): Object, that contains information of received message
+        action (str): What happens with choosen template: "all", "del" or "sch"
+    """
+    text, markup = template_picker(action)
+    bot.send_message(message.chat.id, text, reply_markup=markup)
 
 
 def stop_talking(message: Message) -> bool:
@@ -72,6 +124,12 @@ def start_command(message: Message)-> None:
     if in_group(message):
         return
 
+    # locked users are answered before any database query
+    wait = authenticator.retry_after(message.from_user.id)
+    if wait:
+        bot.reply_to(message, REPLIES['auth_locked'].format(minutes=math.ceil(wait / 60)))
+        return
+
     bot.reply_to(message, REPLIES['start'])
     curr_user_rr_name = get_user(message.from_user.id, message.from_user.username, engine)
     if curr_user_rr_name == '_empty_name_':
@@ -81,8 +139,6 @@ def start_command(message: Message)-> None:
         bot.reply_to(message, REPLIES['logged'].format(rr_name=curr_user_rr_name))
         bot.reply_to(message, REPLIES['commands'])
 
-    print("{username} with id {id} called '/start' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
-
 
 def register_user(message: Message) -> None:
     """Handler that will add users to database and also add their ingame nickname
@@ -108,16 +164,54 @@ def auth_member(message: Message, username: str) -> None:
     if stop_talking(message):
         return
 
-    if message.text == secret_word:
-        user = get_user(message.from_user.id, message.from_user.username, engine)
-        if user:
-            add_rr_name(message.from_user.id, message.from_user.username, username, engine)
-            bot.reply_to(message, REPLIES['auth_passed'])
-        else:
-            print("Error occured while getting user from db")
+    result, wait = authenticator.authenticate(message.from_user.id, message.text)
+    if result == 'passed':
+        # failed writes are logged and raised, so user is not told about name that was not stored
+        get_user(message.from_user.id, message.from_user.username, engine)
+        add_rr_name(message.from_user.id, message.from_user.username, username, engine)
+        bot.reply_to(message, REPLIES['auth_passed'])
+    elif result == 'locked':
+        bot.reply_to(message, REPLIES['auth_locked'].format(minutes=math.ceil(wait / 60)))
     else:
         bot.reply_to(message, REPLIES['auth_failed'])
-        print(f"auth failed by {message.from_user.username}")
+
+
+@bot.message_handler(commands=['invite'])
+def handle_invite(message: Message) -> None:
+    """Handler that creates one-time invite codes for new clan members: "/invite 5"
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    argument = message.text.partition(' ')[2].strip()
+    amount = int(argument) if argument.isdigit() else 1
+    if not 1 <= amount <= MAX_INVITES:
+        bot.reply_to(message, REPLIES['invite_usage'].format(max=MAX_INVITES))
+        return
+
+    codes = authenticator.issue_codes(message.from_user.id, amount)
+    if not codes:
+        bot.reply_to(message, REPLIES['invite_failed'])
+        return
+    bot.reply_to(message, REPLIES['invite_created'].format(hours=authenticator.invite_ttl // 3600, codes='\n'.join(codes)))
+
+
+@bot.message_handler(commands=['revoke'])
+def handle_revoke(message: Message) -> None:
+    """Handler that makes all unused invite codes of leader invalid
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    bot.reply_to(message, REPLIES['invite_revoked'].format(count=authenticator.revoke_codes(message.from_user.id)))
 
 
 @bot.message_handler(commands=['all'])
@@ -132,12 +226,10 @@ def handle_all(message: Message) -> None:
     
     if message.from_user.id in DEVS:
         bot.reply_to(message, REPLIES['choose_template'])
-        bot.reply_to(message, gen_templates())
+        send_template_picker(message, 'all')
         bot.register_next_step_handler(message, choose_template)
     else:
-        print("Permission error")
-
-    print("{username} with id {id} called '/all' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+        log_event('permission_denied', logging.WARNING, user_id=message.from_user.id)
 
 
 def choose_template(message: Message) -> None:
@@ -145,37 +237,52 @@ def choose_template(message: Message) -> None:
 
     Args:
         message (Message): Object, that contains information of received message
-        template_id (int): ID of choosen template
     """
 
     if stop_talking(message):
         return
-    
+
     if message.text == '0':
         bot.send_message(message.from_user.id, REPLIES['send_without_storing'])
         bot.register_next_step_handler(message, send_without_storing)
-    
-    templates = get_templates(engine)
-    try:
-        template_id = int(message.text) - 1
-    except ValueError as e:
+        return
+
+    found = typed_template(message)
+    if found is None:
         bot.reply_to(message, REPLIES['invalid_key'])
         handle_all(message)
         return
 
-    for user in gen_users(engine):
-        if user.id == message.from_user.id:
-            bot.send_message(user.id, templates[template_id].format(rr_name=user.rr_name))
-            continue
-        else:
-            try:
-                bot.send_message(user.id, templates[template_id].format(rr_name=user.rr_name))
-            except KeyError as e:
-                print(e)
-                bot.reply_to(message, REPLIES['invalid_key'])
-                handle_all(message)
-                return
-    bot.send_message(message.from_user.id, REPLIES['msg_sent'])
+    start_broadcast(message.from_user.id, render_for_recipients(found[1]))
+
+
+def typed_template(message: Message) -> tuple:
+    """Function that finds template which number leader typed
+
+    Args:
+        message (Message): Object, that contains information of received message
+
+    Returns:
+        tuple: ID of template and compiled template, or None if there is no such template
+    """
+    try:
+        number = int(message.text)
+    except (TypeError, ValueError) as e:
+        return None
+    return find_template(number, engine)
+
+
+def render_for_recipients(template: CompiledTemplate):
+    """Function that renders template for every user that receives broadcasts
+
+    Args:
+        template (CompiledTemplate): Template to render
+
+    Returns:
+        Iterator[tuple]: Pairs of user id and text of message for this user
+    """
+    today = date.today().strftime('%d.%m.%Y')
+    return ((user.id, template.render(rr_name=user.rr_name, username=user.username, date=today)) for user in gen_recipients(engine))
 
 
 def send_without_storing(message: Message) -> None:
@@ -184,13 +291,277 @@ def send_without_storing(message: Message) -> None:
     Args:
         message (Message): Object, that contains information of received message
     """
-    for user in gen_users(engine):
-        if user.id == message.from_user.id:
-            bot.send_message(user.id, message.text)
-            continue
-        else:
-            bot.send_message(user.id, message.text)
-    bot.send_message(message.from_user.id, REPLIES['msg_sent'])
+    start_broadcast(message.from_user.id, ((user.id, message.text) for user in gen_recipients(engine)))
+
+
+def start_broadcast(leader: int, messages) -> None:
+    """Function that stores broadcast in queue, so it is sent in background and survives restarts
+
+    Args:
+        leader (int): ID of leader that requested broadcast
+        messages (Iterable[tuple]): Pairs of chat id and text of message for this chat
+    """
+    if broadcast_queue.enqueue(leader, messages) is None:
+        bot.send_message(leader, REPLIES['broadcast_failed'])
+        return
+    bot.send_message(leader, REPLIES['broadcast_started'])
+
+
+def report_broadcast(job: BroadcastJob, counts: dict) -> None:
+    """Function that reports results of finished broadcast to leader that requested it
+
+    Args:
+        job (BroadcastJob): Finished broadcast job
+        counts (dict): Amount of deliveries for every status
+    """
+    bot.send_message(job.leader_id, REPLIES['broadcast_report'].format(
+        delivered=counts.get('delivered', 0),
+        failed=counts.get('failed', 0) + counts.get('unknown', 0),
+        blocked=counts.get('blocked', 0)))
+
+
+broadcast_queue.on_done = report_broadcast
+
+
+@bot.message_handler(commands=['stats'])
+def handle_stats(message: Message) -> None:
+    """Handler that shows leader how the latest broadcast was delivered
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    job = get_last_job(engine)
+    if job is None:
+        bot.reply_to(message, REPLIES['no_broadcasts'])
+        return
+
+    stats = get_job_stats(job.id, engine)
+    counts, latency = stats['counts'], stats['latency']
+    total = sum(counts.values())
+    week_delivered, week_total = get_delivery_rate(int(time.time()) - 7 * 24 * 3600, engine)
+    bot.reply_to(message, REPLIES['stats'].format(
+        date=job.created_at.strftime('%d.%m.%Y %H:%M') if job.created_at else '?',
+        delivered=counts.get('delivered', 0),
+        total=total,
+        rate=round(100 * counts.get('delivered', 0) / total) if total else 0,
+        failed=counts.get('failed', 0),
+        blocked=counts.get('blocked', 0),
+        p50=latency.get(0.5, '-'),
+        p90=latency.get(0.9, '-'),
+        p99=latency.get(0.99, '-'),
+        week_delivered=week_delivered,
+        week_total=week_total,
+        week_rate=round(100 * week_delivered / week_total) if week_total else 0))
+
+
+@bot.message_handler(commands=['edit'])
+def handle_edit(message: Message) -> None:
+    """Handler that allows leader to replace text of the latest broadcast for all recipients
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    job = get_last_job(engine)
+    if job is None:
+        bot.reply_to(message, REPLIES['no_broadcasts'])
+        return
+
+    bot.reply_to(message, REPLIES['edit_broadcast'])
+    bot.register_next_step_handler(message, edit_broadcast, job_id=job.id)
+
+
+def edit_broadcast(message: Message, job_id: int) -> None:
+    """Handler that edits delivered messages of broadcast
+
+    Args:
+        message (Message): Object, that contains information of received message
+        job_id (int): ID of broadcast job
+    """
+
+    if stop_talking(message):
+        return
+
+    template = compile_template(message.text)
+    users = {user.id: user for user in gen_users(engine)}
+    today = date.today().strftime('%d.%m.%Y')
+
+    def render(user_id: int) -> str:
+        user = users.get(user_id)
+        if user is None:
+            return template.render(rr_name='', username='', date=today)
+        return template.render(rr_name=user.rr_name, username=user.username, date=today)
+
+    broadcast_queue.edit_job(job_id, render, on_done=lambda counts: report_revision(message.from_user.id, 'edited', counts))
+    bot.reply_to(message, REPLIES['edit_started'])
+
+
+@bot.message_handler(commands=['recall'])
+def handle_recall(message: Message) -> None:
+    """Handler that deletes the latest broadcast for all recipients
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    job = get_last_job(engine)
+    if job is None:
+        bot.reply_to(message, REPLIES['no_broadcasts'])
+        return
+
+    broadcast_queue.delete_job(job.id, on_done=lambda counts: report_revision(message.from_user.id, 'deleted', counts))
+    bot.reply_to(message, REPLIES['recall_started'])
+
+
+def report_revision(leader: int, success: str, counts: dict) -> None:
+    """Function that reports results of bulk edit or delete to leader
+
+    Args:
+        leader (int): ID of leader that requested it
+        success (str): Status of successful request
+        counts (dict): Amount of requests for every status
+    """
+    done = counts.get(success, 0)
+    bot.send_message(leader, REPLIES['revise_report'].format(done=done, failed=sum(counts.values()) - done))
+
+@bot.message_handler(commands=['schedule'])
+def handle_schedule(message: Message) -> None:
+    """Handler that allows leader to send template at given time once or repeatedly
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if in_group(message):
+        return
+
+    if message.from_user.id in DEVS:
+        bot.reply_to(message, REPLIES['schedule_template'])
+        send_template_picker(message, 'sch')
+        bot.register_next_step_handler(message, choose_scheduled_template)
+    else:
+        log_event('permission_denied', logging.WARNING, user_id=message.from_user.id)
+
+
+def choose_scheduled_template(message: Message) -> None:
+    """Handler that remembers template that will be scheduled
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if stop_talking(message):
+        return
+
+    found = typed_template(message)
+    if found is None:
+        bot.reply_to(message, REPLIES['invalid_key'])
+        handle_schedule(message)
+        return
+
+    bot.reply_to(message, REPLIES['schedule_time'])
+    bot.register_next_step_handler(message, choose_schedule_time, template_id=found[0])
+
+
+def choose_schedule_time(message: Message, template_id: int) -> None:
+    """Handler that stores schedule of template and passes it to scheduler
+
+    Args:
+        message (Message): Object, that contains information of received message
+        template_id (int): ID of choosen template
+    """
+
+    if stop_talking(message):
+        return
+
+    now = datetime.now()
+    try:
+        recurrence = parse_recurrence(message.text, now)
+    except ValueError as e:
+        bot.reply_to(message, REPLIES['invalid_schedule_time'])
+        bot.register_next_step_handler(message, choose_schedule_time, template_id=template_id)
+        return
+
+    run_at = next_run(recurrence, now)
+    schedule_id = create_schedule(template_id, message.from_user.id, recurrence, run_at, engine)
+    if schedule_id is None:
+        bot.reply_to(message, REPLIES['schedule_failed'])
+        return
+
+    scheduler.add(schedule_id, run_at)
+    bot.reply_to(message, REPLIES['schedule_created'].format(next_run=run_at.strftime('%d.%m.%Y %H:%M')))
+
+
+def run_schedule(schedule: BroadcastSchedule) -> None:
+    """Function that sends scheduled template through broadcast queue
+
+    Args:
+        schedule (BroadcastSchedule): Schedule that is due
+    """
+    template = get_templates(engine).get(schedule.template_id)
+    if template is None:
+        return
+    broadcast_queue.enqueue(schedule.leader_id, render_for_recipients(template))
+
+
+scheduler.on_fire = run_schedule
+
+
+@bot.message_handler(commands=['unschedule'])
+def handle_unschedule(message: Message) -> None:
+    """Handler that allows leader to cancel scheduled broadcast
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    if in_group(message):
+        return
+
+    if message.from_user.id not in DEVS:
+        log_event('permission_denied', logging.WARNING, user_id=message.from_user.id)
+        return
+
+    schedules = get_schedules(engine)
+    if not schedules:
+        bot.reply_to(message, REPLIES['no_schedules'])
+        return
+
+    bot.reply_to(message, format_schedules(schedules, get_templates(engine)))
+    bot.reply_to(message, REPLIES['unschedule'])
+    bot.register_next_step_handler(message, cancel_schedule, schedule_ids=[schedule.id for schedule in schedules])
+
+
+def cancel_schedule(message: Message, schedule_ids: list) -> None:
+    """Handler that deletes choosen schedule
+
+    Args:
+        message (Message): Object, that contains information of received message
+        schedule_ids (list): IDs of schedules in order they were shown to leader
+    """
+
+    if stop_talking(message):
+        return
+
+    try:
+        number = int(message.text)
+        if number < 1:
+            raise IndexError(number)
+        schedule_id = schedule_ids[number - 1]
+    except (ValueError, IndexError) as e:
+        bot.reply_to(message, REPLIES['invalid_schedule'])
+        bot.register_next_step_handler(message, cancel_schedule, schedule_ids=schedule_ids)
+        return
+
+    if delete_schedule(schedule_id, engine):
+        bot.reply_to(message, REPLIES['schedule_deleted'])
+    else:
+        bot.reply_to(message, REPLIES['invalid_schedule'])
 
 
 @bot.message_handler(commands=['new'])
@@ -201,14 +572,12 @@ def handle_new(message: Message) -> None:
         message (Message): Object, that contains information of received message
     """
 
-    if in_group(message):
+    if in_group(message) or message.from_user.id not in DEVS:
         return
 
     bot.reply_to(message, REPLIES['add_template'])
     bot.register_next_step_handler(message, add_template)
 
-    print("{username} with id {id} called '/new' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
-
 
 def add_template(message: Message) -> None:
     """Function that add leader template
@@ -219,32 +588,13 @@ def add_template(message: Message) -> None:
 
     if stop_talking(message):
         return
-    
-    user_template = ''
-
-    for word in str.split(message.text):
-        if 'имя_игрока' in word:
-            user_template += "{rr_name}"
-            if word[-1].lower() not in ALPHABET:
-                user_template += word[-1]
-        else:
-            user_template += word
-        user_template += ' '
-    
-    user_template = str.rstrip(user_template)
-
-    last_key = ''
-    new_template_id = 0
-    templates = get_templates(engine)
-    try:
-        for key in templates:
-            last_key = key
-        new_template_id = str(last_key + 1)
-    except Exception as e:
-        print(e)
 
-    update_templates(user_template, new_template_id, engine)
-    bot.reply_to(message, REPLIES['template_created'])
+    category, template = split_category(message.text)
+    number = create_template(template, engine, category)
+    if number is None:
+        bot.reply_to(message, REPLIES['template_failed'])
+        return
+    bot.reply_to(message, REPLIES['template_created'].format(number=number))
 
 
 @bot.message_handler(commands=['del'])
@@ -255,15 +605,13 @@ def handle_del(message: Message) -> None:
         message (Message): Object, that contains information of received message
     """
 
-    if in_group(message):
+    if in_group(message) or message.from_user.id not in DEVS:
         return
 
-    bot.reply_to(message, gen_templates())
+    send_template_picker(message, 'del')
     bot.reply_to(message, REPLIES['del_template'])
     bot.register_next_step_handler(message, del_template)
 
-    print("{username} with id {id} called '/del' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
-
 
 def del_template(message: Message) -> None:
     """Function that add leader template
@@ -276,42 +624,133 @@ def del_template(message: Message) -> None:
         return
 
     try:
-        template_id = int(message.text) - 1
-    except ValueError as e:
+        number = int(message.text)
+    except (TypeError, ValueError) as e:
+        number = None
+
+    if number is None or not delete_template(number, engine):
         bot.reply_to(message, REPLIES['invalid_key'])
         handle_del(message)
         return
 
-    try:
-        delete_template(template_id, engine)
-        bot.reply_to(message, REPLIES['template_deleted'])
-    except KeyError as e:
-        bot.reply_to(message, REPLIES['invalid_key'])
-        handle_del(message)
+    bot.reply_to(message, REPLIES['template_deleted'])
+
+
+@bot.message_handler(commands=['find'])
+def handle_find(message: Message) -> None:
+    """Handler that finds templates by text and category: "/find #category text".
+    Without arguments it shows categories of templates.
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+
+    if in_group(message) or message.from_user.id not in DEVS:
+        return
+
+    query = message.text.partition(' ')[2].strip()
+    if not query:
+        categories = get_template_categories(engine)
+        bot.reply_to(message, format_categories(categories) if categories else REPLIES['find_usage'])
+        return
+
+    category = None
+    if query.startswith('#'):
+        category, _, query = query[1:].partition(' ')
+        category = category.lower()
+    found = search_templates(query.strip(), engine, category=category)
+    bot.reply_to(message, format_template_page(found) if found else REPLIES['templates_not_found'])
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('tpl:'))
+def pick_template(call: CallbackQuery) -> None:
+    """Handler of template picker buttons: turns pages or does action with choosen template.
+    Choosing replaces typed answer, so waiting step handler of chat is cleared.
+
+    Args:
+        call (CallbackQuery): Object, that contains information of pressed button
+    """
+    bot.answer_callback_query(call.id)
+    parts = call.data.split(':')
+    chat_id, message_id = call.message.chat.id, call.message.message_id
+    if call.from_user.id not in DEVS:
+        log_event('permission_denied', logging.WARNING, user_id=call.from_user.id)
         return
+    # buttons of older bot versions or forged data are ignored
+    if len(parts) != 4 or not parts[3].isdigit():
+        return
+    _, action, kind, value = parts
 
+    if kind in ('p', 'n'):
+        text, markup = template_picker(action, int(value), kind == 'n')
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+        return
+
+    # keyboard is removed, so template is not choosen twice
+    bot.edit_message_reply_markup(chat_id, message_id, reply_markup=None)
+    bot.clear_step_handler_by_chat_id(chat_id)
+    if kind == 'free':
+        bot.send_message(chat_id, REPLIES['send_without_storing'])
+        bot.register_next_step_handler_by_chat_id(chat_id, send_without_storing)
+        return
+
+    number = int(value)
+    if action == 'del':
+        bot.send_message(chat_id, REPLIES['template_deleted'] if delete_template(number, engine) else REPLIES['invalid_key'])
+        return
+
+    found = find_template(number, engine)
+    if found is None:
+        bot.send_message(chat_id, REPLIES['invalid_key'])
+    elif action == 'all':
+        start_broadcast(call.from_user.id, render_for_recipients(found[1]))
+    elif action == 'sch':
+        bot.send_message(chat_id, REPLIES['schedule_time'])
+        bot.register_next_step_handler_by_chat_id(chat_id, choose_schedule_time, template_id=found[0])
 
 
 @bot.message_handler(commands=['everyone'])
 def mention_all(message: Message) -> None:
-    """This command will mention all registered users in database
+    """This command will mention all registered users that are members of the group
 
     Args:
         message (Message): Object, that contains information of received message
     """
 
     if message.from_user.id != message.chat.id:
-        mention_message = ''
-        all_usernames = get_usernames(engine)
-        for username in all_usernames:
-            mention_message += f'@{username} '
-        mention_message = str.rstrip(mention_message)
-        mention_message += REPLIES['after_everyone']
-        bot.send_message(message.chat.id, mention_message)
+        mentions = iter_chat_mentions(message.chat.id, engine)
+        # caller is recorded after chat was checked, so the first call in untracked chat mentions everyone
+        add_chat_member(message.chat.id, message.from_user.id, engine)
+        users = (
+            (user_id, username, rr_name if rr_name != '_empty_name_' else REPLIES['default_mention_name'])
+            for user_id, username, rr_name in mentions
+        )
+        for mention_message in build_mention_messages(users, REPLIES['after_everyone']):
+            bot.send_message(message.chat.id, mention_message, parse_mode='HTML')
     else:
         bot.reply_to(message, REPLIES['only_for_chat'])
 
-    print("{username} with id {id} called '/everyone' in {chat_id}".format(username=message.from_user.username, id=message.from_user.id, chat_id=message.chat.id))
+
+@bot.message_handler(content_types=['new_chat_members'])
+def members_joined(message: Message) -> None:
+    """Handler that remembers users that joined the group, so they are mentioned by "/everyone"
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    for user in message.new_chat_members:
+        if not user.is_bot:
+            add_chat_member(message.chat.id, user.id, engine)
+
+
+@bot.message_handler(content_types=['left_chat_member'])
+def member_left(message: Message) -> None:
+    """Handler that forgets users that left the group
+
+    Args:
+        message (Message): Object, that contains information of received message
+    """
+    remove_chat_member(message.chat.id, message.left_chat_member.id, engine)
 
 
 @bot.message_handler(commands=['help'])
@@ -334,4 +773,6 @@ def incorrect_command(message: Message) -> None:
         message (Message): Object, that contains information of received message
     """
     if message.chat.id == message.from_user.id:
-        bot.reply_to(message, REPLIES['incorrect'])
\ No newline at end of file
+        bot.reply_to(message, REPLIES['incorrect'])
+    else:
+        add_chat_member(message.chat.id, message.from_user.id, engine)
\ No newline at end of file
@@ -0,0 +1,249 @@
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from metrics import DB_ERRORS, log_event
+
+from .dbworker import load_template, migrate_schema, template_insert
+from .models import Base, User, Template, BroadcastSchedule
+
+DEFAULT_ASYNC_DB_URL = 'sqlite+aiosqlite:///database/database.db'
+# One sessionmaker per engine, so it is not rebuilt on every query
+_sessions = {}
+
+
+def create_async_db_engine(url: str = None, busy_timeout: int = 5000) -> AsyncEngine:
+    """Function that creates sqlalchemy async engine that works through aiosqlite.
+    SQLite databases are opened in WAL mode, same as in synchronous engine.
+
+    Args:
+        url (str, optional): Database URL. Defaults to "sqlite+aiosqlite:///database/database.db"
+        busy_timeout (int): Amount of milliseconds that connection waits for locked database
+
+    Returns:
+        AsyncEngine: An asyncio proxy for an _engine.Engine object.
+    """
+    url = url or DEFAULT_ASYNC_DB_URL
+    engine = create_async_engine(url)
+    if url.startswith('sqlite'):
+        @event.listens_for(engine.sync_engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+            cursor.close()
+
+    return engine
+
+
+async def init_async_db(engine: AsyncEngine) -> None:
+    """Function that creates all tables that do not exist yet.
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+    """
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(migrate_schema)
+
+
+def create_async_session(engine: AsyncEngine) -> AsyncSession:
+    """Function that creates async sessions to interact with database.
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        AsyncSession: session interface through which all queries will be awaited
+    """
+    Session = _sessions.get(engine)
+    if Session is None:
+        Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+        _sessions[engine] = Session
+    return Session()
+
+
+@asynccontextmanager
+async def session_scope(engine: AsyncEngine, reraise: bool = False) -> AsyncIterator[AsyncSession]:
+    """Context manager that gives new async session, commits it on exit
+    and rolls it back if query failed. Errors are logged, reads return their defaults after them,
+    writes raise them, so caller does not take lost write for done.
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+        reraise (bool): Whether error is raised after rollback. Defaults to False
+
+    Yields:
+        AsyncSession: session interface through which all queries will be awaited
+    """
+    async with create_async_session(engine) as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            DB_ERRORS.inc()
+            log_event('db_error', logging.ERROR, error=str(e))
+            await session.rollback()
+            if reraise:
+                raise
+
+
+async def get_user(user_id: int, username: str, engine: AsyncEngine) -> str:
+    """Function that return a user if he exists in the database; otherwise, it creates it.
+
+    Args:
+        user_id (int): ID of user thah defined by Telegram
+        username (str): username of user that is defined by user and could be changed
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        str: Rush royale name of user or "_empty_name_" if he is not registered
+    """
+    rr_name = '_empty_name_'
+    async with session_scope(engine, reraise=True) as session:
+        user = await session.get(User, user_id)
+        if user:
+            rr_name = user.rr_name
+            if not user.active:
+                # user who blocked the bot came back
+                user.active = True
+                user.blocked_at = None
+        else:
+            session.add(User(id=user_id, username=username, rr_name=rr_name))
+
+    return rr_name
+
+async def add_rr_name(user_id: int, username: str, ingame_name: str, engine: AsyncEngine) -> None:
+    """Function that adds rush royale username for user.
+
+    Args:
+        user_id (int): ID of user thah defined by Telegram
+        username (str): username of user that is defined by user and could be changed
+        ingame_name (str): username in rush royale
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+    """
+    async with session_scope(engine, reraise=True) as session:
+        user = await session.get(User, user_id)
+        if user:
+            user.rr_name = ingame_name
+
+async def get_usernames(engine: AsyncEngine) -> list:
+    """Generates list of all usernames and returns it
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        list: List of all usernames stored in database
+    """
+    usernames = []
+    async with session_scope(engine) as session:
+        usernames = list((await session.execute(select(User.username).order_by(User.id))).scalars())
+
+    return usernames
+
+async def gen_users(engine: AsyncEngine) -> list:
+    """Generates list of all users and returns it
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        list: List of all users stored in database
+    """
+    users = []
+    async with session_scope(engine) as session:
+        users = list((await session.execute(select(User).order_by(User.id))).scalars())
+
+    return users
+
+async def gen_recipients(engine: AsyncEngine) -> list:
+    """Generates list of users that can receive broadcast: users that did not block the bot
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        list: List of active users
+    """
+    users = []
+    async with session_scope(engine) as session:
+        users = list((await session.execute(select(User).where(User.active == True).order_by(User.id))).scalars())
+
+    return users
+
+async def deactivate_users(user_ids: list, engine: AsyncEngine) -> None:
+    """Function that marks users that blocked the bot, so they are skipped by broadcasts
+
+    Args:
+        user_ids (list): IDs of users
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+    """
+    if not user_ids:
+        return
+    async with session_scope(engine, reraise=True) as session:
+        await session.execute(
+            update(User)
+            .where(User.id.in_(list(user_ids)), User.active == True)
+            .values(active=False, blocked_at=datetime.utcnow())
+        )
+
+async def get_templates(engine: AsyncEngine) -> dict:
+    """Function, that will generate dictionary from database table with templates
+
+    Args:
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        dict: dict of all compiled templates stored in database by their numbers
+    """
+    all_templates = dict()
+    async with session_scope(engine) as session:
+        rows = await session.execute(select(Template.number, Template.template, Template.compiled).order_by(Template.number))
+        all_templates = {number: load_template(template, compiled) for number, template, compiled in rows.all()}
+
+    return all_templates
+
+async def create_template(template: str, engine: AsyncEngine, category: str = None) -> int:
+    """Function that adds template with the next number
+
+    Args:
+        template (str): Users message template
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+        category (str, optional): Category of template. Defaults to None
+
+    Returns:
+        int: Number of added template, None if it was not added
+    """
+    number = None
+    async with session_scope(engine, reraise=True) as session:
+        added = (await session.execute(template_insert(template, category))).scalar()
+        await session.commit()
+        number = added
+
+    return number
+
+async def delete_template(number: int, engine: AsyncEngine) -> bool:
+    """Function that will delete template with matched number together with its schedules
+
+    Args:
+        number (int): Number of template that will be deleted
+        engine (AsyncEngine): An asyncio proxy for an _engine.Engine object.
+
+    Returns:
+        bool: True if template was deleted, False if there is no such template
+    """
+    deleted = False
+    async with session_scope(engine, reraise=True) as session:
+        template_ids = select(Template.id).where(Template.number == number)
+        await session.execute(delete(BroadcastSchedule).where(BroadcastSchedule.template_id.in_(template_ids)))
+        found = (await session.execute(delete(Template).where(Template.number == number))).rowcount > 0
+        await session.commit()
+        deleted = found
+
+    return deleted
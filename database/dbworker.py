@@ -1,26 +1,228 @@
-from typing import Any
+import logging
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator
 
-from sqlalchemy import create_engine, select
-from sqlalchemy.engine import Engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import (String, case, create_engine, delete, event, func, inspect, literal, or_, select, text, union_all,
+                        update)
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased, scoped_session, sessionmaker
 
-from .models import Base, User, Template
+from metrics import DB_CACHE, DB_ERRORS, log_event, timed_db
+from templating import CompiledTemplate, compile_legacy, compile_template
 
+from .models import (Base, User, Template, BroadcastJob, BroadcastDelivery, BroadcastSchedule, DialogueState,
+                     ChatMembership, DeliveryReceipt, ProcessedKey, AuthFailure, InviteCode)
 
-def create_db_engine() -> Engine:
+# Read-through cache of rarely changed tables, key is (table, engine).
+# Version is bumped on every write, so result of query that raced with write is not cached.
+_cache = {}
+_cache_versions = {}
+_cache_lock = threading.Lock()
+_cache_stored = {}
+# Seconds after which cached data is read again. Needed when other processes write to the same database,
+# because they can not invalidate cache of this one
+CACHE_TTL = None
+
+DEFAULT_DB_URL = 'sqlite+pysqlite:///database/database.db'
+# One session registry per engine, so sessionmaker is not rebuilt on every query
+_sessions = {}
+_sessions_lock = threading.Lock()
+# Memberships that are already stored, so repeated messages in group do not write to database
+_known_members = set()
+_known_members_lock = threading.Lock()
+# SQLite allows at most 32766 bound parameters in one statement, so bulk inserts are split into chunks
+BULK_CHUNK_SIZE = 500
+# Amount of attempts of bulk import when numbers were taken by concurrent insert
+IMPORT_RETRIES = 3
+
+
+def create_db_engine(url: str = None, pool_size: int = 10, busy_timeout: int = 5000) -> Engine:
     """Function that creates sqlalchemy engine to create sessions.
 
+    SQLite databases are opened in WAL mode, so readers do not wait for writer, with
+    "synchronous=NORMAL" and busy timeout, so concurrent handler threads wait for lock instead of failing.
+    Database is not touched here, schema is created by init_db or ensure_schema.
+
+    Args:
+        url (str, optional): Database URL. Defaults to "sqlite+pysqlite:///database/database.db"
+        pool_size (int): Amount of connections that are kept open for handler threads
+        busy_timeout (int): Amount of milliseconds that connection waits for locked database
+
     Returns:
         engine: An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
     """
-    engine = create_engine('sqlite+pysqlite:///database/database.db')
-    Base.metadata.create_all(engine)
+    url = url or DEFAULT_DB_URL
+    if url.startswith('sqlite') and ':memory:' not in url:
+        engine = create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=pool_size,
+            pool_pre_ping=True,
+            connect_args={'check_same_thread': False, 'timeout': busy_timeout / 1000},
+        )
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+            cursor.execute('PRAGMA foreign_keys=ON')
+            cursor.close()
+    elif url.startswith('sqlite'):
+        engine = create_engine(url, connect_args={'check_same_thread': False})
+    else:
+        engine = create_engine(url, pool_size=pool_size, max_overflow=pool_size, pool_pre_ping=True)
 
     return engine
 
 
+def migrate_schema(connection: Connection) -> None:
+    """Function that brings database created by older version of bot to current models:
+    adds new columns with their server defaults and creates missing indexes.
+
+    Args:
+        connection (Connection): Connection to database
+    """
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                statement = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if not isinstance(default, str):
+                        default = default.compile(dialect=connection.dialect)
+                    statement += f' NOT NULL DEFAULT {default}' if not column.nullable else f' DEFAULT {default}'
+                connection.execute(text(statement))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    # templates stored before display numbers existed were shown to leaders as id + 1
+    connection.execute(update(Template).where(Template.number.is_(None)).values(number=Template.id + 1))
+
+
+
+def schema_fingerprint() -> int:
+    """Function that computes checksum of tables, columns and indexes of models.
+
+    Returns:
+        int: Checksum that fits into SQLite "user_version"
+    """
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f'{column.name}:{column.type}' for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    return zlib.crc32('|'.join(parts).encode()) & 0x7fffffff
+
+
+def init_db(engine: Engine) -> None:
+    """Function that creates missing tables and migrates existing ones to current models.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        migrate_schema(connection)
+        if engine.dialect.name == 'sqlite':
+            connection.execute(text(f'PRAGMA user_version={schema_fingerprint()}'))
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """Function that runs init_db only if schema of database differs from models.
+    For SQLite it costs one PRAGMA, so it can be called on every start.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if database was migrated
+    """
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            if connection.execute(text('PRAGMA user_version')).scalar() == schema_fingerprint():
+                return False
+    init_db(engine)
+    return True
+
+def cache_get(table: str, engine: Engine) -> tuple:
+    """Function that returns cached data of table.
+
+    Args:
+        table (str): Name of cached table
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        tuple: Cached data or None if there is nothing in cache, and current version of table
+    """
+    with _cache_lock:
+        data = _cache.get((table, engine))
+        if data is not None and CACHE_TTL is not None and time.monotonic() - _cache_stored[(table, engine)] > CACHE_TTL:
+            del _cache[(table, engine)]
+            data = None
+        DB_CACHE.inc(table=table, result='miss' if data is None else 'hit')
+        return data, _cache_versions.get((table, engine), 0)
+
+
+def cache_set(table: str, engine: Engine, data: Any, version: int) -> None:
+    """Function that stores data of table in cache if table was not changed while it was read.
+
+    Args:
+        table (str): Name of cached table
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        data (Any): Data to store
+        version (int): Version of table that was returned by cache_get before reading
+    """
+    with _cache_lock:
+        if _cache_versions.get((table, engine), 0) == version:
+            _cache[(table, engine)] = data
+            _cache_stored[(table, engine)] = time.monotonic()
+
+
+def invalidate_cache(table: str, engine: Engine) -> None:
+    """Function that drops cached data of table after it was changed.
+
+    Args:
+        table (str): Name of changed table
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with _cache_lock:
+        _cache_versions[(table, engine)] = _cache_versions.get((table, engine), 0) + 1
+        if _cache.pop((table, engine), None) is not None:
+            DB_CACHE.inc(table=table, result='invalidation')
+
+
+def invalidate_users(engine: Engine) -> None:
+    """Function that drops all cached data that is built from user table.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    invalidate_cache('user', engine)
+    invalidate_cache('recipient', engine)
+
+
+def invalidate_templates(engine: Engine) -> None:
+    """Function that drops all cached data that is built from template table.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    invalidate_cache('template', engine)
+    invalidate_cache('template_page', engine)
+
+
 def create_session(engine: Engine) -> Session:
-    """Function that creates sessions to interact with database.
+    """Function that returns session of current thread to interact with database.
 
     Args:
         engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
@@ -28,40 +230,73 @@ def create_session(engine: Engine) -> Session:
     Returns:
         Session: session interface through which all queries will be executed
     """
-    Session = sessionmaker(bind=engine)
-    return Session()
+    with _sessions_lock:
+        registry = _sessions.get(engine)
+        if registry is None:
+            registry = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+            _sessions[engine] = registry
+    return registry()
 
 
-def get_user(user_id: int, username:str, engine: Engine) -> User:
-    """Function that return a user if he exists in the database; otherwise, it creates it.
+@contextmanager
+def session_scope(engine: Engine, reraise: bool = False) -> Iterator[Session]:
+    """Context manager that gives session of current thread, commits it on exit
+    and rolls it back if query failed. Errors are logged, reads return their defaults after them,
+    writes raise them, so caller does not take lost write for done.
 
     Args:
-        user_id (int): ID of user thah defined by Telegram
-        username (str): username of user that is defined by user and could be changed
         engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        reraise (bool): Whether error is raised after rollback. Defaults to False
 
-    Returns:
-        user (User): An user entity
+    Yields:
+        Session: session interface through which all queries will be executed
     """
     session = create_session(engine)
-    rr_name = '_empty_name_'
     try:
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            user = User(id=user_id, username=username, rr_name=rr_name)
-        else:
-            rr_name = user.rr_name
-        session.add(user)
+        yield session
         session.commit()
-    except BaseException as e:
-        print(e)
+    except Exception as e:
+        DB_ERRORS.inc()
+        log_event('db_error', logging.ERROR, error=str(e))
         session.rollback()
+        if reraise:
+            raise
     finally:
         session.close()
 
+
+@timed_db
+def get_user(user_id: int, username:str, engine: Engine) -> str:
+    """Function that return a user if he exists in the database; otherwise, it creates it.
+
+    Args:
+        user_id (int): ID of user thah defined by Telegram
+        username (str): username of user that is defined by user and could be changed
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        str: Rush royale name of user or "_empty_name_" if he is not registered
+    """
+    rr_name = '_empty_name_'
+    with session_scope(engine, reraise=True) as session:
+        user = session.get(User, user_id)
+        if user:
+            rr_name = user.rr_name
+            if not user.active:
+                # user who blocked the bot came back
+                user.active = True
+                user.blocked_at = None
+                session.commit()
+                invalidate_users(engine)
+        else:
+            session.add(User(id=user_id, username=username, rr_name=rr_name))
+            session.commit()
+            invalidate_users(engine)
+
     return rr_name
 
-def add_rr_name(user_id: int, username:str, ingame_name: str, engine: Engine) -> User:
+@timed_db
+def add_rr_name(user_id: int, username:str, ingame_name: str, engine: Engine) -> None:
     """Function that adds rush royale username for user.
 
     Args:
@@ -70,19 +305,14 @@ def add_rr_name(user_id: int, username:str, ingame_name: str, engine: Engine) ->
         ingame_name (str): username in rush royale
         engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
     """
-    session = create_session(engine)
-    try:
-        user = session.query(User).filter_by(id=user_id).first()
+    with session_scope(engine, reraise=True) as session:
+        user = session.get(User, user_id)
         if user:
             user.rr_name = ingame_name
-            session.add(user)
-        session.commit()
-    except BaseException as e:
-        print(e)
-        session.rollback()
-    finally:
-        session.close()
+            session.commit()
+            invalidate_users(engine)
 
+@timed_db
 def get_usernames(engine: Engine) -> list:
     """Generates list of all usernames and returns it
 
@@ -92,20 +322,9 @@ def get_usernames(engine: Engine) -> list:
     Returns:
         list: List of all users stored in database
     """
-    session = create_session(engine)
-    usernames = []
-    try:
-        all_users = session.execute(select(User).order_by(User.id)).all()
-        for user in all_users:
-            usernames.append(user[0].username)
-    except Exception as e:
-        print(e)
-        session.rollback()
-    finally:
-        session.close()
-
-    return usernames
+    return [user.username for user in gen_users(engine)]
 
+@timed_db
 def gen_users(engine: Engine) -> list:
     """Generates list of all users and returns it
 
@@ -115,76 +334,1221 @@ def gen_users(engine: Engine) -> list:
     Returns:
         list: List of all users stored in database
     """
-    session = create_session(engine)
+    users, version = cache_get('user', engine)
+    if users is not None:
+        return list(users)
+
     users = []
-    try:
-        all_users = session.execute(select(User).order_by(User.id)).all()
-        for user in all_users:
-            users += user
-    except Exception as e:
-        print(e)
-        session.rollback()
-    finally:
-        session.close()
+    with session_scope(engine) as session:
+        users = list(session.execute(select(User).order_by(User.id)).scalars())
+        cache_set('user', engine, list(users), version)
+
+    return users
+
+def load_template(template: str, compiled: str) -> CompiledTemplate:
+    """Function that restores compiled template from database row.
+
+    Args:
+        template (str): Template text stored in database
+        compiled (str): Compiled form of template, None for templates stored before it existed
+
+    Returns:
+        CompiledTemplate: Compiled template
+    """
+    if compiled is None:
+        return compile_legacy(template)
+    return CompiledTemplate.from_json(compiled)
+
+@timed_db
+def gen_recipients(engine: Engine) -> list:
+    """Generates list of users that can receive broadcast: users that did not block the bot
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: List of active users
+    """
+    users, version = cache_get('recipient', engine)
+    if users is not None:
+        return list(users)
+
+    users = []
+    with session_scope(engine) as session:
+        users = list(session.execute(select(User).where(User.active == True).order_by(User.id)).scalars())
+        cache_set('recipient', engine, list(users), version)
 
     return users
 
+@timed_db
+def deactivate_users(user_ids: list, engine: Engine) -> None:
+    """Function that marks users that blocked the bot, so they are skipped by broadcasts and mentions
+
+    Args:
+        user_ids (list): IDs of users
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    if not user_ids:
+        return
+    with session_scope(engine, reraise=True) as session:
+        session.execute(
+            update(User)
+            .where(User.id.in_(list(user_ids)), User.active == True)
+            .values(active=False, blocked_at=datetime.utcnow())
+        )
+        session.commit()
+        invalidate_users(engine)
+
+@timed_db
 def get_templates(engine: Engine) -> dict:
     """Function, that will generate dictionary from database table with templates
+
     Args:
         engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        dict: dict of all compiled templates stored in database by their IDs
     """
-    session = create_session(engine)
+    all_templates, version = cache_get('template', engine)
+    if all_templates is not None:
+        return dict(all_templates)
+
     all_templates = dict()
-    try:
-        templates = session.execute(select(Template).order_by(Template.id)).all()
-        for template in templates:
-            all_templates[template[0].id] = (f"{template[0].template}")
-    except Exception as e:
-        print(e)
-        session.rollback()
-    finally:
-        session.close()
+    with session_scope(engine) as session:
+        rows = session.execute(select(Template.id, Template.template, Template.compiled).order_by(Template.number)).all()
+        all_templates = {id: load_template(template, compiled) for id, template, compiled in rows}
+        cache_set('template', engine, dict(all_templates), version)
 
     return all_templates
 
-def update_templates(template: str, id: int, engine: Engine) -> None:
-    """Function, that will update database table with templates after adding
+@timed_db
+def get_template_page(cursor: int, forward: bool, limit: int, engine: Engine) -> dict:
+    """Function that returns one page of templates using keyset pagination, so every page costs
+    the same regardless of its position. Pages are cached until templates are changed.
+
+    Args:
+        cursor (int): Page starts after template with this number if forward, otherwise ends before it
+        forward (bool): Direction of pagination
+        limit (int): Amount of templates on page
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        dict: Pairs of template number and preview in "items", "has_prev" and "has_next" flags
+    """
+    key = (cursor, forward, limit)
+    pages, version = cache_get('template_page', engine)
+    if pages is not None and key in pages:
+        return pages[key]
+
+    page = {'items': [], 'has_prev': False, 'has_next': False}
+    with session_scope(engine) as session:
+        query = select(Template.number, Template.template, Template.compiled)
+        if forward:
+            query = query.where(Template.number > cursor).order_by(Template.number)
+        else:
+            query = query.where(Template.number < cursor).order_by(Template.number.desc())
+        rows = session.execute(query.limit(limit)).all()
+        if not forward:
+            rows.reverse()
+        items = [(number, load_template(template, compiled).preview()) for number, template, compiled in rows]
+        if items:
+            has_prev = session.execute(select(Template.id).where(Template.number < items[0][0]).limit(1)).first() is not None
+            has_next = session.execute(select(Template.id).where(Template.number > items[-1][0]).limit(1)).first() is not None
+        else:
+            has_prev = has_next = False
+        page = {'items': items, 'has_prev': has_prev, 'has_next': has_next}
+        pages = dict(pages or {})
+        pages[key] = page
+        cache_set('template_page', engine, pages, version)
+
+    return page
+
+@timed_db
+def search_templates(query: str, engine: Engine, category: str = None, limit: int = 20) -> list:
+    """Function that finds templates that contain query, optionally only in one category
+
+    Args:
+        query (str): Text to find, empty query matches every template
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        category (str, optional): Category of templates. Defaults to None, that means every category
+        limit (int): Maximum amount of found templates
+
+    Returns:
+        list: Pairs of template number and preview ordered by number
+    """
+    statement = select(Template.number, Template.template, Template.compiled)
+    if category is not None:
+        statement = statement.where(Template.category == category)
+    if query:
+        # LIKE of SQLite ignores case of latin letters only, so usual spellings of query are matched too
+        variants = {query, query.lower(), query.capitalize()}
+        statement = statement.where(or_(*(Template.template.contains(variant, autoescape=True) for variant in variants)))
+
+    found = []
+    with session_scope(engine) as session:
+        rows = session.execute(statement.order_by(Template.number).limit(limit)).all()
+        found = [(number, load_template(template, compiled).preview()) for number, template, compiled in rows]
+
+    return found
+
+@timed_db
+def get_template_categories(engine: Engine) -> list:
+    """Function that returns categories of templates
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: Pairs of category and amount of its templates ordered by category
+    """
+    categories = []
+    with session_scope(engine) as session:
+        categories = session.execute(
+            select(Template.category, func.count())
+            .where(Template.category.is_not(None))
+            .group_by(Template.category)
+            .order_by(Template.category)
+        ).all()
+
+    return categories
+
+@timed_db
+def find_template(number: int, engine: Engine) -> tuple:
+    """Function that finds template by number that leader typed or pressed
+
+    Args:
+        number (int): Number of template
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        tuple: ID of template and compiled template, or None if there is no such template
+    """
+    found = None
+    with session_scope(engine) as session:
+        row = session.execute(
+            select(Template.id, Template.template, Template.compiled).where(Template.number == number)
+        ).first()
+        if row is not None:
+            found = (row.id, load_template(row.template, row.compiled))
+
+    return found
+
+def template_insert(template: str, category: str = None) -> Any:
+    """Function that returns INSERT statement of template that takes the next number in the same statement,
+    so adding template does not read other templates and two leaders can not get one number.
+
+    Args:
+        template (str): Users message template
+        category (str, optional): Category of template. Defaults to None
+
+    Returns:
+        Any: Insert statement returning number of template
+    """
+    number = select(func.coalesce(func.max(Template.number), 0) + 1).scalar_subquery()
+    return (
+        Template.__table__.insert()
+        .values(number=number, template=template, compiled=compile_template(template).to_json(), category=category)
+        .returning(Template.number)
+    )
+
+@timed_db
+def create_template(template: str, engine: Engine, category: str = None) -> int:
+    """Function that adds template. Template is compiled here once, so it is not parsed again on every send.
 
     Args:
         template (str): Users message template
         engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        category (str, optional): Category of template. Defaults to None
 
     Returns:
-        dict: dict of all templates stored in database
+        int: Number of added template, None if it was not added
     """
-    session = create_session(engine)
-    try:
-        db_template = session.query(Template).filter_by(id=id).first()
-        if not db_template:
-            db_template = Template(id=id, template=template)
-        session.add(db_template)
+    number = None
+    with session_scope(engine, reraise=True) as session:
+        number = session.execute(template_insert(template, category)).scalar()
         session.commit()
-    except BaseException as e:
-        print(e)
-        session.rollback()
-    finally:
-        session.close()
+        invalidate_templates(engine)
+
+    return number
+
+@timed_db
+def delete_template(number: int, engine: Engine) -> bool:
+    """Function that will delete template with matched number together with its schedules
 
-def delete_template(template_id: int, engine: Engine) -> None:
-    """Function that will delete template with matched template_id
+    Args:
+        number (int): Number of template that will be deleted
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if template was deleted, False if there is no such template
+    """
+    deleted = False
+    with session_scope(engine, reraise=True) as session:
+        template_ids = select(Template.id).where(Template.number == number)
+        session.execute(delete(BroadcastSchedule).where(BroadcastSchedule.template_id.in_(template_ids)))
+        deleted = session.execute(delete(Template).where(Template.number == number)).rowcount > 0
+        session.commit()
+        if deleted:
+            invalidate_templates(engine)
+
+    return deleted
+
+def insert_statement(engine: Engine, table: Any) -> Any:
+    """Function that returns INSERT statement of engine dialect that supports "ON CONFLICT".
 
     Args:
-        template_id (int): ID of template that will be deleted
         engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        table (Any): Model to insert rows into
+
+    Returns:
+        Any: Insert statement
     """
-    session = create_session(engine)
-    try:
-        template = session.query(Template).filter_by(id=template_id).first()
-        session.delete(template)
+    if engine.dialect.name == 'postgresql':
+        # imported here, because postgresql dialect takes long to import and is rarely used
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def chunks(rows: list, size: int = BULK_CHUNK_SIZE) -> Iterator[list]:
+    """Function that splits rows into chunks that fit into one statement.
+
+    Args:
+        rows (list): Rows to split
+        size (int): Maximum amount of rows in chunk
+
+    Yields:
+        list: Chunk of rows
+    """
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+@timed_db
+def bulk_upsert_users(users: list, engine: Engine) -> int:
+    """Function that adds or updates many users in one transaction with multi-row "INSERT ... ON CONFLICT".
+    Registered rush royale names are not overwritten by rows without name.
+
+    Args:
+        users (list): Dicts with "id", "username" and optional "rr_name" keys
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of stored users
+    """
+    rows = [
+        {'id': int(user['id']), 'username': user.get('username'), 'rr_name': user.get('rr_name') or '_empty_name_'}
+        for user in users
+    ]
+    stored = 0
+    with session_scope(engine, reraise=True) as session:
+        for chunk in chunks(rows):
+            statement = insert_statement(engine, User).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=[User.id],
+                set_={
+                    'username': func.coalesce(statement.excluded.username, User.username),
+                    'rr_name': case(
+                        (statement.excluded.rr_name == '_empty_name_', User.rr_name),
+                        else_=statement.excluded.rr_name,
+                    ),
+                },
+            )
+            session.execute(statement)
         session.commit()
-    except BaseException as e:
-        print(e)
-        session.rollback()
-    finally:
-        session.close()
\ No newline at end of file
+        invalidate_users(engine)
+        stored = len(rows)
+
+    return stored
+
+@timed_db
+def bulk_rename(names: dict, engine: Engine) -> int:
+    """Function that changes rush royale names of many users with one UPDATE statement.
+
+    Args:
+        names (dict): Rush royale names by user ID
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of updated users
+    """
+    updated = 0
+    if not names:
+        return updated
+    with session_scope(engine, reraise=True) as session:
+        result = session.execute(
+            update(User)
+            .where(User.id.in_(list(names)))
+            .values(rr_name=case(names, value=User.id))
+        )
+        session.commit()
+        invalidate_users(engine)
+        updated = result.rowcount
+
+    return updated
+
+def template_bulk_insert(rows: list) -> Any:
+    """Function that returns INSERT statement of many templates that numbers them after the last number
+    in the same statement, so numbers are not read before insert and can not be taken by other leader meanwhile.
+
+    Args:
+        rows (list): Pairs of template and its compiled JSON form
+
+    Returns:
+        Any: Insert statement returning numbers of added templates
+    """
+    last_number = select(func.coalesce(func.max(Template.number), 0)).scalar_subquery()
+    values = union_all(*(
+        select(literal(offset).label('offset'), literal(template).label('template'), literal(compiled).label('compiled'))
+        for offset, (template, compiled) in enumerate(rows, start=1)
+    )).subquery()
+    return (
+        Template.__table__.insert()
+        .from_select(['number', 'template', 'compiled'], select(last_number + values.c.offset, values.c.template, values.c.compiled))
+        .returning(Template.number)
+    )
+
+@timed_db
+def bulk_import_templates(templates: list, engine: Engine) -> int:
+    """Function that adds many templates in one transaction. Every template is compiled once here.
+    If another leader added template at the same time and took one of numbers, import is repeated.
+
+    Args:
+        templates (list): Templates typed in the same form as leader types them
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of added templates
+    """
+    rows = [(template, compile_template(template).to_json()) for template in templates]
+    added = 0
+    for _ in range(IMPORT_RETRIES):
+        conflict = False
+        with session_scope(engine, reraise=True) as session:
+            try:
+                inserted = sum(len(session.execute(template_bulk_insert(chunk)).all()) for chunk in chunks(rows))
+            except IntegrityError:
+                # number was taken by template added at the same time, so last number is read again
+                session.rollback()
+                conflict = True
+            else:
+                session.commit()
+                invalidate_templates(engine)
+                added = inserted
+        if not conflict:
+            break
+
+    return added
+
+@timed_db
+def create_broadcast_job(leader_id: int, messages: list, engine: Engine) -> int:
+    """Function that stores broadcast with all its deliveries, so it can be resumed after restart
+
+    Args:
+        leader_id (int): ID of leader that requested broadcast
+        messages (list): Pairs of user id and text of message for this user
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: ID of created job or None if it was not created
+    """
+    job_id = None
+    with session_scope(engine, reraise=True) as session:
+        job = BroadcastJob(leader_id=leader_id, status='pending', created_at=datetime.utcnow())
+        session.add(job)
+        session.flush()
+        session.add_all(BroadcastDelivery(job_id=job.id, user_id=user_id, text=text) for user_id, text in messages)
+        session.commit()
+        job_id = job.id
+
+    return job_id
+
+@timed_db
+def get_unfinished_jobs(engine: Engine) -> list:
+    """Function that returns IDs of all broadcasts that were not finished in order of creation
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: List of job IDs
+    """
+    jobs = []
+    with session_scope(engine) as session:
+        jobs = list(session.execute(
+            select(BroadcastJob.id).where(BroadcastJob.status != 'done').order_by(BroadcastJob.id)
+        ).scalars())
+
+    return jobs
+
+@timed_db
+def recover_deliveries(owner: str, engine: Engine) -> int:
+    """Function that marks deliveries, which owner was sending when its process stopped, as "unknown",
+    so they will not be sent twice.
+
+    Args:
+        owner (str): Name of process that claimed deliveries
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of recovered deliveries
+    """
+    recovered = 0
+    with session_scope(engine, reraise=True) as session:
+        recovered = session.execute(
+            update(BroadcastDelivery)
+            .where(BroadcastDelivery.status == 'sending',
+                   (BroadcastDelivery.claimed_by == owner) | (BroadcastDelivery.claimed_by == None))
+            .values(status='unknown')
+        ).rowcount
+        session.commit()
+
+    return recovered
+
+@timed_db
+def start_broadcast_job(job_id: int, engine: Engine) -> bool:
+    """Function that marks pending job as running
+
+    Args:
+        job_id (int): ID of broadcast job
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if job was started by this call
+    """
+    started = False
+    with session_scope(engine, reraise=True) as session:
+        started = session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.status == 'pending')
+            .values(status='running', started_at=datetime.utcnow())
+        ).rowcount == 1
+        session.commit()
+
+    return started
+
+@timed_db
+def claim_deliveries(job_id: int, limit: int, engine: Engine, owner: str = 'main') -> list:
+    """Function that takes next pending deliveries of job and marks them as being sent.
+    Rows are taken by single UPDATE, so processes that drain the same job never take the same row.
+
+    Args:
+        job_id (int): ID of broadcast job
+        limit (int): Maximum amount of deliveries to take
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        owner (str): Name of process that takes deliveries
+
+    Returns:
+        list: List of tuples with delivery id, user id and text
+    """
+    deliveries = []
+    with session_scope(engine, reraise=True) as session:
+        pending = (
+            select(BroadcastDelivery.id)
+            .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.status == 'pending')
+            .order_by(BroadcastDelivery.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        claimed = [tuple(row) for row in session.execute(
+            update(BroadcastDelivery)
+            .where(BroadcastDelivery.id.in_(pending), BroadcastDelivery.status == 'pending')
+            .values(status='sending', claimed_by=owner)
+            .returning(BroadcastDelivery.id, BroadcastDelivery.user_id, BroadcastDelivery.text)
+        ).all()]
+        session.commit()
+        deliveries = sorted(claimed)
+
+    return deliveries
+
+@timed_db
+def set_delivery_status(delivery_id: int, status: str, engine: Engine) -> None:
+    """Function that stores result of one delivery
+
+    Args:
+        delivery_id (int): ID of delivery
+        status (str): "delivered", "blocked" or "failed"
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with session_scope(engine, reraise=True) as session:
+        session.execute(update(BroadcastDelivery).where(BroadcastDelivery.id == delivery_id).values(status=status))
+
+@timed_db
+def finish_broadcast_job(job_id: int, engine: Engine) -> tuple:
+    """Function that marks job as done when none of its deliveries are left and counts them by status.
+    Only one caller finishes the job, others get None instead of job.
+
+    Args:
+        job_id (int): ID of broadcast job
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        tuple: Job entity or None and dict with amount of deliveries for every status
+    """
+    job = None
+    counts = {}
+    with session_scope(engine, reraise=True) as session:
+        counts = dict(session.execute(
+            select(BroadcastDelivery.status, func.count())
+            .where(BroadcastDelivery.job_id == job_id)
+            .group_by(BroadcastDelivery.status)
+        ).all())
+        if counts.get('pending', 0) or counts.get('sending', 0):
+            return job, counts
+        finished = session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.status != 'done')
+            .values(status='done', finished_at=datetime.utcnow())
+        ).rowcount
+        session.commit()
+        if finished:
+            job = session.get(BroadcastJob, job_id)
+
+    return job, counts
+
+@timed_db
+def append_dialogue_handler(chat_id: int, record: str, now: int, expires_at: int, engine: Engine) -> None:
+    """Function that adds next step handler to handlers of chat in one statement,
+    so concurrent registrations for the same chat do not overwrite each other.
+    Handlers of expired dialogue are replaced.
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        record (str): Serialized handler
+        now (int): Current unix time
+        expires_at (int): Unix time after which dialogue is considered abandoned
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with session_scope(engine, reraise=True) as session:
+        statement = insert_statement(engine, DialogueState).values(chat_id=chat_id, handlers=f'[{record}]', expires_at=expires_at)
+        # handlers are kept as JSON list, so record is put before its closing bracket
+        appended = func.substr(DialogueState.handlers, 1, func.length(DialogueState.handlers) - 1, type_=String) + ', ' + record + ']'
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[DialogueState.chat_id],
+            set_={
+                'handlers': case((DialogueState.expires_at > now, appended), else_=statement.excluded.handlers),
+                'expires_at': statement.excluded.expires_at,
+            },
+        ))
+
+@timed_db
+def get_dialogue_chat_ids(now: int, engine: Engine) -> set:
+    """Function that returns IDs of chats with unfinished dialogues
+
+    Args:
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        set: IDs of chats
+    """
+    chat_ids = set()
+    with session_scope(engine) as session:
+        chat_ids = set(session.execute(select(DialogueState.chat_id).where(DialogueState.expires_at > now)).scalars())
+
+    return chat_ids
+
+@timed_db
+def pop_dialogue_state(chat_id: int, now: int, engine: Engine) -> str:
+    """Function that atomically takes handlers of chat, so two workers can not run the same step
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        str: Serialized handlers or None if there is no dialogue or it has expired
+    """
+    handlers = None
+    with session_scope(engine, reraise=True) as session:
+        row = session.execute(
+            delete(DialogueState).where(DialogueState.chat_id == chat_id)
+            .returning(DialogueState.handlers, DialogueState.expires_at)
+        ).first()
+        session.commit()
+        if row is not None and row.expires_at > now:
+            handlers = row.handlers
+
+    return handlers
+
+@timed_db
+def clear_dialogue_state(chat_id: int, engine: Engine) -> None:
+    """Function that drops dialogue of chat
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with session_scope(engine, reraise=True) as session:
+        session.execute(delete(DialogueState).where(DialogueState.chat_id == chat_id))
+
+@timed_db
+def delete_expired_states(now: int, engine: Engine) -> int:
+    """Function that drops all abandoned dialogues. Cleanup is repeated later, so its errors are not raised
+
+    Args:
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of dropped dialogues
+    """
+    deleted = 0
+    with session_scope(engine) as session:
+        deleted = session.execute(delete(DialogueState).where(DialogueState.expires_at <= now)).rowcount
+        session.commit()
+
+    return deleted
+
+def add_chat_member(chat_id: int, user_id: int, engine: Engine) -> None:
+    """Function that remembers that user is a member of group chat.
+    Members that are already stored are found in memory, so only new members are written to database.
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        user_id (int): ID of user thah defined by Telegram
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with _known_members_lock:
+        if (chat_id, user_id) in _known_members:
+            return
+    add_chat_members([(chat_id, user_id)], engine)
+
+@timed_db
+def add_chat_members(members: list, engine: Engine) -> int:
+    """Function that remembers many members of group chats in one transaction
+
+    Args:
+        members (list): Pairs of chat ID and user ID
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of members that were not known before
+    """
+    with _known_members_lock:
+        rows = [{'chat_id': chat_id, 'user_id': user_id} for chat_id, user_id in dict.fromkeys(members)
+                if (chat_id, user_id) not in _known_members]
+    if not rows:
+        return 0
+    added = 0
+    with session_scope(engine, reraise=True) as session:
+        for chunk in chunks(rows):
+            session.execute(insert_statement(engine, ChatMembership).values(chunk).on_conflict_do_nothing())
+        session.commit()
+        with _known_members_lock:
+            _known_members.update((row['chat_id'], row['user_id']) for row in rows)
+        added = len(rows)
+
+    return added
+
+@timed_db
+def remove_chat_member(chat_id: int, user_id: int, engine: Engine) -> None:
+    """Function that forgets user that left group chat
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        user_id (int): ID of user thah defined by Telegram
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with _known_members_lock:
+        _known_members.discard((chat_id, user_id))
+    with session_scope(engine, reraise=True) as session:
+        session.execute(
+            delete(ChatMembership).where(ChatMembership.chat_id == chat_id, ChatMembership.user_id == user_id)
+        )
+
+@timed_db
+def is_chat_tracked(chat_id: int, engine: Engine) -> bool:
+    """Function that checks whether any member of group chat was seen
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if members of chat are tracked
+    """
+    tracked = False
+    with session_scope(engine) as session:
+        tracked = session.execute(
+            select(ChatMembership.user_id).where(ChatMembership.chat_id == chat_id).limit(1)
+        ).first() is not None
+
+    return tracked
+
+@timed_db
+def get_chat_mentions(chat_id: int, tracked: bool, after_id: int, limit: int, engine: Engine) -> list:
+    """Function that returns one batch of registered users of group chat using keyset pagination.
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        tracked (bool): Whether only tracked members of chat are returned, otherwise all registered users are returned
+        after_id (int): Batch starts after user with this ID
+        limit (int): Amount of users in batch
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: Tuples of user ID, username and rush royale name ordered by user ID
+    """
+    mentions = []
+    with session_scope(engine) as session:
+        query = select(User.id, User.username, User.rr_name).where(User.active == True, User.id > after_id)
+        if tracked:
+            query = query.join(ChatMembership, ChatMembership.user_id == User.id).where(ChatMembership.chat_id == chat_id)
+        mentions = [tuple(row) for row in session.execute(query.order_by(User.id).limit(limit))]
+
+    return mentions
+
+def iter_chat_mentions(chat_id: int, engine: Engine, batch_size: int = 500) -> Iterator[tuple]:
+    """Function that streams registered users of group chat from database.
+    If no members of chat were seen yet, all registered users are returned. It is checked once, when this
+    function is called, so members recorded while mentions are sent do not change result.
+    Every batch is read in its own short session, so no session is held while mentions are sent.
+
+    Args:
+        chat_id (int): ID of chat that defined by Telegram
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        batch_size (int): Amount of rows that are fetched at once
+
+    Returns:
+        Iterator[tuple]: User ID, username and rush royale name
+    """
+    tracked = is_chat_tracked(chat_id, engine)
+
+    def batches() -> Iterator[tuple]:
+        after_id = 0
+        while True:
+            mentions = get_chat_mentions(chat_id, tracked, after_id, batch_size, engine)
+            yield from mentions
+            if len(mentions) < batch_size:
+                return
+            after_id = mentions[-1][0]
+
+    return batches()
+
+@timed_db
+def count_pending_deliveries(engine: Engine) -> int:
+    """Function that counts broadcast messages that are not sent yet
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of pending deliveries
+    """
+    pending = 0
+    with session_scope(engine) as session:
+        pending = session.execute(
+            select(func.count()).select_from(BroadcastDelivery).where(BroadcastDelivery.status.in_(('pending', 'sending')))
+        ).scalar()
+
+    return pending
+
+@timed_db
+def create_schedule(template_id: int, leader_id: int, recurrence: str, next_run_at: datetime, engine: Engine) -> int:
+    """Function that stores scheduled broadcast of template
+
+    Args:
+        template_id (int): ID of template that will be sent
+        leader_id (int): ID of leader that scheduled broadcast
+        recurrence (str): When broadcast is repeated, see scheduler.parse_recurrence
+        next_run_at (datetime): Local time of first run
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: ID of created schedule or None if it was not created
+    """
+    schedule_id = None
+    with session_scope(engine, reraise=True) as session:
+        schedule = BroadcastSchedule(template_id=template_id, leader_id=leader_id, recurrence=recurrence,
+                                     next_run_at=next_run_at)
+        session.add(schedule)
+        session.commit()
+        schedule_id = schedule.id
+
+    return schedule_id
+
+@timed_db
+def get_schedules(engine: Engine) -> list:
+    """Function that returns all active scheduled broadcasts in order of their next run
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: List of BroadcastSchedule entities
+    """
+    schedules = []
+    with session_scope(engine) as session:
+        schedules = list(session.execute(
+            select(BroadcastSchedule).where(BroadcastSchedule.active == True).order_by(BroadcastSchedule.next_run_at)
+        ).scalars())
+
+    return schedules
+
+@timed_db
+def get_schedule(schedule_id: int, engine: Engine) -> BroadcastSchedule:
+    """Function that returns scheduled broadcast by its ID
+
+    Args:
+        schedule_id (int): ID of schedule
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        BroadcastSchedule: Schedule entity or None if it does not exist
+    """
+    schedule = None
+    with session_scope(engine) as session:
+        schedule = session.get(BroadcastSchedule, schedule_id)
+
+    return schedule
+
+@timed_db
+def advance_schedule(schedule_id: int, due_at: datetime, next_run_at: datetime, engine: Engine) -> bool:
+    """Function that moves schedule to its next run, schedule without next run is deactivated.
+    Schedule is moved only if it is still due at given time, so one run is never taken twice.
+
+    Args:
+        schedule_id (int): ID of schedule
+        due_at (datetime): Run that is being taken
+        next_run_at (datetime): Next run or None
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if run was taken by caller
+    """
+    taken = False
+    with session_scope(engine, reraise=True) as session:
+        values = {'next_run_at': next_run_at} if next_run_at is not None else {'active': False}
+        result = session.execute(
+            update(BroadcastSchedule)
+            .where(BroadcastSchedule.id == schedule_id, BroadcastSchedule.active == True,
+                   BroadcastSchedule.next_run_at == due_at)
+            .values(**values)
+        )
+        session.commit()
+        taken = result.rowcount == 1
+
+    return taken
+
+@timed_db
+def delete_schedule(schedule_id: int, engine: Engine) -> bool:
+    """Function that cancels scheduled broadcast
+
+    Args:
+        schedule_id (int): ID of schedule
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if schedule existed
+    """
+    deleted = False
+    with session_scope(engine, reraise=True) as session:
+        deleted = session.execute(delete(BroadcastSchedule).where(BroadcastSchedule.id == schedule_id)).rowcount == 1
+        session.commit()
+
+    return deleted
+
+@timed_db
+def get_claimed_keys(keys: list, engine: Engine) -> set:
+    """Function that finds keys of processed updates or sends that are already stored
+
+    Args:
+        keys (list): Keys to look for
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        set: Keys that are stored
+    """
+    claimed = set()
+    with session_scope(engine) as session:
+        for chunk in chunks(keys):
+            claimed.update(session.execute(select(ProcessedKey.key).where(ProcessedKey.key.in_(chunk))).scalars())
+
+    return claimed
+
+@timed_db
+def claim_keys(keys: list, now: int, engine: Engine) -> set:
+    """Function that stores keys of processed updates or sends in one statement per chunk
+
+    Args:
+        keys (list): Keys to store
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        set: Keys that were not stored before or None if database is not available
+    """
+    claimed = None
+    with session_scope(engine, reraise=True) as session:
+        new_keys = set()
+        for chunk in chunks(keys):
+            new_keys.update(session.execute(
+                insert_statement(engine, ProcessedKey)
+                .values([{'key': key, 'created_at': now} for key in chunk])
+                .on_conflict_do_nothing()
+                .returning(ProcessedKey.key)
+            ).scalars())
+        session.commit()
+        claimed = new_keys
+
+    return claimed
+
+@timed_db
+def delete_expired_keys(before: int, engine: Engine) -> int:
+    """Function that removes keys stored before given time. Cleanup is repeated later, so its errors are not raised
+
+    Args:
+        before (int): Unix time, older keys are removed
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of removed keys
+    """
+    deleted = 0
+    with session_scope(engine) as session:
+        deleted = session.execute(delete(ProcessedKey).where(ProcessedKey.created_at < before)).rowcount
+        session.commit()
+
+    return deleted
+
+@timed_db
+def add_receipts(receipts: list, engine: Engine) -> None:
+    """Function that appends results of requests made for broadcast
+
+    Args:
+        receipts (list): Dicts with job_id, user_id, action, status, message_id, latency_ms, error_code and created_at
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with session_scope(engine, reraise=True) as session:
+        for chunk in chunks(receipts):
+            session.execute(insert_statement(engine, DeliveryReceipt).values(chunk))
+        session.commit()
+
+@timed_db
+def get_last_job(engine: Engine) -> BroadcastJob:
+    """Function that returns the latest broadcast
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        BroadcastJob: Job entity or None if there were no broadcasts
+    """
+    job = None
+    with session_scope(engine) as session:
+        job = session.execute(select(BroadcastJob).order_by(BroadcastJob.id.desc()).limit(1)).scalar()
+
+    return job
+
+@timed_db
+def get_job_stats(job_id: int, engine: Engine, percentiles: tuple = (0.5, 0.9, 0.99)) -> dict:
+    """Function that aggregates sends of broadcast. Percentiles of latency are read by index
+    on (job_id, action, status, latency_ms), one row per percentile.
+
+    Args:
+        job_id (int): ID of broadcast job
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        percentiles (tuple): Shares of delivered messages, which latency is returned
+
+    Returns:
+        dict: Amount of sends for every status in "counts" and latency in milliseconds for every share in "latency"
+    """
+    stats = {'counts': {}, 'latency': {}}
+    with session_scope(engine) as session:
+        sends = (DeliveryReceipt.job_id == job_id, DeliveryReceipt.action == 'send')
+        counts = dict(session.execute(
+            select(DeliveryReceipt.status, func.count()).where(*sends).group_by(DeliveryReceipt.status)
+        ).all())
+        delivered = counts.get('delivered', 0)
+        latency = {}
+        for share in percentiles if delivered else ():
+            latency[share] = session.execute(
+                select(DeliveryReceipt.latency_ms)
+                .where(*sends, DeliveryReceipt.status == 'delivered')
+                .order_by(DeliveryReceipt.latency_ms)
+                .offset(int(share * (delivered - 1)))
+                .limit(1)
+            ).scalar()
+        stats = {'counts': counts, 'latency': latency}
+
+    return stats
+
+@timed_db
+def get_delivery_rate(since: int, engine: Engine) -> tuple:
+    """Function that counts sends of all broadcasts made after given time
+
+    Args:
+        since (int): Unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        tuple: Amount of delivered messages and amount of all sends
+    """
+    rate = (0, 0)
+    with session_scope(engine) as session:
+        delivered, total = session.execute(
+            select(func.count().filter(DeliveryReceipt.status == 'delivered'), func.count())
+            .where(DeliveryReceipt.created_at >= since, DeliveryReceipt.action == 'send')
+        ).one()
+        rate = (delivered or 0, total or 0)
+
+    return rate
+
+@timed_db
+def get_sent_messages(job_id: int, engine: Engine) -> list:
+    """Function that returns messages of broadcast that were delivered and were not deleted
+
+    Args:
+        job_id (int): ID of broadcast job
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: Pairs of user id and message id
+    """
+    messages = []
+    with session_scope(engine) as session:
+        deletion = aliased(DeliveryReceipt)
+        deleted = (
+            select(deletion.id)
+            .where(deletion.job_id == job_id, deletion.action == 'delete', deletion.status == 'deleted',
+                   deletion.user_id == DeliveryReceipt.user_id, deletion.message_id == DeliveryReceipt.message_id)
+            .exists()
+        )
+        messages = [tuple(row) for row in session.execute(
+            select(DeliveryReceipt.user_id, DeliveryReceipt.message_id)
+            .where(DeliveryReceipt.job_id == job_id, DeliveryReceipt.action == 'send',
+                   DeliveryReceipt.status == 'delivered', ~deleted)
+            .order_by(DeliveryReceipt.id)
+        ).all()]
+
+    return messages
+
+@timed_db
+def add_auth_failure(user_id: int, now: int, engine: Engine) -> None:
+    """Function that stores failed authentication attempt
+
+    Args:
+        user_id (int): ID of user that is defined by Telegram
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+    """
+    with session_scope(engine, reraise=True) as session:
+        session.add(AuthFailure(user_id=user_id, created_at=now))
+        session.commit()
+
+@timed_db
+def get_auth_failures(since: int, engine: Engine) -> list:
+    """Function that returns failed authentication attempts made after given time
+
+    Args:
+        since (int): Unix time, older attempts are skipped
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        list: Pairs of user ID and unix time of attempt ordered by time
+    """
+    failures = []
+    with session_scope(engine) as session:
+        failures = [tuple(row) for row in session.execute(
+            select(AuthFailure.user_id, AuthFailure.created_at)
+            .where(AuthFailure.created_at >= since)
+            .order_by(AuthFailure.created_at, AuthFailure.id)
+        ).all()]
+
+    return failures
+
+@timed_db
+def delete_auth_failures(engine: Engine, user_id: int = None, before: int = None) -> int:
+    """Function that removes failed authentication attempts of user or attempts made before given time
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        user_id (int, optional): ID of user whose attempts are removed
+        before (int, optional): Unix time, older attempts are removed
+
+    Returns:
+        int: Amount of removed attempts
+    """
+    statement = delete(AuthFailure)
+    if user_id is not None:
+        statement = statement.where(AuthFailure.user_id == user_id)
+    if before is not None:
+        statement = statement.where(AuthFailure.created_at < before)
+    deleted = 0
+    with session_scope(engine, reraise=True) as session:
+        deleted = session.execute(statement).rowcount
+        session.commit()
+
+    return deleted
+
+@timed_db
+def add_invite_codes(code_hashes: list, created_by: int, now: int, expires_at: int, engine: Engine) -> bool:
+    """Function that stores hashes of new invite codes
+
+    Args:
+        code_hashes (list): Hashes of codes
+        created_by (int): ID of leader that created codes
+        now (int): Current unix time
+        expires_at (int): Unix time after which codes can not be used
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if codes were stored
+    """
+    stored = False
+    with session_scope(engine, reraise=True) as session:
+        session.execute(insert_statement(engine, InviteCode).values([
+            {'code_hash': code_hash, 'created_by': created_by, 'created_at': now, 'expires_at': expires_at}
+            for code_hash in code_hashes
+        ]))
+        session.commit()
+        stored = True
+
+    return stored
+
+@timed_db
+def use_invite_code(code_hash: str, user_id: int, now: int, engine: Engine) -> bool:
+    """Function that marks invite code as used in one conditional statement, so code can be used only once
+
+    Args:
+        code_hash (str): Hash of code typed by user
+        user_id (int): ID of user that typed code
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        bool: True if code existed, was not used and did not expire
+    """
+    used = False
+    with session_scope(engine, reraise=True) as session:
+        used = session.execute(
+            update(InviteCode)
+            .where(InviteCode.code_hash == code_hash, InviteCode.used_by.is_(None), InviteCode.expires_at > now)
+            .values(used_by=user_id, used_at=now)
+        ).rowcount > 0
+        session.commit()
+
+    return used
+
+@timed_db
+def revoke_invite_codes(created_by: int, now: int, engine: Engine) -> int:
+    """Function that makes all unused invite codes of leader expired
+
+    Args:
+        created_by (int): ID of leader that created codes
+        now (int): Current unix time
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+
+    Returns:
+        int: Amount of revoked codes
+    """
+    revoked = 0
+    with session_scope(engine, reraise=True) as session:
+        revoked = session.execute(
+            update(InviteCode)
+            .where(InviteCode.created_by == created_by, InviteCode.used_by.is_(None), InviteCode.expires_at > now)
+            .values(expires_at=now)
+        ).rowcount
+        session.commit()
+
+    return revoked
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.engine import Engine
+from telebot import TeleBot
+
+from metrics import DUPLICATES, log_event
+
+from .dbworker import claim_keys, delete_expired_keys, get_claimed_keys
+
+
+class IdempotencyStore:
+    """Store of keys of already processed updates and sends.
+
+    Recently seen keys are kept in bounded LRU, so repeated duplicates are dropped without database.
+    Other keys are inserted into database in one statement, key that is already there is a duplicate.
+    Keys older than ttl are removed from database. If database is not available, keys are treated as new.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        capacity (int): Maximum amount of keys kept in memory
+        ttl (int): Amount of seconds keys are kept in database
+        cleanup_interval (int): Amount of seconds between removals of expired keys
+    """
+
+    def __init__(self, engine: Engine, capacity: int = 10000, ttl: int = 86400, cleanup_interval: int = 600) -> None:
+        self.engine = engine
+        self.capacity = capacity
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_cleanup = 0
+
+    def _remember(self, keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._recent[key] = None
+                self._recent.move_to_end(key)
+            while len(self._recent) > self.capacity:
+                self._recent.popitem(last=False)
+
+    def _cleanup(self, now: int) -> None:
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._last_cleanup = now
+            delete_expired_keys(now - self.ttl, self.engine)
+
+    def claim_many(self, keys: list) -> set:
+        """Function that marks keys as processed.
+
+        Args:
+            keys (list): Keys of updates or sends
+
+        Returns:
+            set: Keys that were not processed before and have to be processed by caller
+        """
+        with self._lock:
+            unknown = [key for key in dict.fromkeys(keys) if key not in self._recent]
+        if not unknown:
+            return set()
+
+        now = int(time.time())
+        self._cleanup(now)
+        claimed = claim_keys(unknown, now, self.engine)
+        if claimed is None:
+            log_event('dedup_unavailable', keys=len(unknown))
+            claimed = set(unknown)
+        self._remember(unknown)
+        return claimed
+
+    def seen_many(self, keys: list) -> set:
+        """Function that finds keys that were already processed, other keys are not marked.
+        It lets caller mark keys only after they were processed.
+
+        Args:
+            keys (list): Keys of updates or sends
+
+        Returns:
+            set: Keys that were processed before
+        """
+        with self._lock:
+            seen = {key for key in keys if key in self._recent}
+        unknown = [key for key in dict.fromkeys(keys) if key not in seen]
+        if unknown:
+            seen.update(get_claimed_keys(unknown, self.engine))
+        return seen
+
+    def claim(self, key: str) -> bool:
+        """Function that marks one key as processed.
+
+        Args:
+            key (str): Key of update or send
+
+        Returns:
+            bool: True if key was not processed before
+        """
+        return key in self.claim_many([key])
+
+
+def acknowledge_updates(bot: TeleBot, updates: list) -> None:
+    """Function that moves polling offset of bot past updates, so Telegram does not send them again.
+    Telebot moves it only for updates that reach process_new_updates, so filters that drop updates call it first.
+
+    Args:
+        bot (TeleBot): Bot that receives updates
+        updates (list): Updates received from Telegram
+    """
+    if updates:
+        bot.last_update_id = max(bot.last_update_id, max(update.update_id for update in updates))
+
+
+def install_update_dedup(bot: TeleBot, store: IdempotencyStore) -> None:
+    """Function that makes bot drop updates which update_id was already processed.
+    Works for both polling and webhook, because both pass updates to process_new_updates.
+
+    Args:
+        bot (TeleBot): Bot that receives updates
+        store (IdempotencyStore): Store of processed keys
+    """
+    process_new_updates = bot.process_new_updates
+    if getattr(process_new_updates, '__dedup__', False):
+        return
+
+    def process_unique_updates(updates: list) -> None:
+        acknowledge_updates(bot, updates)
+        claimed = store.claim_many([f'update:{update.update_id}' for update in updates])
+        unique = []
+        for update in updates:
+            key = f'update:{update.update_id}'
+            if key in claimed:
+                claimed.discard(key)
+                unique.append(update)
+        if len(unique) < len(updates):
+            DUPLICATES.inc(len(updates) - len(unique), kind='update')
+        if unique:
+            process_new_updates(unique)
+
+    process_unique_updates.__dedup__ = True
+    bot.process_new_updates = process_unique_updates
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, true
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -12,8 +12,10 @@ class User(Base):
     __tablename__ = "user"
 
     id = Column(Integer, primary_key=True)
-    username = Column(String)
-    rr_name = Column(String)
+    username = Column(String, index=True)
+    rr_name = Column(String, index=True)
+    active = Column(Boolean, default=True, server_default=true(), nullable=False, index=True)
+    blocked_at = Column(DateTime)
 
 class Template(Base):
     """SQLAlchemy model of template
@@ -22,5 +24,140 @@ class Template(Base):
         Base (Class): base class for declarative class definitions
     """
     __tablename__ = "template"
+    __table_args__ = (
+        Index('ix_template_category_number', 'category', 'number'),
+        {'sqlite_autoincrement': True},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # number that leaders see and type, it is not reused or shifted after deletes
+    number = Column(Integer, unique=True, index=True)
+    template = Column(String)
+    compiled = Column(String)
+    category = Column(String)
+
+class BroadcastJob(Base):
+    """SQLAlchemy model of broadcast that was requested by leader
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "broadcast_job"
+    id = Column(Integer, primary_key=True)
+    leader_id = Column(Integer)
+    status = Column(String, default='pending')
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class BroadcastDelivery(Base):
+    """SQLAlchemy model of one message of broadcast that has to be delivered to one user
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "broadcast_delivery"
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey('broadcast_job.id'), index=True)
+    user_id = Column(Integer)
+    text = Column(String)
+    status = Column(String, default='pending', index=True)
+    claimed_by = Column(String)
+
+
+class DialogueState(Base):
+    """SQLAlchemy model of unfinished dialogue, that stores next step handlers of one chat
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "dialogue_state"
+    chat_id = Column(Integer, primary_key=True)
+    handlers = Column(String)
+    expires_at = Column(Integer, index=True)
+
+
+class ChatMembership(Base):
+    """SQLAlchemy model of user being a member of group chat
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "chat_membership"
+    chat_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+
+
+class BroadcastSchedule(Base):
+    """SQLAlchemy model of broadcast of template, that is sent at given time once or repeatedly
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "broadcast_schedule"
+    id = Column(Integer, primary_key=True)
+    template_id = Column(Integer, ForeignKey('template.id'))
+    leader_id = Column(Integer)
+    recurrence = Column(String)
+    next_run_at = Column(DateTime, index=True)
+    active = Column(Boolean, default=True, server_default=true(), nullable=False)
+
+
+class ProcessedKey(Base):
+    """SQLAlchemy model of key of update or send that was already processed, used to drop duplicates
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "processed_key"
+    key = Column(String, primary_key=True)
+    created_at = Column(Integer, index=True)
+
+
+class DeliveryReceipt(Base):
+    """SQLAlchemy model of result of one request to Telegram made for broadcast: send, edit or delete.
+    Rows are only appended, so sent messages can be edited or deleted and analysed later.
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "delivery_receipt"
+    __table_args__ = (
+        Index('ix_delivery_receipt_job', 'job_id', 'action', 'status', 'latency_ms'),
+    )
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer)
+    user_id = Column(Integer)
+    action = Column(String)
+    status = Column(String)
+    message_id = Column(Integer)
+    latency_ms = Column(Integer)
+    error_code = Column(Integer)
+    created_at = Column(Integer, index=True)
+
+
+class AuthFailure(Base):
+    """SQLAlchemy model of failed authentication attempt, used to restore throttling after restart
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "auth_failure"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    created_at = Column(Integer, index=True)
+
+
+class InviteCode(Base):
+    """SQLAlchemy model of one-time invite code. Only hash of code is stored, so codes can not be read from database
+
+    Args:
+        Base (Class): base class for declarative class definitions
+    """
+    __tablename__ = "invite_code"
     id = Column(Integer, primary_key=True)
-    template = Column(String)
\ No newline at end of file
+    code_hash = Column(String, unique=True, index=True)
+    created_by = Column(Integer)
+    created_at = Column(Integer)
+    expires_at = Column(Integer)
+    used_by = Column(Integer)
+    used_at = Column(Integer)
@@ -2,21 +2,110 @@ REPLIES = {
     'incorrect': 'Я не понимаю таких команд, попробуйте начать с команды "/start" ~(o_o ~)',
     'start': 'Здравствуйте, я бот помощник глав клана Samus! Я буду информировать вас о решениях, принятых главами о предстоящих КВ.\n\nВ любой момент диалог можно прервать словом "стоп"',
     'register': 'Для начала, нам нужно узнать, какой у вас ник в игре.\n\nВведите свой ник.',
-    'authenticate': 'Для того чтобы удостовериться что вы участник нашего клана, введите проверочное слово, выданное одним из глав!\n\nВведите проверочное слово.',
+    'authenticate': 'Для того чтобы удостовериться что вы участник нашего клана, введите проверочное слово или код приглашения, выданные одним из глав!\n\nВведите проверочное слово.',
     'auth_failed': 'Неверное секретное слово!',
+    'auth_locked': 'Слишком много неудачных попыток, попробуйте снова через {minutes} мин.',
+    'invite_created': 'Коды приглашения, каждый можно использовать один раз в течение {hours} ч:\n\n{codes}',
+    'invite_usage': 'Введите "/invite" или "/invite количество", можно создать до {max} кодов за раз',
+    'invite_failed': 'Не получилось создать коды, попробуйте ещё раз!',
+    'invite_revoked': 'Отозвано неиспользованных кодов: {count}',
     'auth_passed': 'Отлично, аутентификация пройдена!\nОжидай указания от главы и не забывай их выполнять!!!',
     'choose_template': 'Выберите одно из созданных вами сообщений, которое вы хотите отправить:\n\n(Если необходимого сообщения нет в списке, прервите диалог словом "стоп" и введите команду "/new" чтобы его добавить, или же введите "0", но тогда, введённое сообщение не сохранится)',
-    'add_template': 'Для того чтобы добавить шаблон сообщения, введите его. В местах где нужно обратиться к игроку, вставляйте "имя_игрока". (Например: "Доброе утро, имя_игрока")\n\nВведите шаблон сообщения.',
-    'del_template': 'Для того чтобы удалить шаблон сообщения, введите его номер',
+    'add_template': 'Для того чтобы добавить шаблон сообщения, введите его. В местах где нужно обратиться к игроку, вставляйте "имя_игрока", для упоминания его ника в телеграме - "ник_игрока", а для сегодняшней даты - "дата_сегодня". (Например: "Доброе утро, имя_игрока")\n\nЧтобы отнести шаблон к категории, начните его со слова с решёткой, например "#сбор".\n\nВведите шаблон сообщения.',
+    'del_template': 'Для того чтобы удалить шаблон сообщения, нажмите на него или введите его номер',
+    'no_templates': 'Шаблонов пока нет',
+    'prev_page': '◀',
+    'next_page': '▶',
+    'send_free_button': 'Отправить без сохранения',
+    'schedule_template': 'Выберите шаблон, который нужно отправлять по расписанию:',
+    'schedule_time': 'Когда отправить сообщение?\n\nОдин раз: "20.10.2026 18:00"\nКаждый день: "18:00"\nПо cron-выражению: "cron 0 18 * * 1-5" (минуты, часы, день, месяц, день недели)',
+    'invalid_schedule_time': 'Не получилось разобрать время, попробуйте ещё раз!',
+    'schedule_created': 'Рассылка запланирована, ближайшая отправка: {next_run}',
+    'schedule_failed': 'Не получилось сохранить расписание, попробуйте ещё раз!',
+    'no_schedules': 'Запланированных рассылок нет',
+    'unschedule': 'Введите номер расписания, которое нужно отменить',
+    'schedule_deleted': 'Расписание отменено',
+    'invalid_schedule': 'Вы ввели номер расписания, которое не существует!',
     'stop': 'Диалог закончен, я жду вас снова!',
     'logged': 'Привет {rr_name}, чем я могу быть тебе полезен?',
-    'commands': 'Команды, которые я понимаю:\n(Только в ЛС и для глав)\n\t/all - отправить всем участникам клана очень важное сообщение\n\t/new - создать новый шаблон сообщения для отправки\n\t/del - удалить созданный главами шаблон\n\t\n(Только в группах и для глав)\n\t/everyone - упомянуть всех в группе для привлечения внимания\n\t...',
-    'msg_sent': 'Сообщение успешно отправлено!',
-    'template_created': 'Шаблон успешно добавлен!',
+    'commands': 'Команды, которые я понимаю:\n(Только в ЛС и для глав)\n\t/all - отправить всем участникам клана очень важное сообщение\n\t/new - создать новый шаблон сообщения для отправки\n\t/del - удалить созданный главами шаблон\n\t/find - найти шаблон по тексту или категории\n\t/invite - создать одноразовые коды приглашения\n\t/revoke - отозвать неиспользованные коды приглашения\n\t/schedule - запланировать отправку шаблона\n\t/unschedule - отменить запланированную отправку\n\t/stats - статистика последней рассылки\n\t/edit - изменить текст последней рассылки\n\t/recall - удалить последнюю рассылку у всех\n\t\n(Только в группах и для глав)\n\t/everyone - упомянуть всех в группе для привлечения внимания\n\t...',
+    'broadcast_started': 'Начинаю рассылку, сообщу, когда закончу!',
+    'broadcast_failed': 'Не получилось сохранить рассылку, попробуйте ещё раз!',
+    'broadcast_report': 'Сообщение успешно отправлено!\n\nДоставлено: {delivered}\nНе доставлено: {failed}\nЗаблокировали бота: {blocked}\n\nПодробнее: /stats',
+    'no_broadcasts': 'Рассылок ещё не было',
+    'stats': 'Последняя рассылка от {date}:\n\nДоставлено: {delivered} из {total} ({rate}%)\nНе доставлено: {failed}\nЗаблокировали бота: {blocked}\nВремя доставки: p50 {p50} мс, p90 {p90} мс, p99 {p99} мс\n\nДоставлено за неделю: {week_delivered} из {week_total} ({week_rate}%)',
+    'edit_broadcast': 'Введите новый текст последней рассылки, он заменит сообщение у всех получателей. Можно использовать "имя_игрока", "ник_игрока" и "дата_сегодня"',
+    'edit_started': 'Изменяю сообщения, сообщу, когда закончу!',
+    'recall_started': 'Удаляю сообщения последней рассылки, сообщу, когда закончу!',
+    'revise_report': 'Готово!\n\nУспешно: {done}\nНе получилось: {failed}',
+    'template_created': 'Шаблон №{number} успешно добавлен!',
+    'template_failed': 'Не получилось сохранить шаблон, попробуйте ещё раз!',
+    'find_usage': 'Чтобы найти шаблон, введите "/find текст", чтобы найти в категории - "/find #категория текст"',
+    'templates_not_found': 'Подходящих шаблонов нет',
     'template_deleted': 'Шаблон успешно удалён',
     'invalid_key': 'Вы ввели номер шаблона, который не существует!',
     'only_for_chat': 'Эту команду можно использовать только в группе! Кого мне тут звать?)',
     'after_everyone': '\n\nФух, ну, вроде всех собрал)',
+    'default_mention_name': 'соклановец',
     'help': 'Да, я с радостью расскажу вам о себе!',
     'send_without_storing': 'Осторожно! Введённое вами сообщение отправится всем, но не сохранится!\n\nВведите сообщение, которое нужно отправить всем прямо сейчас:'
-}
\ No newline at end of file
+}
+
+# Long templates are cut on pages of picker, so page always fits into one message
+PAGE_PREVIEW_LIMIT = 300
+
+
+def format_schedules(schedules: list, templates: dict) -> str:
+    """Function that generates one entire message with scheduled broadcasts
+
+    Args:
+        schedules (list): Active BroadcastSchedule entities
+        templates (dict): Compiled templates stored in database
+
+    Returns:
+        str: Generated message
+    """
+    return 'Запланированные рассылки:\n\n' + ''.join(
+        f"{number}) {schedule.next_run_at:%d.%m.%Y %H:%M} ({schedule.recurrence}) - "
+        f"{templates[schedule.template_id].preview() if schedule.template_id in templates else '?'}\n\n"
+        for number, schedule in enumerate(schedules, start=1)
+    )
+
+
+def format_categories(categories: list) -> str:
+    """Function that generates message with categories of templates
+
+    Args:
+        categories (list): Pairs of category and amount of its templates
+
+    Returns:
+        str: Generated message
+    """
+    return 'Категории шаблонов:\n\n' + ''.join(f"#{category} - {count}\n" for category, count in categories)
+
+
+def format_template_page(items: list) -> str:
+    """Function that generates message with one page of templates
+
+    Args:
+        items (list): Pairs of template number and preview
+
+    Returns:
+        str: Generated message
+    """
+    if not items:
+        return REPLIES['no_templates']
+    return 'Ваши шаблоны:\n\n' + ''.join(f"{number}) {shorten(preview, PAGE_PREVIEW_LIMIT)}\n\n" for number, preview in items)
+
+
+def shorten(text: str, limit: int) -> str:
+    """Function that cuts text that is longer than limit
+
+    Args:
+        text (str): Text to cut
+        limit (int): Maximum length of result
+
+    Returns:
+        str: Text or its beginning ending with "…"
+    """
+    return text if len(text) <= limit else text[:limit - 1] + '…'
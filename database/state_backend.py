@@ -0,0 +1,100 @@
+import importlib
+import json
+import threading
+import time
+
+from sqlalchemy.engine import Engine
+from telebot import Handler
+from telebot.handler_backends import HandlerBackend
+
+from metrics import timed_handler
+
+from .dbworker import (append_dialogue_handler, clear_dialogue_state, delete_expired_states, get_dialogue_chat_ids,
+                       pop_dialogue_state)
+
+
+def dump_handler(handler: Handler) -> list:
+    """Function that turns handler into compact JSON-friendly record.
+
+    Args:
+        handler (Handler): Next step handler
+
+    Returns:
+        list: Path of callback, its positional and keyword arguments
+    """
+    callback = handler.callback
+    return [f'{callback.__module__}:{callback.__qualname__}', list(handler.args), handler.kwargs]
+
+
+def load_handler(record: list) -> Handler:
+    """Function that restores handler from record made by dump_handler.
+
+    Args:
+        record (list): Path of callback, its positional and keyword arguments
+
+    Returns:
+        Handler: Next step handler
+    """
+    path, args, kwargs = record
+    module, qualname = path.split(':')
+    callback = importlib.import_module(module)
+    for name in qualname.split('.'):
+        callback = getattr(callback, name)
+    return Handler(timed_handler(callback), *args, **kwargs)
+
+
+class SQLiteHandlerBackend(HandlerBackend):
+    """Next step handler backend that keeps dialogues in database, so they survive restarts
+    and are shared by all workers. Dialogues that were not continued within ttl are dropped.
+
+    IDs of chats with unfinished dialogues are kept in memory and loaded on first use,
+    so messages of other chats do not query database. Updates of one chat are always
+    handled by the same worker, so this set stays correct with sharding.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        ttl (int): Amount of seconds after which unfinished dialogue expires
+        cleanup_interval (int): Amount of seconds between removals of expired dialogues
+    """
+
+    def __init__(self, engine: Engine, ttl: int = 3600, cleanup_interval: int = 600) -> None:
+        super().__init__()
+        self.engine = engine
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def _pending_ids(self) -> set:
+        # dialogues left before restart are loaded on first use, so creating backend does not query database
+        with self._lock:
+            if self._pending is None:
+                self._pending = get_dialogue_chat_ids(int(time.time()), self.engine)
+            return self._pending
+
+    def _cleanup(self, now: int) -> None:
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._last_cleanup = now
+            delete_expired_states(now, self.engine)
+
+    def register_handler(self, handler_group_id: int, handler: Handler) -> None:
+        now = int(time.time())
+        self._cleanup(now)
+        record = json.dumps(dump_handler(handler), ensure_ascii=False)
+        append_dialogue_handler(handler_group_id, record, now, now + self.ttl, self.engine)
+        self._pending_ids().add(handler_group_id)
+
+    def clear_handlers(self, handler_group_id: int) -> None:
+        self._pending_ids().discard(handler_group_id)
+        clear_dialogue_state(handler_group_id, self.engine)
+
+    def get_handlers(self, handler_group_id: int) -> list:
+        pending = self._pending_ids()
+        if handler_group_id not in pending:
+            return None
+        pending.discard(handler_group_id)
+        records = pop_dialogue_state(handler_group_id, int(time.time()), self.engine)
+        if records is None:
+            return None
+        return [load_handler(record) for record in json.loads(records)]
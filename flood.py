@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from telebot import TeleBot
+from telebot.types import Update
+
+from broadcast import TokenBucket
+from database.idempotency import acknowledge_updates
+from metrics import FLOOD_CONTROL, log_event
+
+
+def update_source(update: Update) -> tuple:
+    """Function that finds who sent update and what was asked.
+
+    Args:
+        update (Update): Update received from Telegram
+
+    Returns:
+        tuple: Kind of update, ID of user, ID of chat and text of message or data of button, None if update is not limited
+    """
+    if update.message is not None and update.message.from_user is not None:
+        message = update.message
+        return 'message', message.from_user.id, message.chat.id, message.text or ''
+    if update.callback_query is not None and update.callback_query.message is not None:
+        call = update.callback_query
+        return 'callback', call.from_user.id, call.message.chat.id, call.data or ''
+    return None
+
+
+class FloodControl:
+    """Limits how much work one user and one chat can cause before updates reach handlers and database.
+
+    Every user and every group chat has a token bucket. Commands and buttons that are repeated
+    by the same user in the same chat within coalesce_window are handled once. Group messages
+    over limit are deferred: handlers are skipped and only membership of sender is remembered,
+    all deferred members are passed to on_deferred together. Other updates over limit are dropped.
+
+    Args:
+        user_rate (float): Amount of updates per second handled for one user
+        user_burst (int): Amount of updates of one user handled at once
+        chat_rate (float): Amount of updates per second handled for one group chat
+        chat_burst (int): Amount of updates of one group chat handled at once
+        coalesce_window (float): Amount of seconds during which repeated command is handled once
+        exempt (Iterable[int], optional): IDs of users that are never limited
+        on_deferred (Callable[[list], None], optional): Function that receives pairs of chat ID and user ID of deferred messages
+        flush_interval (float): Amount of seconds between calls of on_deferred
+        capacity (int): Maximum amount of users and chats whose state is kept in memory
+    """
+
+    def __init__(self, user_rate: float = 1, user_burst: int = 5, chat_rate: float = 5, chat_burst: int = 20,
+                 coalesce_window: float = 2, exempt: Iterable[int] = (), on_deferred: Callable[[list], None] = None,
+                 flush_interval: float = 5, capacity: int = 10000) -> None:
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.coalesce_window = coalesce_window
+        self.exempt = set(exempt)
+        self.on_deferred = on_deferred
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self._buckets = OrderedDict()
+        self._recent = OrderedDict()
+        self._deferred = set()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _over_limit(self, key: tuple, rate: float, burst: int) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.capacity:
+            self._buckets.popitem(last=False)
+        return bucket.try_acquire() > 0
+
+    def _repeated(self, key: tuple, now: float) -> bool:
+        # keys are kept in order of first appearance, so expired ones are at the beginning
+        while self._recent and next(iter(self._recent.values())) <= now - self.coalesce_window:
+            self._recent.popitem(last=False)
+        if key in self._recent:
+            return True
+        self._recent[key] = now
+        while len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+        return False
+
+    def _admit(self, kind: str, user_id: int, chat_id: int, text: str, now: float) -> tuple:
+        if user_id in self.exempt:
+            return None
+        command = kind == 'callback' or text.startswith('/')
+        if command and self._repeated((kind, user_id, chat_id, text), now):
+            return 'coalesced', 'user'
+
+        in_group = chat_id != user_id
+        if self._over_limit(('user', user_id), self.user_rate, self.user_burst):
+            scope = 'user'
+        elif in_group and self._over_limit(('chat', chat_id), self.chat_rate, self.chat_burst):
+            scope = 'chat'
+        else:
+            return None
+
+        if in_group and not command:
+            self._deferred.add((chat_id, user_id))
+            return 'deferred', scope
+        return 'dropped', scope
+
+    def filter(self, updates: list) -> list:
+        """Function that drops, coalesces and defers updates over limits.
+
+        Args:
+            updates (list): Updates received from Telegram
+
+        Returns:
+            list: Updates that have to be passed to handlers
+        """
+        admitted = []
+        deferred = []
+        now = time.monotonic()
+        with self._lock:
+            for update in updates:
+                source = update_source(update)
+                limited = None if source is None else self._admit(*source, now)
+                if limited is None:
+                    admitted.append(update)
+                else:
+                    FLOOD_CONTROL.inc(action=limited[0], scope=limited[1])
+            if self._deferred and now - self._last_flush >= self.flush_interval:
+                deferred, self._deferred = list(self._deferred), set()
+                self._last_flush = now
+
+        if deferred and self.on_deferred is not None:
+            try:
+                self.on_deferred(deferred)
+            except Exception as e:
+                log_event('flood_flush_error', error=str(e), members=len(deferred))
+        return admitted
+
+
+def install_flood_control(bot: TeleBot, flood: FloodControl) -> None:
+    """Function that makes bot pass updates through flood control before handlers.
+    It has to be installed after install_update_dedup, so dropped updates cost no database queries.
+    Dropped updates are acknowledged, so Telegram does not send them again, and dropped buttons
+    are answered without text, so client stops waiting for answer.
+
+    Args:
+        bot (TeleBot): Bot that receives updates
+        flood (FloodControl): Flood control that filters updates
+    """
+    process_new_updates = bot.process_new_updates
+    if getattr(process_new_updates, '__flood__', False):
+        return
+
+    def process_limited_updates(updates: list) -> None:
+        acknowledge_updates(bot, updates)
+        admitted = flood.filter(updates)
+        admitted_ids = {update.update_id for update in admitted}
+        for update in updates:
+            if update.callback_query is not None and update.update_id not in admitted_ids:
+                try:
+                    bot.answer_callback_query(update.callback_query.id)
+                except Exception as e:
+                    log_event('flood_answer_error', error=str(e))
+        if admitted:
+            process_new_updates(admitted)
+
+    process_limited_updates.__flood__ = True
+    bot.process_new_updates = process_limited_updates
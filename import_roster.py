@@ -0,0 +1,53 @@
+import argparse
+import csv
+import json
+import os
+
+from dotenv import load_dotenv
+
+from database.dbworker import bulk_import_templates, bulk_upsert_users, create_db_engine, ensure_schema
+
+
+def read_roster(path: str) -> list:
+    """Function that reads roster from CSV file with "id,username,rr_name" header or from JSON list of objects.
+
+    Args:
+        path (str): Path to roster file
+
+    Returns:
+        list: Dicts with "id", "username" and "rr_name" keys
+    """
+    with open(path, encoding='utf-8') as file:
+        if path.lower().endswith('.json'):
+            return json.load(file)
+        return list(csv.DictReader(file))
+
+
+def read_templates(path: str) -> list:
+    """Function that reads templates from JSON list of strings or from text file with one template per line.
+
+    Args:
+        path (str): Path to templates file
+
+    Returns:
+        list: Templates in the same form as leader types them
+    """
+    with open(path, encoding='utf-8') as file:
+        if path.lower().endswith('.json'):
+            return json.load(file)
+        return [line.strip() for line in file if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load clan roster or templates into database in one transaction')
+    parser.add_argument('roster', nargs='?', help='CSV or JSON file with users')
+    parser.add_argument('--templates', help='JSON or text file with templates')
+    args = parser.parse_args()
+
+    load_dotenv("config.env")
+    engine = create_db_engine(os.environ.get('DATABASE_URL'))
+    ensure_schema(engine)
+    if args.roster:
+        print(f"{bulk_upsert_users(read_roster(args.roster), engine)} users imported")
+    if args.templates:
+        print(f"{bulk_import_templates(read_templates(args.templates), engine)} templates imported")
@@ -1,14 +1,149 @@
+import functools
 import os
 
 from dotenv import load_dotenv
-from telebot import TeleBot
-
-from database.dbworker import create_db_engine
 
 load_dotenv("config.env")
 TOKEN = os.environ.get('BOT_TOKEN')
 dev_id = os.environ.get('DEV_ID')
 leader_id = os.environ.get('LEADER_ID')
 secret_word = os.environ.get('AUTH_WORD')
-engine = create_db_engine()
-bot = TeleBot(TOKEN)
+bot_mode = os.environ.get('BOT_MODE', 'polling')
+metrics_port = int(os.environ.get('METRICS_PORT', 0))
+webhook_config = dict(
+    url=os.environ.get('WEBHOOK_URL', ''),
+    host=os.environ.get('WEBHOOK_HOST', '0.0.0.0'),
+    port=int(os.environ.get('WEBHOOK_PORT', 8443)),
+    path=os.environ.get('WEBHOOK_PATH', '/webhook'),
+    secret=os.environ.get('WEBHOOK_SECRET'),
+    workers=int(os.environ.get('WEBHOOK_WORKERS', 8)),
+    max_pending=int(os.environ.get('WEBHOOK_MAX_PENDING', 64)),
+)
+shard_config = dict(
+    workers=int(os.environ.get('SHARD_WORKERS', os.cpu_count() or 1)),
+    max_pending=int(os.environ.get('SHARD_MAX_PENDING', 64)),
+    poll_interval=float(os.environ.get('SHARD_POLL_INTERVAL', 2)),
+)
+broadcast_config = dict(
+    workers=int(os.environ.get('BROADCAST_WORKERS', 8)),
+    global_rate=float(os.environ.get('BROADCAST_GLOBAL_RATE', 30)),
+    chat_rate=float(os.environ.get('BROADCAST_CHAT_RATE', 1)),
+    max_retries=int(os.environ.get('BROADCAST_RETRIES', 3)),
+    max_flood_waits=int(os.environ.get('BROADCAST_FLOOD_WAITS', 10)),
+)
+
+# Objects below are built by their functions when they are first needed and then reused,
+# so every mode of app.py builds only what it uses and importing loader does not import them.
+
+
+@functools.lru_cache(maxsize=None)
+def get_engine():
+    """Function that returns engine of bot database."""
+    from database.dbworker import create_db_engine
+
+    return create_db_engine(os.environ.get('DATABASE_URL'), pool_size=int(os.environ.get('DB_POOL_SIZE', 10)))
+
+
+@functools.lru_cache(maxsize=None)
+def get_transport():
+    """Function that returns pool of connections to Bot API and makes telebot send requests through it."""
+    from telebot import apihelper
+
+    from transport import Transport, install_transport, parse_timeouts
+
+    # Allows to point bot at local Bot API server or at bench.fake_api
+    if os.environ.get('TELEGRAM_API_URL'):
+        apihelper.API_URL = os.environ.get('TELEGRAM_API_URL')
+    # Broadcast workers and handler threads send at the same time, so pool keeps connection for each of them
+    transport = Transport(
+        pool_size=int(os.environ.get('TELEGRAM_POOL_SIZE', broadcast_config['workers'] + 4)),
+        connect_timeout=float(os.environ.get('TELEGRAM_CONNECT_TIMEOUT', 5)),
+        read_timeout=float(os.environ.get('TELEGRAM_READ_TIMEOUT', 30)),
+        method_timeouts=parse_timeouts(os.environ['TELEGRAM_METHOD_TIMEOUTS']) if 'TELEGRAM_METHOD_TIMEOUTS' in os.environ else None,
+        retries=int(os.environ.get('TELEGRAM_RETRIES', 2)),
+    )
+    install_transport(transport)
+    return transport
+
+
+@functools.lru_cache(maxsize=None)
+def get_bot():
+    """Function that returns bot, its requests go through transport."""
+    from telebot import TeleBot
+
+    from database.state_backend import SQLiteHandlerBackend
+
+    get_transport()
+    return TeleBot(TOKEN, next_step_backend=SQLiteHandlerBackend(get_engine(), ttl=int(os.environ.get('DIALOGUE_TTL', 3600))))
+
+
+@functools.lru_cache(maxsize=None)
+def get_broadcaster():
+    """Function that returns engine that sends broadcasts within Telegram limits."""
+    from broadcast import Broadcaster
+
+    return Broadcaster(get_bot(), **broadcast_config)
+
+
+@functools.lru_cache(maxsize=None)
+def get_dedup():
+    """Function that returns store of processed updates and sends."""
+    from database.idempotency import IdempotencyStore
+
+    return IdempotencyStore(get_engine(), capacity=int(os.environ.get('DEDUP_CAPACITY', 10000)),
+                            ttl=int(os.environ.get('DEDUP_TTL', 86400)))
+
+
+@functools.lru_cache(maxsize=None)
+def get_broadcast_queue():
+    """Function that returns persistent queue of broadcasts."""
+    from broadcast import BroadcastQueue
+
+    return BroadcastQueue(get_broadcaster(), get_engine(), batch_size=int(os.environ.get('BROADCAST_BATCH', 100)),
+                          dedup=get_dedup())
+
+
+@functools.lru_cache(maxsize=None)
+def get_scheduler():
+    """Function that returns scheduler of template broadcasts."""
+    from scheduler import Scheduler
+
+    return Scheduler(get_engine())
+
+
+@functools.lru_cache(maxsize=None)
+def get_authenticator():
+    """Function that returns authenticator of new members."""
+    from auth import AttemptThrottle, Authenticator
+
+    return Authenticator(
+        get_engine(),
+        secret_word,
+        AttemptThrottle(
+            user_limit=int(os.environ.get('AUTH_USER_LIMIT', 5)),
+            user_window=int(os.environ.get('AUTH_USER_WINDOW', 600)),
+            global_limit=int(os.environ.get('AUTH_GLOBAL_LIMIT', 50)),
+            global_window=int(os.environ.get('AUTH_GLOBAL_WINDOW', 60)),
+            lockout=int(os.environ.get('AUTH_LOCKOUT', 900)),
+        ),
+        invite_ttl=int(os.environ.get('INVITE_TTL', 86400)),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_flood():
+    """Function that returns flood control of incoming updates."""
+    from database.dbworker import add_chat_members
+    from flood import FloodControl
+
+    engine = get_engine()
+    return FloodControl(
+        user_rate=float(os.environ.get('FLOOD_USER_RATE', 1)),
+        user_burst=int(os.environ.get('FLOOD_USER_BURST', 5)),
+        chat_rate=float(os.environ.get('FLOOD_CHAT_RATE', 5)),
+        chat_burst=int(os.environ.get('FLOOD_CHAT_BURST', 20)),
+        coalesce_window=float(os.environ.get('FLOOD_COALESCE_WINDOW', 2)),
+        # leaders are never limited, so broadcasts and dialogues with them are not slowed down
+        exempt=[int(user_id) for user_id in (dev_id, leader_id) if user_id],
+        on_deferred=lambda members: add_chat_members(members, engine),
+    )
@@ -0,0 +1,7 @@
+from .registry import REGISTRY, Counter, Gauge, Histogram, Registry
+from .log import log_event, setup_logging
+from .instruments import (API_CALLS, API_CONNECTIONS, API_ERRORS, API_FLOOD, API_RETRIES, AUTH_ATTEMPTS,
+                          BROADCAST_DELIVERIES, BROADCAST_JOBS, BROADCAST_PENDING, DB_CACHE, DB_ERRORS, DB_LATENCY,
+                          DUPLICATES, FLOOD_CONTROL, HANDLER_ERRORS, HANDLER_LATENCY, SCHEDULE_RUNS, STARTUP_SECONDS, WEBHOOK_ERRORS,
+                          import_timed, install_api_metrics, instrument_handlers, start_metrics_server, timed_db,
+                          timed_handler)
@@ -0,0 +1,194 @@
+import functools
+import importlib
+import inspect
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import TYPE_CHECKING, Callable
+
+from .log import log_event
+from .registry import REGISTRY
+
+if TYPE_CHECKING:
+    from telebot import TeleBot
+
+HANDLER_LATENCY = REGISTRY.histogram('bot_handler_seconds', 'Time spent in message handlers')
+HANDLER_ERRORS = REGISTRY.counter('bot_handler_errors_total', 'Exceptions raised by message handlers')
+DB_LATENCY = REGISTRY.histogram('bot_db_seconds', 'Time spent in dbworker functions')
+DB_ERRORS = REGISTRY.counter('bot_db_errors_total', 'Failed database queries')
+DB_CACHE = REGISTRY.counter('bot_db_cache_total', 'Reads and invalidations of dbworker cache by table and result')
+API_CALLS = REGISTRY.counter('bot_telegram_requests_total', 'Requests to Telegram Bot API')
+API_ERRORS = REGISTRY.counter('bot_telegram_errors_total', 'Failed requests to Telegram Bot API')
+API_FLOOD = REGISTRY.counter('bot_telegram_flood_total', 'Requests answered with 429 Too Many Requests')
+API_LATENCY = REGISTRY.histogram('bot_telegram_seconds', 'Duration of requests to Telegram Bot API')
+API_CONNECTIONS = REGISTRY.counter('bot_telegram_connections_total', 'Connections opened to Telegram Bot API')
+API_RETRIES = REGISTRY.counter('bot_telegram_retries_total', 'Requests to Telegram Bot API retried after network error')
+BROADCAST_DELIVERIES = REGISTRY.counter('bot_broadcast_deliveries_total', 'Finished broadcast deliveries by status')
+BROADCAST_JOBS = REGISTRY.counter('bot_broadcast_jobs_total', 'Broadcast jobs by state change')
+BROADCAST_PENDING = REGISTRY.gauge('bot_broadcast_pending', 'Broadcast messages that are not sent yet')
+DUPLICATES = REGISTRY.counter('bot_duplicates_suppressed_total', 'Duplicated updates and sends that were dropped')
+STARTUP_SECONDS = REGISTRY.gauge('bot_startup_seconds', 'Time spent on startup by stage or imported module')
+SCHEDULE_RUNS = REGISTRY.counter('bot_schedule_runs_total', 'Runs of scheduled broadcasts by state')
+AUTH_ATTEMPTS = REGISTRY.counter('bot_auth_attempts_total', 'Authentication attempts by result')
+FLOOD_CONTROL = REGISTRY.counter('bot_flood_control_total', 'Updates dropped, coalesced or deferred by flood control')
+WEBHOOK_ERRORS = REGISTRY.counter('bot_webhook_errors_total', 'Webhook updates that could not be read or processed')
+
+
+def timed_db(function: Callable) -> Callable:
+    """Decorator that records duration of dbworker function.
+
+    Args:
+        function (Callable): dbworker function, generators are timed until they are exhausted
+
+    Returns:
+        Callable: Wrapped function
+    """
+    name = function.__name__
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                yield from function(*args, **kwargs)
+            finally:
+                DB_LATENCY.observe(time.perf_counter() - started, function=name)
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - started, function=name)
+    return wrapper
+
+
+def timed_handler(function: Callable) -> Callable:
+    """Decorator that records duration and errors of bot handler and writes structured log.
+
+    Args:
+        function (Callable): Handler that receives message or callback query first
+
+    Returns:
+        Callable: Wrapped handler
+    """
+    if getattr(function, '__timed__', False):
+        return function
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(update, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(update, *args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            log_event('handler_error', logging.ERROR, handler=name, exc_info=True)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            HANDLER_LATENCY.observe(elapsed, handler=name)
+            user = getattr(update, 'from_user', None)
+            chat = getattr(update, 'chat', None)
+            log_event('handler', logging.DEBUG, handler=name, user_id=getattr(user, 'id', None),
+                      chat_id=getattr(chat, 'id', None), ms=round(elapsed * 1000, 2))
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def instrument_handlers(bot: 'TeleBot') -> None:
+    """Function that wraps every registered handler of bot with timing.
+
+    Args:
+        bot (TeleBot): Bot with registered handlers
+    """
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            handler['function'] = timed_handler(handler['function'])
+
+
+def install_api_metrics() -> None:
+    """Function that counts requests to Telegram Bot API per method through CUSTOM_REQUEST_SENDER of telebot."""
+    from telebot import apihelper
+
+    sender = apihelper.CUSTOM_REQUEST_SENDER
+    if getattr(sender, '__timed__', False):
+        return
+
+    def send(method: str, url: str, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        API_CALLS.inc(method=api_method)
+        started = time.perf_counter()
+        try:
+            if sender is not None:
+                result = sender(method, url, **kwargs)
+            else:
+                result = apihelper._get_req_session().request(method, url, **kwargs)
+        except Exception as e:
+            API_ERRORS.inc(method=api_method, code='network')
+            log_event('telegram_error', logging.WARNING, method=api_method, error=str(e))
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, method=api_method)
+        if result.status_code == 429:
+            API_FLOOD.inc(method=api_method)
+        if result.status_code != 200:
+            API_ERRORS.inc(method=api_method, code=result.status_code)
+        return result
+
+    send.__timed__ = True
+    apihelper.CUSTOM_REQUEST_SENDER = send
+
+
+def import_timed(name: str) -> ModuleType:
+    """Function that imports module and records how long it took.
+
+    Args:
+        name (str): Full name of module
+
+    Returns:
+        ModuleType: Imported module
+    """
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    seconds = time.perf_counter() - started
+    STARTUP_SECONDS.set(seconds, module=name)
+    log_event('module_imported', logging.DEBUG, module=name, seconds=round(seconds, 4))
+    return module
+
+
+def start_metrics_server(host: str = '0.0.0.0', port: int = 9100) -> 'ThreadingHTTPServer':
+    """Function that serves metrics in Prometheus text format on "/metrics" in background thread.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on
+
+    Returns:
+        ThreadingHTTPServer: Running server
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
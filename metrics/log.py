@@ -0,0 +1,41 @@
+import json
+import logging
+
+logger = logging.getLogger('samus')
+
+
+class JSONFormatter(logging.Formatter):
+    """Formatter that writes every record as one JSON line with its structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {'ts': round(record.created, 3), 'level': record.levelname, 'event': record.getMessage()}
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = 'INFO') -> None:
+    """Function that sends structured logs of bot to stderr.
+
+    Args:
+        level (str): Minimal level of records
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JSONFormatter())
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, exc_info: bool = False, **fields) -> None:
+    """Function that writes structured log record.
+
+    Args:
+        event (str): Name of event
+        level (int): Level of record
+        exc_info (bool): Whether traceback of current exception is added
+        **fields: Fields of record
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
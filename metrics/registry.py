@@ -0,0 +1,175 @@
+import bisect
+import logging
+import threading
+from typing import Callable
+
+from .log import log_event
+
+# Buckets in seconds, from fast SQLite queries to slow broadcasts
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: object) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """Base class of metrics that are exposed in Prometheus text format.
+
+    Args:
+        name (str): Name of metric
+        description (str): Help text of metric
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value in self.samples():
+            lines.append(f'{name}{_format_labels(key)} {value}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Metric that only grows."""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_labels_key(labels), 0)
+
+
+class Gauge(Metric):
+    """Metric that can go up and down, or is computed by function when metrics are collected.
+
+    Args:
+        name (str): Name of metric
+        description (str): Help text of metric
+        function (Callable, optional): Function that returns current value
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, function: Callable = None) -> None:
+        super().__init__(name, description)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_labels_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list:
+        if self.function is not None:
+            try:
+                self.set(self.function())
+            except Exception as e:
+                log_event('gauge_error', logging.ERROR, metric=self.name, error=str(e))
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Metric that counts observed values in buckets.
+
+    Args:
+        name (str): Name of metric
+        description (str): Help text of metric
+        buckets (tuple): Upper bounds of buckets
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, amount in zip(self.buckets + ('+Inf',), counts):
+                cumulative += amount
+                lines.append(f'{self.name}_bucket{_format_labels(key, (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return '\n'.join(lines)
+
+
+class Registry:
+    """Collection of metrics of process."""
+
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str, function: Callable = None) -> Gauge:
+        gauge = self._register(Gauge(name, description, function))
+        # gauge of object that was built again reports the new object, not the one registered first
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def render(self) -> str:
+        """Function that renders all metrics in Prometheus text format.
+
+        Returns:
+            str: Metrics
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
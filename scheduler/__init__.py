@@ -0,0 +1,2 @@
+from .recurrence import Cron, next_run, parse_recurrence
+from .timer import Scheduler
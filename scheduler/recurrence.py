@@ -0,0 +1,127 @@
+import re
+from datetime import datetime, timedelta
+
+# (min, max) of every cron field: minute, hour, day of month, month, day of week (0 is sunday)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+_TIME_RE = re.compile(r'^(\d{1,2}):(\d{2})$')
+_DATETIME_FORMAT = '%d.%m.%Y %H:%M'
+
+
+def _parse_field(field: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f'invalid step in "{field}"')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end:
+            raise ValueError(f'"{field}" is out of range {low}-{high}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class Cron:
+    """Parsed cron expression of five fields: minute, hour, day of month, month and day of week.
+
+    Args:
+        expression (str): Cron expression, for example "0 18 * * 1-5"
+    """
+
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError('cron expression must have 5 fields')
+        self.expression = ' '.join(fields)
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_days = day.day in self.days
+        in_weekdays = (day.isoweekday() % 7) in self.weekdays
+        # same as cron: if both day fields are restricted, either of them matches
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Function that finds first moment after given one that matches expression.
+        Whole days and hours that can not match are skipped instead of checking every minute.
+
+        Args:
+            moment (datetime): Moment to search from
+
+        Returns:
+            datetime: Next matching moment
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            minute = next((value for value in sorted(self.minutes) if value >= candidate.minute), None)
+            if minute is None:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            return candidate.replace(minute=minute)
+        raise ValueError(f'"{self.expression}" never matches')
+
+
+def parse_recurrence(text: str, now: datetime) -> str:
+    """Function that converts time typed by leader into stored recurrence.
+
+    Supported forms: "20.10.2026 18:00" - once, "18:00" - every day, "cron 0 18 * * 1-5" - cron expression.
+
+    Args:
+        text (str): Time typed by leader
+        now (datetime): Current moment, one-time broadcasts in the past are rejected
+
+    Raises:
+        ValueError: If text can not be parsed
+
+    Returns:
+        str: Recurrence, that is understood by next_run
+    """
+    text = ' '.join(text.split())
+    if text.lower().startswith('cron '):
+        return 'cron ' + Cron(text[5:]).expression
+    match = _TIME_RE.match(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        return 'cron ' + Cron(f'{minute} {hour} * * *').expression
+    moment = datetime.strptime(text, _DATETIME_FORMAT)
+    if moment <= now:
+        raise ValueError('moment is in the past')
+    return 'once ' + moment.isoformat(timespec='minutes')
+
+
+def next_run(recurrence: str, after: datetime) -> datetime:
+    """Function that computes next moment of broadcast.
+
+    Args:
+        recurrence (str): Recurrence made by parse_recurrence
+        after (datetime): Moment of previous run or current moment
+
+    Returns:
+        datetime: Next moment or None if broadcast should not run again
+    """
+    kind, value = recurrence.split(' ', 1)
+    if kind == 'once':
+        moment = datetime.fromisoformat(value)
+        return moment if moment > after else None
+    return Cron(value).next_after(after)
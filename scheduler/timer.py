@@ -0,0 +1,115 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy.engine import Engine
+
+from database.dbworker import advance_schedule, get_schedule, get_schedules
+from database.models import BroadcastSchedule
+from metrics import SCHEDULE_RUNS, log_event
+
+from .recurrence import next_run
+
+
+class Scheduler:
+    """Timer that runs scheduled broadcasts stored in database.
+
+    Runs are kept in a heap ordered by time, background thread sleeps until the earliest one
+    and is woken up when new schedule is added. Runs that were missed while bot was stopped
+    are executed once right after start, then schedule continues from current time.
+
+    Args:
+        engine (Engine): An _engine.Engine object is instantiated publicly using the ~sqlalchemy.create_engine function.
+        on_fire (Callable): Function that is called with BroadcastSchedule entity when it is due
+        late_after (float): Amount of seconds after which run is reported as missed
+        reload_interval (float, optional): Amount of seconds between reads of schedules added by other processes
+    """
+
+    def __init__(self, engine: Engine, on_fire: Callable = None, late_after: float = 60,
+                 reload_interval: float = None) -> None:
+        self.engine = engine
+        self.on_fire = on_fire
+        self.late_after = timedelta(seconds=late_after)
+        self.reload_interval = reload_interval
+        self._heap = []
+        self._planned = set()
+        self._reloaded = 0
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def start(self) -> None:
+        """Function that loads active schedules and starts background thread."""
+        if self._thread is not None:
+            return
+        self._load()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def add(self, schedule_id: int, run_at: datetime) -> None:
+        """Function that plans run of schedule and wakes up timer if it is the earliest one.
+
+        Args:
+            schedule_id (int): ID of schedule
+            run_at (datetime): Local time of run
+        """
+        with self._changed:
+            if (run_at, schedule_id) in self._planned:
+                return
+            self._planned.add((run_at, schedule_id))
+            heapq.heappush(self._heap, (run_at, schedule_id))
+            self._changed.notify()
+
+    def _load(self) -> None:
+        self._reloaded = time.monotonic()
+        for schedule in get_schedules(self.engine):
+            self.add(schedule.id, schedule.next_run_at)
+
+    def _next_due(self) -> tuple:
+        with self._changed:
+            while True:
+                delay = None
+                if self._heap:
+                    delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                    if delay <= 0:
+                        self._planned.discard(self._heap[0])
+                        return heapq.heappop(self._heap)
+                if self.reload_interval is not None:
+                    reload_in = self._reloaded + self.reload_interval - time.monotonic()
+                    if reload_in <= 0:
+                        return None
+                    delay = reload_in if delay is None else min(delay, reload_in)
+                self._changed.wait(delay)
+
+    def _loop(self) -> None:
+        while True:
+            due = self._next_due()
+            if due is None:
+                self._load()
+                continue
+            due_at, schedule_id = due
+            try:
+                self._fire(schedule_id, due_at)
+            except Exception as e:
+                log_event('schedule_error', schedule_id=schedule_id, error=str(e))
+
+    def _fire(self, schedule_id: int, due_at: datetime) -> None:
+        schedule: BroadcastSchedule = get_schedule(schedule_id, self.engine)
+        # entry is stale if schedule was cancelled or already moved by another run
+        if schedule is None or not schedule.active or schedule.next_run_at != due_at:
+            return
+
+        now = datetime.now()
+        following = next_run(schedule.recurrence, max(due_at, now))
+        if not advance_schedule(schedule_id, due_at, following, self.engine):
+            return
+        if following is not None:
+            self.add(schedule_id, following)
+
+        late = now - due_at > self.late_after
+        SCHEDULE_RUNS.inc(state='late' if late else 'on_time')
+        log_event('schedule_fired', schedule_id=schedule_id, due_at=due_at.isoformat(),
+                  late_seconds=round((now - due_at).total_seconds(), 1), next_run_at=following and following.isoformat())
+        if self.on_fire is not None:
+            self.on_fire(schedule)
@@ -0,0 +1,237 @@
+import multiprocessing
+import queue
+import time
+from typing import Callable
+
+from telebot import TeleBot, apihelper
+from telebot.types import Update
+
+from broadcast import SharedTokenBucket
+from database.idempotency import IdempotencyStore
+from metrics import DUPLICATES, log_event
+
+# While updates are pending Telegram answers getUpdates at once, so receiver waits longer the longer nothing new comes
+PENDING_BACKOFF_MIN = 0.05
+PENDING_BACKOFF_MAX = 1.0
+
+
+def update_chat_id(update: dict) -> int:
+    """Function that finds chat which update belongs to.
+
+    Args:
+        update (dict): Update as it was received from Telegram
+
+    Returns:
+        int: ID of chat, ID of user if update has no chat, or ID of update if it has neither
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        if 'chat' in value:
+            return value['chat']['id']
+        if isinstance(value.get('message'), dict) and 'chat' in value['message']:
+            return value['message']['chat']['id']
+        if 'from' in value:
+            return value['from']['id']
+    return update['update_id']
+
+
+def run_worker(index: int, updates: multiprocessing.Queue, done: multiprocessing.Queue, bucket: SharedTokenBucket,
+               poll_interval: float, metrics_port: int = 0) -> None:
+    """Function that runs handlers for updates of one shard. Every update is processed in order
+    of receiving, so step handlers of one chat are never run concurrently.
+    Worker also drains broadcasts and runs schedules together with other workers.
+
+    Args:
+        index (int): Number of worker
+        updates (multiprocessing.Queue): Queue of raw updates routed to this worker, None stops worker
+        done (multiprocessing.Queue): Queue that receives IDs of processed updates, so receiver can acknowledge them
+        bucket (SharedTokenBucket): Global limit of sends shared by all workers
+        poll_interval (float): Amount of seconds between checks for broadcasts and schedules of other workers
+        metrics_port (int): Port of metrics endpoint of this worker, 0 disables it
+    """
+    import commands
+    from database import dbworker
+    from flood import install_flood_control
+    from loader import get_authenticator, get_bot, get_broadcast_queue, get_broadcaster, get_flood, get_scheduler
+    from metrics import install_api_metrics, setup_logging, start_metrics_server
+
+    setup_logging()
+    bot = get_bot()
+    authenticator = get_authenticator()
+    broadcast_queue = get_broadcast_queue()
+    broadcaster = get_broadcaster()
+    flood = get_flood()
+    scheduler = get_scheduler()
+    commands.register(bot)
+    install_api_metrics()
+    # duplicates are dropped by receiver, that marks update as processed only after worker reported it
+    install_flood_control(bot, flood)
+    authenticator.load()
+    if metrics_port:
+        start_metrics_server(port=metrics_port)
+    # other workers write to the same database and can not invalidate cache of this one
+    dbworker.CACHE_TTL = poll_interval
+    broadcaster.limiter.global_bucket = bucket
+    broadcast_queue.owner = f'shard{index}'
+    broadcast_queue.poll_interval = poll_interval
+    scheduler.reload_interval = poll_interval
+    bot.threaded = False
+    broadcast_queue.start()
+    scheduler.start()
+    log_event('worker_started', shard=index)
+
+    while True:
+        raw = updates.get()
+        if raw is None:
+            return
+        try:
+            bot.process_new_updates([Update.de_json(raw)])
+        except Exception as e:
+            log_event('worker_error', shard=index, update_id=raw.get('update_id'), error=str(e))
+        done.put(raw['update_id'])
+
+
+class ShardedReceiver:
+    """Receives updates by long polling and routes them to worker processes by chat ID.
+
+    Workers share database and global limit of sends. When queue of worker is full, receiver waits,
+    so updates are not piled up in memory. Update is acknowledged to Telegram only after worker
+    reported that it was processed, so updates of worker that died are routed again to its new process.
+    Telegram returns unacknowledged updates again, receiver skips those that are already routed.
+    Duplicates are dropped by receiver too: update is marked in dedup store only after it was processed,
+    so updates routed again are not dropped.
+
+    Args:
+        bot (TeleBot): Bot that receives updates, its handlers are run by workers
+        global_rate (float): Amount of messages per second that all workers can send together
+        workers (int): Amount of worker processes
+        max_pending (int): Maximum amount of updates waiting for one worker
+        poll_interval (float): Amount of seconds between checks for broadcasts and schedules of other workers
+        timeout (int): Timeout of long polling in seconds
+        metrics_port (int): Port of metrics endpoint of receiver, workers use following ports. 0 disables it
+        dedup (IdempotencyStore, optional): Store of processed updates
+        target (Callable): Function that is run by every worker process, see run_worker
+    """
+
+    def __init__(self, bot: TeleBot, global_rate: float = 30, workers: int = 4, max_pending: int = 64,
+                 poll_interval: float = 2, timeout: int = 20, metrics_port: int = 0,
+                 dedup: IdempotencyStore = None, target: Callable = run_worker) -> None:
+        self.bot = bot
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.metrics_port = metrics_port
+        self.dedup = dedup
+        self.target = target
+        self.context = multiprocessing.get_context('spawn')
+        self.global_bucket = SharedTokenBucket(global_rate, max(1, int(global_rate)), self.context)
+        self.done = self.context.Queue()
+        self.queues = [None] * workers
+        self.processes = [None] * workers
+        # routed updates that workers have not processed yet by update ID, in order of receiving
+        self.pending = {}
+        self.last_update_id = None
+        self._backoff = PENDING_BACKOFF_MIN
+
+    def start(self) -> None:
+        """Function that starts worker processes."""
+        for index in range(self.workers):
+            self._start(index)
+        self.bot.remove_webhook()
+
+    def stop(self) -> None:
+        """Function that asks worker processes to stop after updates they already received."""
+        for updates_queue in self.queues:
+            updates_queue.put(None)
+
+    def _start(self, index: int) -> None:
+        # queue of dead worker can be left locked, so every process gets new one
+        self.queues[index] = self.context.Queue(maxsize=self.max_pending)
+        self.processes[index] = self.context.Process(
+            target=self.target, name=f'shard{index}', daemon=True,
+            args=(index, self.queues[index], self.done, self.global_bucket, self.poll_interval,
+                  self.metrics_port and self.metrics_port + 1 + index),
+        )
+        self.processes[index].start()
+
+    def _restart(self, index: int) -> None:
+        log_event('worker_restarted', shard=index, exitcode=self.processes[index].exitcode)
+        self._start(index)
+        for worker, raw in list(self.pending.values()):
+            if worker == index:
+                self._route(index, raw)
+
+    def _route(self, index: int, raw: dict) -> None:
+        while True:
+            try:
+                self.queues[index].put(raw, timeout=1)
+                return
+            except queue.Full:
+                if not self.processes[index].is_alive():
+                    # new process receives all pending updates of worker, this one included
+                    self._restart(index)
+                    return
+
+    def _collect_done(self, wait: float) -> None:
+        processed = []
+        deadline = time.monotonic() + wait
+        try:
+            while self.pending:
+                remaining = deadline - time.monotonic()
+                update_id = self.done.get(timeout=remaining) if remaining > 0 else self.done.get_nowait()
+                self.pending.pop(update_id, None)
+                processed.append(update_id)
+        except queue.Empty:
+            pass
+        if processed and self.dedup is not None:
+            self.dedup.claim_many([f'update:{update_id}' for update_id in processed])
+
+    def poll(self) -> None:
+        """Function that restarts dead workers, waits for pending updates and routes new ones."""
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                self._restart(index)
+        self._collect_done(self._backoff if self.pending else 0)
+        if self.pending:
+            offset = min(self.pending)
+        else:
+            offset = None if self.last_update_id is None else self.last_update_id + 1
+        try:
+            updates = apihelper.get_updates(self.bot.token, offset=offset, timeout=self.timeout,
+                                            long_polling_timeout=self.timeout)
+        except Exception as e:
+            log_event('receiver_error', error=str(e))
+            time.sleep(1)
+            return
+
+        fresh = [raw for raw in updates if self.last_update_id is None or raw['update_id'] > self.last_update_id]
+        self._backoff = PENDING_BACKOFF_MIN if fresh else min(self._backoff * 2, PENDING_BACKOFF_MAX)
+        if not fresh:
+            return
+        self.last_update_id = max(raw['update_id'] for raw in fresh)
+        seen = self.dedup.seen_many([f'update:{raw["update_id"]}' for raw in fresh]) if self.dedup is not None else set()
+        for raw in fresh:
+            if f'update:{raw["update_id"]}' in seen:
+                DUPLICATES.inc(kind='update')
+                continue
+            index = update_chat_id(raw) % self.workers
+            self.pending[raw['update_id']] = index, raw
+            self._route(index, raw)
+
+
+def run_sharded(bot: TeleBot, **kwargs) -> None:
+    """Function that receives updates and routes them to worker processes until receiver is stopped.
+
+    Args:
+        bot (TeleBot): Bot that receives updates, its handlers are run by workers
+        **kwargs: Arguments of ShardedReceiver
+    """
+    receiver = ShardedReceiver(bot, **kwargs)
+    receiver.start()
+    try:
+        while True:
+            receiver.poll()
+    finally:
+        receiver.stop()
@@ -0,0 +1,2 @@
+from .compiled import CompiledTemplate, compile_template, compile_legacy, split_category, MARKERS, PREVIEW_LABELS
+from .mentions import build_mention_messages, mention
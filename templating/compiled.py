@@ -0,0 +1,140 @@
+import json
+import re
+
+# Words that leader types in template and names of slots they are replaced with
+MARKERS = {
+    'имя_игрока': 'rr_name',
+    'ник_игрока': 'username',
+    'дата_сегодня': 'date',
+}
+# Words that are shown instead of slots when leader looks through templates
+PREVIEW_LABELS = {
+    'rr_name': 'имя_соклановца',
+    'username': 'ник_соклановца',
+    'date': 'дата_сегодня',
+}
+
+_MARKER_RE = re.compile('|'.join(re.escape(marker) for marker in MARKERS))
+_LEGACY_SLOT_RE = re.compile(r'\{(' + '|'.join(PREVIEW_LABELS) + r')\}')
+# Category of template is the first word of template typed with "#", for example "#сбор"
+_CATEGORY_RE = re.compile(r'#(\w+)\s+')
+
+
+class CompiledTemplate:
+    """Template that was parsed once into literal chunks and placeholder slots.
+
+    Rendering does not parse template again: literal chunks are escaped once into format string,
+    so every recipient costs one format_map call and braces typed by leader are sent as is.
+
+    Args:
+        parts (list): Literal strings and names of slots in order of appearance
+    """
+
+    __slots__ = ('parts', 'slots', '_format', '_preview')
+
+    def __init__(self, parts: list) -> None:
+        self.parts = tuple(parts)
+        self.slots = frozenset(part[1] for part in self.parts if isinstance(part, tuple))
+        self._format = ''.join(
+            '{' + part[1] + '}' if isinstance(part, tuple) else part.replace('{', '{{').replace('}', '}}')
+            for part in self.parts
+        )
+        self._preview = ''.join(
+            PREVIEW_LABELS[part[1]] if isinstance(part, tuple) else part for part in self.parts
+        )
+
+    def render(self, **values) -> str:
+        """Function that substitutes values into slots.
+
+        Args:
+            **values: Values of slots, missing ones are replaced with empty string
+
+        Returns:
+            str: Rendered message
+        """
+        if not self.slots:
+            return self._format.format()
+        return self._format.format_map({slot: values.get(slot) or '' for slot in self.slots})
+
+    def preview(self) -> str:
+        """Function that shows template to leader with labels instead of slots.
+
+        Returns:
+            str: Template with labels
+        """
+        return self._preview
+
+    def to_json(self) -> str:
+        """Function that serializes template to store it in database.
+
+        Returns:
+            str: JSON list where slots are stored as objects
+        """
+        return json.dumps(
+            [{'slot': part[1]} if isinstance(part, tuple) else part for part in self.parts],
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> 'CompiledTemplate':
+        """Function that restores template stored in database.
+
+        Args:
+            data (str): JSON list produced by to_json
+
+        Returns:
+            CompiledTemplate: Restored template
+        """
+        return cls([('slot', part['slot']) if isinstance(part, dict) else part for part in json.loads(data)])
+
+
+def _split(text: str, pattern: re.Pattern, slot_of) -> CompiledTemplate:
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        if match.start() > position:
+            parts.append(text[position:match.start()])
+        parts.append(('slot', slot_of(match)))
+        position = match.end()
+    if position < len(text):
+        parts.append(text[position:])
+    return CompiledTemplate(parts)
+
+
+def compile_template(text: str) -> CompiledTemplate:
+    """Function that compiles template typed by leader, where slots are marked with words from MARKERS.
+
+    Args:
+        text (str): Template typed by leader
+
+    Returns:
+        CompiledTemplate: Compiled template
+    """
+    return _split(text, _MARKER_RE, lambda match: MARKERS[match.group(0)])
+
+
+def compile_legacy(template: str) -> CompiledTemplate:
+    """Function that compiles template stored before compiled form existed, where slots look like "{rr_name}".
+
+    Args:
+        template (str): Template stored in database
+
+    Returns:
+        CompiledTemplate: Compiled template
+    """
+    return _split(template, _LEGACY_SLOT_RE, lambda match: match.group(1))
+
+
+def split_category(text: str) -> tuple:
+    """Function that separates category from template typed by leader.
+
+    Args:
+        text (str): Template typed by leader, that can start with "#category"
+
+    Returns:
+        tuple: Category in lower case or None, and text of template without category
+    """
+    match = _CATEGORY_RE.match(text)
+    if match is None or match.end() == len(text):
+        return None, text
+    return match.group(1).lower(), text[match.end():]
@@ -0,0 +1,58 @@
+from html import escape
+from typing import Iterable, Iterator
+
+# Telegram does not accept messages longer than this
+MESSAGE_LIMIT = 4096
+# Telegram notifies only part of mentioned users when there are too many mentions in one message
+MENTIONS_PER_MESSAGE = 50
+
+
+def mention(user_id: int, username: str, name: str) -> str:
+    """Function that builds HTML mention of user.
+
+    Args:
+        user_id (int): ID of user thah defined by Telegram
+        username (str): username of user, could be None
+        name (str): Name that is shown for users without username
+
+    Returns:
+        str: "@username" or text mention linked to user ID
+    """
+    if username:
+        return '@' + escape(username)
+    return f'<a href="tg://user?id={int(user_id)}">{escape(name)}</a>'
+
+
+def build_mention_messages(users: Iterable[tuple], suffix: str = '', limit: int = MESSAGE_LIMIT,
+                           per_message: int = MENTIONS_PER_MESSAGE) -> Iterator[str]:
+    """Function that splits mentions of users into messages that fit Telegram limits.
+    Messages are built while users are read, so roster is never held in memory at once.
+
+    Args:
+        users (Iterable[tuple]): User ID, username and name of every user
+        suffix (str): Text that is added to the last message, it is escaped here
+        limit (int): Maximum length of one message
+        per_message (int): Maximum amount of mentions in one message
+
+    Yields:
+        str: HTML message
+    """
+    suffix = escape(suffix)
+    chunk = []
+    length = 0
+    for user_id, username, name in users:
+        text = mention(user_id, username, name)
+        if chunk and (length + 1 + len(text) > limit or len(chunk) >= per_message):
+            yield ' '.join(chunk)
+            chunk = []
+            length = 0
+        length += len(text) + (1 if chunk else 0)
+        chunk.append(text)
+
+    last = ' '.join(chunk)
+    if len(last) + len(suffix) > limit:
+        yield last
+        last = ''
+    last += suffix
+    if last.strip():
+        yield last
@@ -0,0 +1,52 @@
+import importlib
+import os
+import sys
+
+import pytest
+from telebot import TeleBot, apihelper
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_api import FakeBotAPI
+from database.dbworker import create_db_engine, init_db
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db_engine(f'sqlite+pysqlite:///{tmp_path}/test.db', pool_size=2)
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def fake_api():
+    api = FakeBotAPI().start()
+    api_url, sender = apihelper.API_URL, apihelper.CUSTOM_REQUEST_SENDER
+    apihelper.API_URL, apihelper.CUSTOM_REQUEST_SENDER = api.api_url, None
+    yield api
+    apihelper.API_URL, apihelper.CUSTOM_REQUEST_SENDER = api_url, sender
+    api.stop()
+
+
+@pytest.fixture
+def bot(fake_api):
+    return TeleBot('1:test', threaded=False)
+
+
+@pytest.fixture
+def handlers(fake_api, engine, monkeypatch):
+    """Module with handlers of synchronous bot, working with test database and fake Bot API."""
+    for name, value in {'BOT_TOKEN': '1:test', 'DEV_ID': '1', 'LEADER_ID': '1', 'AUTH_WORD': 'test'}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv('DATABASE_URL', str(engine.url))
+    module = importlib.import_module('commands.start')
+    monkeypatch.setattr(module, 'engine', engine)
+    # loader sends requests through its pooled transport, fake_api fixture restores sender afterwards
+    monkeypatch.setattr('telebot.apihelper.CUSTOM_REQUEST_SENDER', None)
+    return module
+
+
+def retrieve_updates(bot: TeleBot) -> None:
+    """Function that makes one round of polling, the same that infinity_polling makes in a loop."""
+    bot._TeleBot__retrieve_updates(timeout=1, long_polling_timeout=0.01)
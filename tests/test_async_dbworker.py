@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from database.async_dbworker import (create_async_db_engine, create_template, deactivate_users, gen_recipients, get_templates,
+                                     get_user, init_async_db)
+from metrics import DB_ERRORS
+
+
+def test_failed_query_is_counted_and_failed_write_is_raised(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f'sqlite+aiosqlite:///{tmp_path}/test.db')
+        # tables are not created, so every query fails
+        errors = DB_ERRORS.value()
+        try:
+            with pytest.raises(OperationalError):
+                await create_template('hi', engine)
+            return await get_templates(engine), DB_ERRORS.value() - errors
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == ({}, 2)
+
+
+def test_created_template_is_returned(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f'sqlite+aiosqlite:///{tmp_path}/test.db')
+        await init_async_db(engine)
+        try:
+            return await create_template('hi', engine), list(await get_templates(engine))
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == (1, [1])
+
+
+def test_user_who_blocked_bot_is_reactivated(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f'sqlite+aiosqlite:///{tmp_path}/test.db')
+        await init_async_db(engine)
+        try:
+            await get_user(1, 'user', engine)
+            await deactivate_users([1], engine)
+            blocked = [user.id for user in await gen_recipients(engine)]
+            await get_user(1, 'user', engine)
+            return blocked, [user.id for user in await gen_recipients(engine)]
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == ([], [1])
@@ -0,0 +1,106 @@
+import asyncio
+import importlib
+
+from telebot import asyncio_helper
+from telebot.types import Message
+
+from auth import AttemptThrottle, Authenticator
+from database.msg_templates import REPLIES
+from metrics import AUTH_ATTEMPTS
+
+
+def test_user_is_locked_after_limit_and_released_after_lockout():
+    throttle = AttemptThrottle(user_limit=3, user_window=60, lockout=300)
+
+    assert throttle.fail(1, 100) == 0
+    assert throttle.fail(1, 110) == 0
+    assert throttle.fail(1, 120) == 300
+    assert throttle.retry_after(1, 200) == 220
+    assert throttle.retry_after(2, 200) == 0
+    assert throttle.retry_after(1, 420) == 0
+
+
+def test_failures_outside_window_are_forgotten():
+    throttle = AttemptThrottle(user_limit=3, user_window=60, lockout=300)
+
+    throttle.fail(1, 100)
+    throttle.fail(1, 110)
+    assert throttle.fail(1, 200) == 0
+
+
+def test_global_limit_stops_everyone():
+    throttle = AttemptThrottle(user_limit=10, global_limit=3, global_window=60)
+    for user_id in range(3):
+        throttle.fail(user_id, 100)
+
+    assert throttle.retry_after(99, 110) == 50
+    assert throttle.retry_after(99, 160) == 0
+
+
+def test_lockout_survives_restart(engine):
+    authenticator = Authenticator(engine, 'слово', AttemptThrottle(user_limit=2))
+    authenticator.authenticate(1, 'не то')
+    assert authenticator.authenticate(1, 'не то')[0] == 'locked'
+
+    restarted = Authenticator(engine, 'слово', AttemptThrottle(user_limit=2))
+    restarted.load()
+    assert restarted.authenticate(1, 'слово')[0] == 'locked'
+
+
+def test_invite_code_is_used_once(engine):
+    authenticator = Authenticator(engine, None, AttemptThrottle())
+    code, = authenticator.issue_codes(leader_id=1)
+
+    # code is accepted without dash and in lower case
+    assert authenticator.authenticate(2, code.replace('-', ' ').lower()) == ('passed', 0)
+    assert authenticator.authenticate(3, code) == ('failed', 0)
+
+
+def test_revoked_code_is_rejected(engine):
+    authenticator = Authenticator(engine, None, AttemptThrottle())
+    code, = authenticator.issue_codes(leader_id=1)
+
+    assert authenticator.revoke_codes(1) == 1
+    assert authenticator.authenticate(2, code) == ('failed', 0)
+
+
+def private_message(user_id: int, text: str) -> Message:
+    return Message.de_json({
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'},
+    })
+
+
+def test_start_is_refused_while_global_window_is_full(handlers, fake_api, engine, monkeypatch):
+    authenticator = Authenticator(engine, 'слово', AttemptThrottle(global_limit=2))
+    monkeypatch.setattr(handlers, 'authenticator', authenticator)
+    authenticator.authenticate(1, 'не то')
+    authenticator.authenticate(2, 'не то')
+
+    handlers.start_command(private_message(3, '/start'))
+
+    assert [text for _, _, text in fake_api.sent] == [REPLIES['auth_locked'].format(minutes=1)]
+
+
+def test_async_authentication_goes_through_throttle(fake_api, engine, tmp_path, monkeypatch):
+    for name, value in {'BOT_TOKEN': '1:test', 'DEV_ID': '1', 'LEADER_ID': '1', 'AUTH_WORD': 'слово'}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv('ASYNC_DATABASE_URL', f'sqlite+aiosqlite:///{tmp_path}/async.db')
+    monkeypatch.setattr(asyncio_helper, 'API_URL', fake_api.api_url)
+    handlers = importlib.import_module('async_commands.start')
+    monkeypatch.setattr(handlers, 'authenticator', Authenticator(engine, 'слово', AttemptThrottle(user_limit=2)))
+    throttled = AUTH_ATTEMPTS.value(result='throttled')
+
+    async def scenario():
+        for text in ('не то', 'не то', 'слово'):
+            await handlers.bot.set_state(5, handlers.Dialogue.authenticate, 5)
+            await handlers.bot.add_data(5, 5, username='nick')
+            await handlers.auth_member(private_message(5, text))
+        await asyncio_helper.session_manager.session.close()
+
+    asyncio.run(scenario())
+    assert [text for _, _, text in fake_api.sent] == [
+        REPLIES['auth_failed'], REPLIES['auth_locked'].format(minutes=15), REPLIES['auth_locked'].format(minutes=15),
+    ]
+    assert AUTH_ATTEMPTS.value(result='throttled') == throttled + 1
@@ -0,0 +1,108 @@
+import threading
+from collections import Counter
+
+import pytest
+from sqlalchemy import event, select
+
+from broadcast import Broadcaster, BroadcastQueue
+from database.dbworker import claim_deliveries, create_broadcast_job, recover_deliveries, session_scope
+from database.models import BroadcastDelivery, BroadcastJob
+from metrics import BROADCAST_PENDING, REGISTRY
+
+
+class StoppingBroadcaster(Broadcaster):
+    """Broadcaster that stops like killed process right after Telegram accepted message to stop_at."""
+
+    def __init__(self, bot, stop_at: int) -> None:
+        super().__init__(bot, workers=2, global_rate=1000, chat_rate=1000)
+        self.stop_at = stop_at
+
+    def deliver(self, chat_id: int, text: str):
+        receipt = super().deliver(chat_id, text)
+        if chat_id == self.stop_at:
+            raise RuntimeError('process stopped')
+        return receipt
+
+
+def job_state(job_id: int, engine) -> tuple:
+    with session_scope(engine) as session:
+        status = session.execute(select(BroadcastJob.status).where(BroadcastJob.id == job_id)).scalar()
+        deliveries = dict(session.execute(
+            select(BroadcastDelivery.user_id, BroadcastDelivery.status).where(BroadcastDelivery.job_id == job_id)
+        ).all())
+    return status, deliveries
+
+
+def sends(fake_api) -> Counter:
+    return Counter(chat_id for _, chat_id, _ in fake_api.sent)
+
+
+def test_job_stopped_partway_is_resumed_without_second_send(bot, fake_api, engine):
+    job_id = create_broadcast_job(1, [(user_id, f'hi {user_id}') for user_id in range(1, 7)], engine)
+    stopped = BroadcastQueue(StoppingBroadcaster(bot, stop_at=4), engine, batch_size=2)
+    with pytest.raises(RuntimeError):
+        stopped._drain(job_id)
+    assert job_state(job_id, engine)[0] == 'running'
+
+    restarted = BroadcastQueue(Broadcaster(bot, global_rate=1000, chat_rate=1000), engine, batch_size=2)
+    finished = threading.Event()
+    results = []
+    restarted.on_done = lambda job, counts: (results.append(counts), finished.set())
+    restarted.start()
+
+    assert finished.wait(10)
+    assert sends(fake_api) == {user_id: 1 for user_id in range(1, 7)}
+    # message to 4 was accepted before stop, but its result was not stored, so it is not sent again
+    assert results == [{'delivered': 5, 'unknown': 1}]
+    assert job_state(job_id, engine) == ('done', {1: 'delivered', 2: 'delivered', 3: 'delivered', 4: 'unknown',
+                                                  5: 'delivered', 6: 'delivered'})
+
+
+def test_processes_draining_one_job_send_every_message_once(bot, fake_api, engine):
+    job_id = create_broadcast_job(1, [(user_id, f'hi {user_id}') for user_id in range(1, 41)], engine)
+    finished = []
+    queues = []
+    for owner in ('worker-1', 'worker-2', 'worker-3'):
+        queue = BroadcastQueue(Broadcaster(bot, workers=2, global_rate=1000, chat_rate=1000), engine,
+                               batch_size=3, owner=owner)
+        queue.on_done = lambda job, counts: finished.append(counts)
+        queues.append(queue)
+
+    threads = [threading.Thread(target=queue._drain, args=(job_id,)) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert sends(fake_api) == {user_id: 1 for user_id in range(1, 41)}
+    assert finished == [{'delivered': 40}]
+    assert job_state(job_id, engine)[0] == 'done'
+
+
+def test_recovery_takes_only_deliveries_of_its_owner(engine):
+    job_id = create_broadcast_job(1, [(user_id, 'hi') for user_id in range(1, 5)], engine)
+    claim_deliveries(job_id, 1, engine, owner='worker-1')
+    claim_deliveries(job_id, 1, engine, owner='worker-2')
+
+    assert recover_deliveries('worker-1', engine) == 1
+    assert job_state(job_id, engine)[1] == {1: 'unknown', 2: 'sending', 3: 'pending', 4: 'pending'}
+
+
+def test_pending_gauge_follows_queue_without_scrape_queries(bot, fake_api, engine):
+    queue = BroadcastQueue(Broadcaster(bot, workers=2, global_rate=1000, chat_rate=1000), engine, batch_size=2)
+    create_broadcast_job(1, [(user_id, 'left before restart') for user_id in range(1, 4)], engine)
+    finished = threading.Event()
+    queue.on_done = lambda job, counts: finished.set()
+
+    queue._drain(queue.enqueue(1, [(user_id, 'hi') for user_id in range(1, 6)]))
+    assert BROADCAST_PENDING.samples() == [('bot_broadcast_pending', (), 3)]
+
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    REGISTRY.render()
+    assert queries == []
+
+    finished.clear()
+    queue.start()
+    assert finished.wait(10)
+    assert BROADCAST_PENDING.samples() == [('bot_broadcast_pending', (), 0)]
@@ -0,0 +1,70 @@
+from sqlalchemy import event
+
+from database import dbworker
+from database.dbworker import (add_rr_name, cache_get, cache_set, create_template, delete_template, gen_users,
+                               get_templates, get_user, invalidate_cache)
+from metrics import DB_CACHE, REGISTRY
+
+
+def count_queries(engine) -> list:
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    return queries
+
+
+def test_templates_are_read_again_after_every_write(engine):
+    queries = count_queries(engine)
+    create_template('first', engine)
+    assert [template.preview() for template in get_templates(engine).values()] == ['first']
+    read = len(queries)
+    get_templates(engine)
+    assert len(queries) == read
+
+    number = create_template('second', engine)
+    assert [template.preview() for template in get_templates(engine).values()] == ['first', 'second']
+    delete_template(number, engine)
+    assert [template.preview() for template in get_templates(engine).values()] == ['first']
+
+
+def test_users_are_read_again_after_every_write(engine):
+    get_user(1, 'user1', engine)
+    assert [user.rr_name for user in gen_users(engine)] == ['_empty_name_']
+
+    add_rr_name(1, 'user1', 'hero', engine)
+    assert [user.rr_name for user in gen_users(engine)] == ['hero']
+    get_user(2, 'user2', engine)
+    assert [user.id for user in gen_users(engine)] == [1, 2]
+
+
+def test_read_that_raced_with_write_is_not_cached(engine):
+    _, version = cache_get('user', engine)
+    # write happened while rows were read, so they can be stale
+    invalidate_cache('user', engine)
+    cache_set('user', engine, ['stale'], version)
+    assert cache_get('user', engine)[0] is None
+
+    _, version = cache_get('user', engine)
+    cache_set('user', engine, ['fresh'], version)
+    assert cache_get('user', engine)[0] == ['fresh']
+
+
+def test_expired_data_is_read_again(engine, monkeypatch):
+    monkeypatch.setattr(dbworker, 'CACHE_TTL', 0)
+    _, version = cache_get('user', engine)
+    cache_set('user', engine, ['old'], version)
+
+    assert cache_get('user', engine)[0] is None
+
+
+def test_cache_results_are_exposed_as_metric(engine):
+    before = {result: DB_CACHE.value(table='template', result=result) for result in ('hit', 'miss', 'invalidation')}
+
+    get_templates(engine)
+    get_templates(engine)
+    create_template('first', engine)
+    get_templates(engine)
+
+    assert {result: DB_CACHE.value(table='template', result=result) - before[result] for result in before} == {
+        'hit': 1, 'miss': 2, 'invalidation': 1,
+    }
+    assert 'bot_db_cache_total{result="hit",table="template"}' in REGISTRY.render()
@@ -0,0 +1,63 @@
+from sqlalchemy import event
+from telebot.types import Message
+
+from database import dbworker
+from database.dbworker import add_chat_member, bulk_upsert_users, iter_chat_mentions
+
+
+def test_known_member_is_not_written_again(engine, monkeypatch):
+    monkeypatch.setattr(dbworker, '_known_members', set())
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+
+    add_chat_member(-100, 1, engine)
+    written = len(queries)
+    for _ in range(10):
+        add_chat_member(-100, 1, engine)
+    assert written > 0
+    assert len(queries) == written
+
+
+def test_mentions_are_read_in_batches_without_holding_connection(engine, monkeypatch):
+    monkeypatch.setattr(dbworker, '_known_members', set())
+    bulk_upsert_users([{'id': user_id, 'username': f'user{user_id}'} for user_id in range(1, 6)], engine)
+    for user_id in (1, 2, 4, 5):
+        add_chat_member(-100, user_id, engine)
+
+    mentions = []
+    for mention in iter_chat_mentions(-100, engine, batch_size=2):
+        # mentions are sent here, while no connection is taken from pool
+        assert engine.pool.checkedout() == 0
+        mentions.append(mention[0])
+    assert mentions == [1, 2, 4, 5]
+
+
+def group_message(user_id: int, text: str, chat_id: int = -100) -> Message:
+    return Message.de_json({
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': chat_id, 'type': 'group'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'},
+    })
+
+
+def test_first_everyone_in_untracked_chat_mentions_all_users(handlers, fake_api, engine, monkeypatch):
+    monkeypatch.setattr(dbworker, '_known_members', set())
+    bulk_upsert_users([{'id': user_id, 'username': f'user{user_id}'} for user_id in range(1, 4)], engine)
+
+    handlers.mention_all(group_message(2, '/everyone'))
+
+    text = ' '.join(sent[2] for sent in fake_api.sent)
+    assert all(f'@user{user_id}' in text for user_id in range(1, 4))
+    assert [mention[0] for mention in iter_chat_mentions(-100, engine)] == [2]
+
+
+def test_everyone_in_tracked_chat_mentions_members_and_caller(handlers, fake_api, engine, monkeypatch):
+    monkeypatch.setattr(dbworker, '_known_members', set())
+    bulk_upsert_users([{'id': user_id, 'username': f'user{user_id}'} for user_id in range(1, 4)], engine)
+    add_chat_member(-100, 1, engine)
+
+    handlers.mention_all(group_message(3, '/everyone'))
+
+    text = ' '.join(sent[2] for sent in fake_api.sent)
+    assert '@user1' in text and '@user2' not in text
+    assert [mention[0] for mention in iter_chat_mentions(-100, engine)] == [1, 3]
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import dbworker
+from database.dbworker import create_db_engine, create_session, create_template, get_templates, session_scope
+from metrics import DB_ERRORS
+
+
+def pragmas(engine) -> tuple:
+    with engine.connect() as connection:
+        return tuple(connection.execute(text(f'PRAGMA {name}')).scalar()
+                     for name in ('journal_mode', 'busy_timeout', 'foreign_keys', 'synchronous'))
+
+
+def test_every_connection_gets_pragmas(tmp_path):
+    engine = create_db_engine(f'sqlite+pysqlite:///{tmp_path}/test.db', pool_size=2, busy_timeout=1234)
+    try:
+        # pooled connections are opened by other threads too, every one of them has pragmas
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pragmas(engine))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # synchronous=NORMAL is 1
+        assert results == [('wal', 1234, 1, 1)] * 4
+    finally:
+        engine.dispose()
+
+
+def test_session_registry_is_built_once_per_engine(engine):
+    session = create_session(engine)
+    registry = dbworker._sessions[engine]
+
+    assert create_session(engine) is session
+    assert dbworker._sessions[engine] is registry
+    other = []
+    thread = threading.Thread(target=lambda: other.append(create_session(engine)))
+    thread.start()
+    thread.join()
+    # every thread has own session of the same registry
+    assert other[0] is not session
+    assert dbworker._sessions[engine] is registry
+
+
+def test_failed_read_returns_default_and_failed_write_is_raised(tmp_path):
+    # tables are not created, so every query fails
+    engine = create_db_engine(f'sqlite+pysqlite:///{tmp_path}/test.db', pool_size=2)
+    errors = DB_ERRORS.value()
+    try:
+        assert get_templates(engine) == {}
+        with pytest.raises(OperationalError):
+            create_template('hi', engine)
+        assert DB_ERRORS.value() - errors == 2
+    finally:
+        engine.dispose()
+
+
+def test_failed_write_is_rolled_back(engine):
+    with pytest.raises(ValueError):
+        with session_scope(engine, reraise=True) as session:
+            session.execute(text("INSERT INTO template (number, template) VALUES (1, 'lost')"))
+            raise ValueError('failed after insert')
+
+    assert get_templates(engine) == {}
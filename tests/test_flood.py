@@ -0,0 +1,69 @@
+from telebot.types import Update
+
+from flood import FloodControl, install_flood_control
+
+from .conftest import retrieve_updates
+
+
+def raw_message(user_id: int, text: str, chat_id: int = None) -> dict:
+    chat_id = chat_id or user_id
+    return {'message': {
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': chat_id, 'type': 'private' if chat_id == user_id else 'group'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'},
+    }}
+
+
+def message(update_id: int, user_id: int, text: str, chat_id: int = None) -> Update:
+    return Update.de_json(dict(raw_message(user_id, text, chat_id), update_id=update_id))
+
+
+def callback(update_id: int, user_id: int, data: str) -> Update:
+    return Update.de_json({'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': '1', 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'},
+        'message': {'message_id': 1, 'date': 0, 'text': 'x', 'chat': {'id': user_id, 'type': 'private'}},
+    }})
+
+
+def test_repeated_command_is_coalesced():
+    flood = FloodControl()
+    admitted = flood.filter([message(n, 5, '/help') for n in range(1, 11)])
+    assert [update.update_id for update in admitted] == [1]
+
+
+def test_messages_over_user_limit_are_dropped():
+    flood = FloodControl(user_rate=0.001, user_burst=3)
+    assert len(flood.filter([message(n, 5, f'text {n}') for n in range(1, 11)])) == 3
+
+
+def test_exempt_user_is_not_limited():
+    flood = FloodControl(user_rate=0.001, user_burst=1, exempt=[5])
+    assert len(flood.filter([message(n, 5, '/help') for n in range(1, 11)])) == 10
+
+
+def test_group_messages_over_limit_are_deferred():
+    deferred = []
+    flood = FloodControl(chat_rate=0.001, chat_burst=2, flush_interval=0, on_deferred=deferred.extend)
+    admitted = flood.filter([message(n, 100 + n, 'raid', -500) for n in range(1, 6)])
+    assert len(admitted) == 2
+    assert sorted(deferred) == [(-500, 103), (-500, 104), (-500, 105)]
+
+
+def test_dropped_updates_are_acknowledged(fake_api, bot):
+    replies = []
+    bot.message_handler(commands=['help'])(replies.append)
+    install_flood_control(bot, FloodControl())
+    for _ in range(10):
+        fake_api.push_update(raw_message(5, '/help'))
+
+    retrieve_updates(bot)
+    retrieve_updates(bot)
+    assert bot.last_update_id == 10
+    assert len(replies) == 1
+
+
+def test_dropped_callback_is_answered(fake_api, bot):
+    install_flood_control(bot, FloodControl())
+    bot.process_new_updates([callback(1, 5, 'tpl:all:n:8'), callback(2, 5, 'tpl:all:n:8')])
+    assert fake_api.calls.get('answerCallbackQuery') == 1
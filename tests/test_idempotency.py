@@ -0,0 +1,30 @@
+from database.idempotency import IdempotencyStore, install_update_dedup
+
+from .conftest import retrieve_updates
+
+
+def private_message(user_id: int, text: str) -> dict:
+    return {'message': {'message_id': 1, 'date': 0, 'text': text,
+                        'chat': {'id': user_id, 'type': 'private'},
+                        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'}}}
+
+
+def test_claim_is_remembered_across_stores(engine):
+    assert IdempotencyStore(engine).claim('update:1')
+    assert not IdempotencyStore(engine).claim('update:1')
+
+
+def test_duplicate_batch_advances_polling_offset(engine, fake_api, bot):
+    handled = []
+    bot.message_handler(func=lambda _: True)(handled.append)
+    store = IdempotencyStore(engine)
+    install_update_dedup(bot, store)
+    update_id = fake_api.push_update(private_message(5, 'hi'))
+    # update was processed before restart
+    store.claim(f'update:{update_id}')
+
+    retrieve_updates(bot)
+    assert bot.last_update_id == update_id
+    retrieve_updates(bot)
+    assert handled == []
+    assert fake_api.calls['getUpdates'] == 2
@@ -0,0 +1,18 @@
+from metrics import Registry
+
+
+def test_registered_again_gauge_reports_new_function():
+    registry = Registry()
+    first = registry.gauge('bot_test_gauge', 'Test gauge', lambda: 1)
+
+    second = registry.gauge('bot_test_gauge', 'Test gauge', lambda: 2)
+
+    assert second is first
+    assert first.samples() == [('bot_test_gauge', (), 2)]
+
+
+def test_gauge_without_function_keeps_registered_one():
+    registry = Registry()
+    registry.gauge('bot_test_gauge', 'Test gauge', lambda: 1)
+
+    assert registry.gauge('bot_test_gauge', 'Test gauge').samples() == [('bot_test_gauge', (), 1)]
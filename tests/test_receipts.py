@@ -0,0 +1,64 @@
+import threading
+
+from broadcast import Broadcaster, BroadcastQueue
+from database.dbworker import add_receipts, create_broadcast_job, get_job_stats, get_sent_messages
+
+
+def receipt(job_id: int, user_id: int, status: str = 'delivered', latency_ms: int = 0, action: str = 'send') -> dict:
+    return {'job_id': job_id, 'user_id': user_id, 'action': action, 'status': status, 'message_id': user_id,
+            'latency_ms': latency_ms, 'error_code': None, 'created_at': 0}
+
+
+def revise(queue: BroadcastQueue, method, *args) -> dict:
+    """Function that runs edit or delete of broadcast and waits until it is finished."""
+    finished = threading.Event()
+    results = []
+    method(*args, on_done=lambda counts: (results.append(counts), finished.set()))
+    assert finished.wait(10)
+    return results[0]
+
+
+def test_job_stats_percentiles_of_known_distribution(engine):
+    # latencies 1..100 ms are stored shuffled, failed sends and edits of the same job are not counted
+    add_receipts([receipt(1, user_id, latency_ms=(user_id * 37) % 100 + 1) for user_id in range(100)], engine)
+    add_receipts([receipt(1, 100 + user_id, 'failed', latency_ms=5000) for user_id in range(3)], engine)
+    add_receipts([receipt(1, user_id, 'edited', latency_ms=9000, action='edit') for user_id in range(10)], engine)
+    add_receipts([receipt(2, user_id, latency_ms=7000) for user_id in range(10)], engine)
+
+    stats = get_job_stats(1, engine, percentiles=(0, 0.5, 0.9, 0.99, 1))
+
+    assert stats['counts'] == {'delivered': 100, 'failed': 3}
+    assert stats['latency'] == {0: 1, 0.5: 50, 0.9: 90, 0.99: 99, 1: 100}
+
+
+def test_job_stats_without_delivered_messages(engine):
+    add_receipts([receipt(1, 1, 'blocked'), receipt(1, 2, 'failed')], engine)
+
+    assert get_job_stats(1, engine) == {'counts': {'blocked': 1, 'failed': 1}, 'latency': {}}
+    assert get_job_stats(2, engine) == {'counts': {}, 'latency': {}}
+
+
+def test_edit_and_recall_touch_only_recorded_receipts(bot, fake_api, engine):
+    fake_api.fail_chat(3, 403)
+    fake_api.fail_chat(4, 400)
+    queue = BroadcastQueue(Broadcaster(bot, workers=2, global_rate=1000, chat_rate=1000, max_retries=0), engine)
+    job_id = create_broadcast_job(1, [(user_id, 'hi') for user_id in range(1, 5)], engine)
+    other_id = create_broadcast_job(1, [(user_id, 'other') for user_id in range(1, 3)], engine)
+    queue._drain(job_id)
+    queue._drain(other_id)
+    delivered = get_sent_messages(job_id, engine)
+    assert [user_id for user_id, _ in delivered] == [1, 2]
+
+    assert revise(queue, queue.edit_job, job_id, lambda user_id: f'edited {user_id}') == {'edited': 2}
+    assert sorted(fake_api.revised) == [('editMessageText', *message) for message in delivered]
+
+    fake_api.revised.clear()
+    assert revise(queue, queue.delete_job, job_id) == {'deleted': 2}
+    assert sorted(fake_api.revised) == [('deleteMessage', *message) for message in delivered]
+
+    # deleted messages are not edited or deleted again, messages of other broadcast are kept
+    fake_api.revised.clear()
+    assert revise(queue, queue.edit_job, job_id, lambda user_id: 'late') == {}
+    assert revise(queue, queue.delete_job, job_id) == {}
+    assert fake_api.revised == []
+    assert len(get_sent_messages(other_id, engine)) == 2
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.dbworker import create_schedule, create_template, find_template, get_schedule
+from scheduler import Cron, Scheduler, next_run, parse_recurrence
+
+NOW = datetime(2026, 10, 16, 19, 0)  # friday
+
+
+def test_recurrence_is_parsed_from_typed_time():
+    assert parse_recurrence('18:00', NOW) == 'cron 0 18 * * *'
+    assert parse_recurrence('  cron 0 18   * * 1-5 ', NOW) == 'cron 0 18 * * 1-5'
+    assert parse_recurrence('20.10.2026 18:00', NOW) == 'once 2026-10-20T18:00'
+
+
+@pytest.mark.parametrize('text', ['16.10.2026 18:00', 'cron 0 25 * * *', 'cron 0 18 * *', 'завтра'])
+def test_invalid_or_past_recurrence_is_rejected(text):
+    with pytest.raises(ValueError):
+        parse_recurrence(text, NOW)
+
+
+def test_cron_skips_to_next_matching_day():
+    assert Cron('0 18 * * 1-5').next_after(NOW) == datetime(2026, 10, 19, 18, 0)
+    assert Cron('*/15 * * * *').next_after(datetime(2026, 10, 16, 19, 7, 30)) == datetime(2026, 10, 16, 19, 15)
+
+
+def test_cron_matches_either_restricted_day_field():
+    # 20th is tuesday, the first friday after it is 23rd
+    assert Cron('0 9 20 * 5').next_after(NOW) == datetime(2026, 10, 20, 9, 0)
+    assert Cron('0 9 20 * 5').next_after(datetime(2026, 10, 20, 10, 0)) == datetime(2026, 10, 23, 9, 0)
+
+
+def test_one_time_run_is_not_repeated():
+    assert next_run('once 2026-10-20T18:00', NOW) == datetime(2026, 10, 20, 18, 0)
+    assert next_run('once 2026-10-20T18:00', datetime(2026, 10, 20, 18, 0)) is None
+
+
+def test_missed_run_is_fired_once_and_continues_from_now(engine):
+    create_template('сбор', engine)
+    template_id = find_template(1, engine)[0]
+    missed = datetime.now().replace(second=0, microsecond=0) - timedelta(days=3)
+    schedule_id = create_schedule(template_id, 1, 'cron * * * * *', missed, engine)
+    fired = []
+    first, second = Scheduler(engine, on_fire=fired.append), Scheduler(engine, on_fire=fired.append)
+
+    # two processes found the same missed run, only one of them takes it
+    first._fire(schedule_id, missed)
+    second._fire(schedule_id, missed)
+
+    assert [schedule.id for schedule in fired] == [schedule_id]
+    assert get_schedule(schedule_id, engine).next_run_at > datetime.now()
+
+
+def test_finished_one_time_schedule_is_deactivated(engine):
+    create_template('сбор', engine)
+    template_id = find_template(1, engine)[0]
+    due_at = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=5)
+    schedule_id = create_schedule(template_id, 1, f'once {due_at.isoformat(timespec="minutes")}', due_at, engine)
+    fired = []
+
+    Scheduler(engine, on_fire=fired.append)._fire(schedule_id, due_at)
+
+    assert len(fired) == 1
+    assert not get_schedule(schedule_id, engine).active
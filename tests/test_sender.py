@@ -0,0 +1,85 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from broadcast import Broadcaster, BroadcastQueue
+from broadcast import sender
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff sleeps of Broadcaster, they are recorded instead of slept."""
+    recorded = []
+    monkeypatch.setattr(sender, 'time', SimpleNamespace(monotonic=time.monotonic, sleep=recorded.append))
+    return recorded
+
+
+def broadcaster(bot, **kwargs) -> Broadcaster:
+    return Broadcaster(bot, workers=4, global_rate=1000, chat_rate=1000, **kwargs)
+
+
+def test_flood_waits_do_not_use_retries(bot, fake_api, sleeps):
+    fake_api.retry_after = 0
+    fake_api.fail_chat(7, 429, times=5)
+
+    receipt = broadcaster(bot, max_retries=1).deliver(7, 'hi')
+
+    assert receipt.status == 'delivered'
+    assert receipt.message_id is not None
+    assert fake_api.calls['sendMessage'] == 6
+    assert sleeps == []
+
+
+def test_flood_waits_have_own_cap(bot, fake_api, sleeps):
+    fake_api.retry_after = 0
+    fake_api.fail_chat(7, 429)
+
+    receipt = broadcaster(bot, max_retries=5, max_flood_waits=3).deliver(7, 'hi')
+
+    assert (receipt.status, receipt.error_code) == ('failed', 429)
+    assert fake_api.calls['sendMessage'] == 4
+
+
+def test_blocked_and_bad_request_are_not_retried(bot, fake_api, sleeps):
+    fake_api.fail_chat(7, 403)
+    fake_api.fail_chat(8, 400)
+    sending = broadcaster(bot)
+
+    assert sending.deliver(7, 'hi').status == 'blocked'
+    assert (sending.deliver(8, 'hi').status, fake_api.calls['sendMessage']) == ('failed', 2)
+
+
+def test_transient_errors_are_retried_with_growing_backoff(bot, fake_api, sleeps):
+    fake_api.fail_chat(7, 500, times=2)
+    fake_api.fail_chat(8, 500)
+    sending = broadcaster(bot, max_retries=3)
+
+    assert sending.deliver(7, 'hi').status == 'delivered'
+    assert fake_api.calls['sendMessage'] == 3
+    receipt = sending.deliver(8, 'hi')
+    assert (receipt.status, receipt.error_code) == ('failed', 500)
+    assert fake_api.calls['sendMessage'] == 3 + 4
+    # jitter keeps every backoff between half and whole of 1, 2, 4 seconds
+    assert len(sleeps) == 2 + 3
+    assert 0.5 <= sleeps[2] <= 1 and 1 <= sleeps[3] <= 2 and 2 <= sleeps[4] <= 4
+
+
+def test_job_counts_every_outcome(bot, fake_api, engine, sleeps):
+    fake_api.retry_after = 0
+    fake_api.fail_chat(2, 429, times=2)
+    fake_api.fail_chat(3, 403)
+    fake_api.fail_chat(4, 400)
+    fake_api.fail_chat(5, 500)
+    queue = BroadcastQueue(broadcaster(bot, max_retries=1), engine, batch_size=2)
+    finished = threading.Event()
+    results = []
+    queue.on_done = lambda job, counts: (results.append(counts), finished.set())
+
+    queue.enqueue(1, [(user_id, f'hi {user_id}') for user_id in range(1, 6)])
+    queue.start()
+
+    assert finished.wait(10)
+    assert results == [{'delivered': 2, 'blocked': 1, 'failed': 2}]
+    assert sorted(chat_id for _, chat_id, _ in fake_api.sent) == [1, 2]
@@ -0,0 +1,119 @@
+import os
+import time
+
+import pytest
+from telebot import apihelper
+
+from database.idempotency import IdempotencyStore
+from sharding import ShardedReceiver
+
+
+def echo_worker(index, updates, done, bucket, poll_interval, metrics_port) -> None:
+    """Worker that answers every message with number of worker and text of message.
+    "crash" stops process the first time it is received and "slow" is answered after one second.
+    """
+    apihelper.API_URL = os.environ['SHARD_TEST_API_URL']
+    while True:
+        raw = updates.get()
+        if raw is None:
+            return
+        message = raw['message']
+        if message['text'] == 'crash':
+            marker = os.path.join(os.environ['SHARD_TEST_DIR'], f'crashed{raw["update_id"]}')
+            if not os.path.exists(marker):
+                open(marker, 'w').close()
+                os._exit(1)
+        if message['text'] == 'slow':
+            time.sleep(1)
+        apihelper.send_message('1:test', message['chat']['id'], f'{index}:{message["text"]}')
+        done.put(raw['update_id'])
+
+
+def private_message(user_id: int, text: str) -> dict:
+    return {'message': {'message_id': 1, 'date': 0, 'text': text,
+                        'chat': {'id': user_id, 'type': 'private'},
+                        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'}}}
+
+
+@pytest.fixture
+def receivers(bot, fake_api, tmp_path, monkeypatch):
+    monkeypatch.setenv('SHARD_TEST_API_URL', fake_api.api_url)
+    monkeypatch.setenv('SHARD_TEST_DIR', str(tmp_path))
+    started = []
+
+    def create(**kwargs) -> ShardedReceiver:
+        receiver = ShardedReceiver(bot, timeout=1, target=echo_worker, **kwargs)
+        receiver.start()
+        started.append(receiver)
+        return receiver
+
+    yield create
+    for receiver in started:
+        receiver.stop()
+        for process in receiver.processes:
+            process.join(5)
+
+
+def poll_until(receiver: ShardedReceiver, condition, limit: float = 30) -> None:
+    deadline = time.monotonic() + limit
+    while not condition():
+        assert time.monotonic() < deadline
+        receiver.poll()
+
+
+def test_updates_of_one_chat_go_to_one_worker_in_order(receivers, fake_api):
+    receiver = receivers(workers=2)
+    for text in ('a', 'b', 'c'):
+        for chat_id in range(1, 5):
+            fake_api.push_update(private_message(chat_id, text))
+
+    poll_until(receiver, lambda: fake_api.sent_count() == 12 and not receiver.pending)
+
+    for chat_id in range(1, 5):
+        assert [text for _, chat, text in fake_api.sent if chat == chat_id] == [f'{chat_id % 2}:{text}' for text in 'abc']
+
+
+def test_update_is_acknowledged_and_marked_only_after_processing(receivers, fake_api, engine):
+    dedup = IdempotencyStore(engine)
+    receiver = receivers(workers=1, dedup=dedup)
+    update_id = fake_api.push_update(private_message(1, 'slow'))
+
+    poll_until(receiver, lambda: receiver.pending)
+    receiver.poll()
+    assert fake_api.unacknowledged() == [update_id]
+    assert dedup.seen_many([f'update:{update_id}']) == set()
+
+    poll_until(receiver, lambda: not receiver.pending)
+    receiver.poll()
+    assert fake_api.unacknowledged() == []
+    assert dedup.seen_many([f'update:{update_id}']) == {f'update:{update_id}'}
+    assert [text for _, _, text in fake_api.sent] == ['0:slow']
+
+
+def test_updates_of_crashed_worker_are_processed_by_new_process(receivers, fake_api, engine, tmp_path):
+    receiver = receivers(workers=1, dedup=IdempotencyStore(engine))
+    first = receiver.processes[0]
+    fake_api.push_update(private_message(1, 'crash'))
+    fake_api.push_update(private_message(1, 'after'))
+
+    poll_until(receiver, lambda: fake_api.sent_count() == 2 and not receiver.pending)
+
+    assert first.exitcode == 1 and receiver.processes[0] is not first
+    assert [text for _, _, text in fake_api.sent] == ['0:crash', '0:after']
+    receiver.poll()
+    assert fake_api.unacknowledged() == []
+
+
+def test_processed_updates_are_not_routed_again(receivers, fake_api, engine):
+    dedup = IdempotencyStore(engine)
+    update_id = fake_api.push_update(private_message(1, 'hi'))
+    # update was processed before restart, but offset was not acknowledged
+    dedup.claim(f'update:{update_id}')
+    receiver = receivers(workers=1, dedup=dedup)
+
+    receiver.poll()
+    receiver.poll()
+
+    assert receiver.pending == {}
+    assert fake_api.unacknowledged() == []
+    assert fake_api.sent == []
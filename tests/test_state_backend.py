@@ -0,0 +1,48 @@
+import threading
+
+from sqlalchemy import event
+from telebot import Handler
+
+from database.state_backend import SQLiteHandlerBackend
+
+
+def step(message, number):
+    return number
+
+
+def count_queries(engine) -> list:
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    return queries
+
+
+def test_concurrent_registrations_keep_every_handler(engine):
+    backend = SQLiteHandlerBackend(engine)
+    threads = [threading.Thread(target=backend.register_handler, args=(7, Handler(step, number)))
+               for number in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    handlers = backend.get_handlers(7)
+    assert sorted(handler.args[0] for handler in handlers) == list(range(10))
+    assert backend.get_handlers(7) is None
+
+
+def test_chat_without_dialogue_does_not_query_database(engine):
+    backend = SQLiteHandlerBackend(engine)
+    backend.register_handler(7, Handler(step, 1))
+    queries = count_queries(engine)
+
+    assert backend.get_handlers(8) is None
+    assert queries == []
+    assert len(backend.get_handlers(7)) == 1
+    assert len(queries) == 1
+
+
+def test_dialogue_survives_restart(engine):
+    SQLiteHandlerBackend(engine).register_handler(7, Handler(step, 1))
+
+    handlers = SQLiteHandlerBackend(engine).get_handlers(7)
+    assert handlers[0].callback(None, *handlers[0].args) == 1
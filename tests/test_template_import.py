@@ -0,0 +1,34 @@
+from database import dbworker
+from database.dbworker import bulk_import_templates, create_template, delete_template, get_template_page
+from database.models import Template
+
+
+def numbers(engine) -> list:
+    return [number for number, _ in get_template_page(0, True, 100, engine)['items']]
+
+
+def test_import_counts_added_templates_and_numbers_them_after_last(engine):
+    for template in ('first', 'second', 'third'):
+        create_template(template, engine)
+    delete_template(2, engine)
+
+    assert bulk_import_templates(['fourth', 'fifth'], engine) == 2
+    assert numbers(engine) == [1, 3, 4, 5]
+
+
+def test_import_is_repeated_when_number_was_taken(engine, monkeypatch):
+    create_template('first', engine)
+    template_bulk_insert = dbworker.template_bulk_insert
+    calls = []
+
+    def taken_on_first_call(rows: list):
+        calls.append(rows)
+        if len(calls) == 1:
+            # number that another leader has already taken
+            return Template.__table__.insert().values(number=1, template='taken').returning(Template.number)
+        return template_bulk_insert(rows)
+
+    monkeypatch.setattr(dbworker, 'template_bulk_insert', taken_on_first_call)
+    assert bulk_import_templates(['second', 'third'], engine) == 2
+    assert len(calls) == 2
+    assert numbers(engine) == [1, 2, 3]
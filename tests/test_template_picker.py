@@ -0,0 +1,103 @@
+import json
+
+from telebot.types import CallbackQuery
+
+from database.dbworker import create_template, delete_template, find_template, get_template_page, search_templates
+
+
+def buttons(markup: str) -> list:
+    """Function that returns callback data of every button of picker keyboard."""
+    return [button['callback_data'] for row in json.loads(markup)['inline_keyboard'] for button in row]
+
+
+def callback(data: str, user_id: int = 1) -> CallbackQuery:
+    return CallbackQuery.de_json({
+        'id': '1', 'chat_instance': '1', 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'test'},
+        'message': {'message_id': 5, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'text': 'picker'},
+    })
+
+
+def test_pages_of_templates(engine):
+    for number in range(1, 21):
+        create_template(f'template {number}', engine)
+
+    first = get_template_page(0, True, 8, engine)
+    assert [number for number, _ in first['items']] == list(range(1, 9))
+    assert (first['has_prev'], first['has_next']) == (False, True)
+
+    last = get_template_page(16, True, 8, engine)
+    assert [number for number, _ in last['items']] == [17, 18, 19, 20]
+    assert (last['has_prev'], last['has_next']) == (True, False)
+
+    back = get_template_page(17, False, 8, engine)
+    assert [number for number, _ in back['items']] == list(range(9, 17))
+    assert (back['has_prev'], back['has_next']) == (True, True)
+
+    assert get_template_page(20, True, 8, engine) == {'items': [], 'has_prev': False, 'has_next': False}
+    assert get_template_page(1, False, 8, engine) == {'items': [], 'has_prev': False, 'has_next': False}
+
+
+def test_empty_templates_and_category(engine):
+    assert get_template_page(0, True, 8, engine) == {'items': [], 'has_prev': False, 'has_next': False}
+    create_template('template', engine, 'raid')
+
+    assert search_templates('', engine, category='war') == []
+    assert [number for number, _ in search_templates('', engine, category='raid')] == [1]
+
+
+def test_picker_keyboard(handlers, engine):
+    for number in range(1, 11):
+        create_template(f'template {number}', engine)
+
+    _, markup = handlers.template_picker('all')
+    assert buttons(markup) == [f'tpl:all:s:{number}' for number in range(1, 9)] + ['tpl:all:n:8', 'tpl:all:free:0']
+
+    _, markup = handlers.template_picker('del', 8)
+    assert buttons(markup) == ['tpl:del:s:9', 'tpl:del:s:10', 'tpl:del:p:9']
+
+
+def test_picker_shows_templates_after_create_and_delete(handlers, engine):
+    create_template('first', engine)
+    last = create_template('second', engine)
+    assert 'second' in handlers.template_picker('del')[0]
+
+    create_template('third', engine)
+    assert 'third' in handlers.template_picker('del')[0]
+
+    # template added after deleting the last one gets its number, so the same number is rendered with new text
+    delete_template(last + 1, engine)
+    delete_template(last, engine)
+    text, markup = handlers.template_picker('del')
+    assert 'second' not in text and 'third' not in text
+    assert create_template('renamed', engine) == last
+    text, markup = handlers.template_picker('del')
+    assert 'renamed' in text
+    assert buttons(markup) == ['tpl:del:s:1', f'tpl:del:s:{last}']
+
+
+def test_callback_data_is_parsed(handlers, fake_api, engine):
+    for number in range(1, 11):
+        create_template(f'template {number}', engine)
+
+    handlers.pick_template(callback('tpl:del:n:8'))
+    assert fake_api.revised == [('editMessageText', 1, 5)]
+
+    handlers.pick_template(callback('tpl:del:s:3'))
+    assert find_template(3, engine) is None
+    assert fake_api.sent[-1][2] == handlers.REPLIES['template_deleted']
+
+    handlers.pick_template(callback('tpl:all:free:0'))
+    assert fake_api.sent[-1][2] == handlers.REPLIES['send_without_storing']
+
+
+def test_callback_data_of_other_user_or_malformed_is_ignored(handlers, fake_api, engine):
+    create_template('template', engine)
+
+    for data in ('tpl:del:s:1:2', 'tpl:del:s', 'tpl:del:s:x', 'tpl:del:s:'):
+        handlers.pick_template(callback(data))
+    handlers.pick_template(callback('tpl:del:s:1', user_id=2))
+
+    assert find_template(1, engine) is not None
+    assert fake_api.sent == [] and fake_api.revised == []
+    assert fake_api.calls['answerCallbackQuery'] == 5
@@ -0,0 +1,37 @@
+from templating import CompiledTemplate, compile_legacy, compile_template, split_category
+
+
+def test_markers_are_replaced_with_values():
+    template = compile_template('Привет, имя_игрока (ник_игрока)! Сбор дата_сегодня')
+
+    assert template.slots == {'rr_name', 'username', 'date'}
+    assert template.render(rr_name='Вася', username='vasya', date='01.01') == 'Привет, Вася (vasya)! Сбор 01.01'
+
+
+def test_missing_values_and_braces_are_rendered_as_is():
+    template = compile_template('{x} имя_игрока {}')
+
+    assert template.render() == '{x}  {}'
+    assert compile_template('без слотов {0}').render(rr_name='Вася') == 'без слотов {0}'
+
+
+def test_preview_shows_labels():
+    assert compile_template('Привет, имя_игрока').preview() == 'Привет, имя_соклановца'
+
+
+def test_json_round_trip_keeps_template():
+    template = compile_template('имя_игрока, сбор дата_сегодня')
+    restored = CompiledTemplate.from_json(template.to_json())
+
+    assert restored.parts == template.parts
+    assert restored.render(rr_name='Вася', date='01.01') == 'Вася, сбор 01.01'
+
+
+def test_legacy_template_is_compiled_like_new_one():
+    assert compile_legacy('Привет, {rr_name}!').parts == compile_template('Привет, имя_игрока!').parts
+
+
+def test_category_is_split_from_template():
+    assert split_category('#Сбор все на КВ') == ('сбор', 'все на КВ')
+    assert split_category('#сбор') == (None, '#сбор')
+    assert split_category('все на КВ') == (None, 'все на КВ')
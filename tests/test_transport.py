@@ -0,0 +1,83 @@
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+from telebot import apihelper
+
+import transport as transport_module
+from transport import Transport
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff sleeps of Transport, they are recorded instead of slept."""
+    recorded = []
+    monkeypatch.setattr(transport_module, 'time', SimpleNamespace(sleep=recorded.append))
+    return recorded
+
+
+def install(monkeypatch, **kwargs) -> Transport:
+    transport = Transport(pool_size=2, connect_timeout=1, **kwargs)
+    # fake_api fixture restores sender afterwards
+    monkeypatch.setattr(apihelper, 'CUSTOM_REQUEST_SENDER', transport.send)
+    return transport
+
+
+def test_sent_message_is_not_retried(bot, fake_api, monkeypatch, sleeps):
+    install(monkeypatch, method_timeouts={'sendMessage': 0.2, 'editMessageText': 0.2}, retries=2)
+    fake_api.latency = 0.5
+
+    with pytest.raises(requests.ReadTimeout):
+        bot.send_message(7, 'hi')
+    # fake API counts request after its latency
+    time.sleep(0.5)
+    assert fake_api.calls['sendMessage'] == 1
+
+    with pytest.raises(requests.ReadTimeout):
+        bot.edit_message_text('hi', 7, 1)
+    time.sleep(0.5)
+    assert fake_api.calls['editMessageText'] == 3
+    assert len(sleeps) == 2
+
+
+def test_message_answered_with_server_error_is_not_retried(bot, fake_api, monkeypatch, sleeps):
+    install(monkeypatch, retries=2)
+    fake_api.fail_chat(7, 500)
+
+    with pytest.raises(apihelper.ApiTelegramException):
+        bot.send_message(7, 'hi')
+    assert fake_api.calls['sendMessage'] == 1
+    assert sleeps == []
+
+
+def test_message_that_did_not_reach_telegram_is_retried(bot, fake_api, monkeypatch, sleeps):
+    install(monkeypatch, retries=2)
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+    monkeypatch.setattr(apihelper, 'API_URL', f'http://127.0.0.1:{port}/bot{{0}}/{{1}}')
+
+    with pytest.raises(requests.ConnectionError):
+        bot.send_message(7, 'hi')
+    assert len(sleeps) == 2
+
+
+def test_long_polling_is_waited_longer_than_read_timeout(bot, fake_api, monkeypatch):
+    install(monkeypatch, read_timeout=0.2, method_timeouts={})
+
+    started = time.monotonic()
+    assert apihelper.get_updates(bot.token, long_polling_timeout=1) == []
+    assert time.monotonic() - started >= 1
+    assert fake_api.calls['getUpdates'] == 1
+
+
+def test_long_polling_timeout_is_added_to_read_timeout():
+    transport = Transport(connect_timeout=2, read_timeout=10)
+    default = (apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT)
+
+    assert transport._timeout('getUpdates', default, {'timeout': 20}) == (2, 25)
+    assert transport._timeout('getUpdates', (20, 25), {'timeout': 20}) == (20, 25)
+    assert transport._timeout('getUpdates', default, {'offset': 3}) == (2, 10)
+    assert transport._timeout('sendMessage', default, {'timeout': 20}) == (2, 10)
@@ -0,0 +1,20 @@
+from telebot import TeleBot
+from telebot.types import Update
+
+from metrics import WEBHOOK_ERRORS
+from webhook import UpdateDispatcher
+
+
+def test_failed_update_is_counted():
+    bot = TeleBot('1:test', threaded=False)
+
+    def fail(updates):
+        raise RuntimeError('handler failed')
+
+    bot.process_new_updates = fail
+    dispatcher = UpdateDispatcher(bot, workers=1, max_pending=1)
+    errors = WEBHOOK_ERRORS.value(stage='process')
+
+    assert dispatcher.submit(Update.de_json({'update_id': 1}))
+    dispatcher.executor.shutdown(wait=True)
+    assert WEBHOOK_ERRORS.value(stage='process') == errors + 1
@@ -0,0 +1,155 @@
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+from metrics import API_CONNECTIONS, API_RETRIES, log_event
+
+# Methods that change nothing or give the same result when repeated, so they are retried after any network error
+IDEMPOTENT_METHODS = frozenset({
+    'getMe', 'getUpdates', 'getChat', 'getChatMember', 'getWebhookInfo', 'setWebhook', 'deleteWebhook',
+    'editMessageText', 'editMessageReplyMarkup', 'deleteMessage', 'answerCallbackQuery', 'sendChatAction',
+})
+# Read timeouts of methods that are answered quickly, a request that hangs longer is retried or fails fast
+DEFAULT_METHOD_TIMEOUTS = {
+    'answerCallbackQuery': 5,
+    'sendChatAction': 5,
+    'getMe': 5,
+    'deleteMessage': 10,
+    'editMessageText': 10,
+    'editMessageReplyMarkup': 10,
+    'sendMessage': 10,
+}
+# Seconds that answer of long polling is waited after its timeout passed
+LONG_POLLING_MARGIN = 5
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        API_CONNECTIONS.inc(scheme='http')
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        API_CONNECTIONS.inc(scheme='https')
+        return super()._new_conn()
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that counts opened connections, so share of reused ones is visible in metrics."""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+def parse_timeouts(text: str) -> dict:
+    """Function that reads read timeouts of methods from config.
+
+    Args:
+        text (str): Pairs like "sendMessage=10,getMe=5"
+
+    Returns:
+        dict: Read timeout in seconds by name of method
+    """
+    timeouts = {}
+    for pair in filter(None, (part.strip() for part in (text or '').split(','))):
+        method, _, seconds = pair.partition('=')
+        timeouts[method.strip()] = float(seconds)
+    return timeouts
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    # connection was not established, so Telegram could not receive request
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+
+class Transport:
+    """Pooled keep-alive HTTP client that telebot uses for every request to Telegram Bot API.
+
+    All threads share one pool of connections, so broadcast workers and handlers reuse connections
+    instead of opening new ones. Every method has its own read timeout. Network errors are retried
+    with exponential backoff and jitter: requests that could not reach Telegram are always retried,
+    other failures and 5xx answers only for idempotent methods, so a message is never sent twice by retry.
+
+    Args:
+        pool_size (int): Maximum amount of kept connections, usually amount of broadcast workers and handler threads
+        connect_timeout (float): Amount of seconds to wait for connection
+        read_timeout (float): Amount of seconds to wait for answer of methods without own timeout
+        method_timeouts (dict, optional): Read timeouts by name of method. Defaults to DEFAULT_METHOD_TIMEOUTS
+        retries (int): Amount of retries after network error
+        backoff (float): Delay before the first retry in seconds, it doubles with every retry
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5, read_timeout: float = 30,
+                 method_timeouts: dict = None, retries: int = 2, backoff: float = 0.5) -> None:
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.method_timeouts = dict(DEFAULT_METHOD_TIMEOUTS if method_timeouts is None else method_timeouts)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = _CountingAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _timeout(self, api_method: str, timeout: tuple, params: dict) -> tuple:
+        # telebot passes its defaults unless caller or long polling asked for own timeout
+        if timeout is None or timeout == (apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT):
+            timeout = self.connect_timeout, self.method_timeouts.get(api_method, self.read_timeout)
+        if api_method == 'getUpdates' and (params or {}).get('timeout'):
+            # Telegram holds long polling request for "timeout" seconds, so answer is waited a bit longer
+            timeout = timeout[0], max(timeout[1], float(params['timeout']) + LONG_POLLING_MARGIN)
+        return timeout
+
+    def send(self, method: str, url: str, timeout: tuple = None, **kwargs) -> requests.Response:
+        """Function that makes request to Telegram Bot API. It has signature of telebot CUSTOM_REQUEST_SENDER.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL of Bot API method
+            timeout (tuple, optional): Connect and read timeouts passed by telebot
+
+        Returns:
+            requests.Response: Answer of Telegram
+        """
+        api_method = url.rsplit('/', 1)[-1]
+        timeout = self._timeout(api_method, timeout, kwargs.get('params'))
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                if attempt == self.retries or not (api_method in IDEMPOTENT_METHODS or _not_sent(e)):
+                    raise
+                reason = 'network'
+                log_event('telegram_retry', logging.WARNING, method=api_method, attempt=attempt + 1, error=str(e))
+            else:
+                if response.status_code < 500 or attempt == self.retries or api_method not in IDEMPOTENT_METHODS:
+                    return response
+                reason = response.status_code
+            API_RETRIES.inc(method=api_method, reason=reason)
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def close(self) -> None:
+        """Function that closes all kept connections."""
+        self.session.close()
+
+
+def install_transport(transport: Transport) -> None:
+    """Function that makes telebot send all requests through transport.
+    It has to be called before install_api_metrics, so requests are still counted.
+
+    Args:
+        transport (Transport): Transport that makes requests
+    """
+    apihelper.CUSTOM_REQUEST_SENDER = transport.send
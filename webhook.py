@@ -0,0 +1,123 @@
+import hmac
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import TeleBot
+from telebot.types import Update
+
+from metrics import WEBHOOK_ERRORS, log_event
+
+
+class UpdateDispatcher:
+    """Bounded pool of workers that run handlers for updates received through webhook.
+
+    When all workers are busy and queue is full, new updates are rejected, so Telegram
+    delivers them again later instead of piling them up in memory.
+
+    Args:
+        bot (TeleBot): Bot whose handlers process updates
+        workers (int): Amount of threads that run handlers
+        max_pending (int): Maximum amount of updates that are running or waiting for worker
+    """
+
+    def __init__(self, bot: TeleBot, workers: int = 8, max_pending: int = 64) -> None:
+        self.bot = bot
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, update: Update) -> bool:
+        """Function that hands update to worker pool.
+
+        Args:
+            update (Update): Update received from Telegram
+
+        Returns:
+            bool: False if pool is saturated and update was rejected
+        """
+        if not self._slots.acquire(blocking=False):
+            return False
+        future = self.executor.submit(self._process, update)
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _process(self, update: Update) -> None:
+        try:
+            self.bot.process_new_updates([update])
+        except Exception as e:
+            WEBHOOK_ERRORS.inc(stage='process')
+            log_event('webhook_error', logging.ERROR, update_id=update.update_id, error=str(e))
+
+
+def create_webhook_server(dispatcher: UpdateDispatcher, host: str, port: int,
+                          path: str, secret: str = None) -> ThreadingHTTPServer:
+    """Function that creates HTTP server which receives updates from Telegram.
+
+    Args:
+        dispatcher (UpdateDispatcher): Pool that runs handlers
+        host (str): Address to listen on
+        port (int): Port to listen on
+        path (str): URL path that Telegram posts updates to
+        secret (str, optional): Secret token that Telegram sends in "X-Telegram-Bot-Api-Secret-Token" header
+
+    Returns:
+        ThreadingHTTPServer: Server that is ready to serve_forever
+    """
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            if self.path != path:
+                self.send_response(404)
+                self.end_headers()
+                return
+            token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+            if secret and not hmac.compare_digest(token, secret):
+                self.send_response(403)
+                self.end_headers()
+                return
+
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                update = Update.de_json(json.loads(self.rfile.read(length)))
+            except ValueError as e:
+                WEBHOOK_ERRORS.inc(stage='parse')
+                log_event('webhook_bad_update', logging.WARNING, error=str(e))
+                self.send_response(400)
+                self.end_headers()
+                return
+
+            # 503 makes Telegram retry the update later, which is our back-pressure
+            self.send_response(200 if dispatcher.submit(update) else 503)
+            self.end_headers()
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return ThreadingHTTPServer((host, port), WebhookHandler)
+
+
+def run_webhook(bot: TeleBot, url: str, host: str = '0.0.0.0', port: int = 8443, path: str = '/webhook',
+                secret: str = None, workers: int = 8, max_pending: int = 64) -> None:
+    """Function that registers webhook in Telegram and serves updates until process is stopped.
+
+    Args:
+        bot (TeleBot): Bot whose handlers process updates
+        url (str): Public URL that Telegram can reach, without path
+        host (str): Address to listen on
+        port (int): Port to listen on
+        path (str): URL path that Telegram posts updates to
+        secret (str, optional): Secret token to check that requests come from Telegram
+        workers (int): Amount of threads that run handlers
+        max_pending (int): Maximum amount of updates that are running or waiting for worker
+    """
+    # Handlers are run by our bounded pool, not by unbounded queue of TeleBot
+    bot.threaded = False
+    server = create_webhook_server(UpdateDispatcher(bot, workers, max_pending), host, port, path, secret)
+    bot.remove_webhook()
+    bot.set_webhook(url=url.rstrip('/') + path, secret_token=secret, max_connections=max_pending)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()